@@ -2,6 +2,7 @@ import paho.mqtt.client as mqtt
 from typing import Dict, Any
 import json
 from Services.logger_service import info, error
+from Services.register_map import REGISTER_MAP
 import threading
 import time
 import os
@@ -93,6 +94,19 @@ class MQTTService:
             error(f"Error publishing to {topic}: {str(e)}")
             return False
 
+    def publish_changes(self, topic: str, delta: Dict[str, Any], retain: bool = False) -> bool:
+        """Publish a change detector delta, keeping its sequence number"""
+        payload = {
+            "seq": delta["seq"],
+            "timestamp": delta["timestamp"],
+            "values": {
+                name: REGISTER_MAP.describe(name, value)
+                for name, value in delta["values"].items()
+                if name in REGISTER_MAP
+            },
+        }
+        return self.publish(topic, payload, retain)
+
     def _on_connect(self, client, userdata, flags, rc):
         """Callback for when the client connects to the broker"""
         if rc == 0:
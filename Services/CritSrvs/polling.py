@@ -2,30 +2,13 @@ import time
 import requests
 import sqlite3
 from Services.database_service import Database
+from Services.register_map import REGISTER_MAP
 
 # Initialize the database
 db = Database()
 
-# Define the API endpoints
-API_ENDPOINTS = {
-    "speed_dir": "http://127.0.0.1:8080/api/data/speed-dir",
-    "output_frequency": "http://127.0.0.1:8080/api/data/output-frequency",
-    "current": "http://127.0.0.1:8080/api/data/current",
-    "torque": "http://127.0.0.1:8080/api/data/torque",
-    "power": "http://127.0.0.1:8080/api/data/power",
-    "dc_bus_voltage": "http://127.0.0.1:8080/api/data/dc-bus-voltage",
-    "output_voltage": "http://127.0.0.1:8080/api/data/output-voltage",
-    "drive_temp": "http://127.0.0.1:8080/api/data/drive-temp",
-    "drive_cb_temp": "http://127.0.0.1:8080/api/data/drive-cb-temp",
-    "mot_therm_stress": "http://127.0.0.1:8080/api/data/mot-therm-stress",
-    "latest_fault": "http://127.0.0.1:8080/api/fault/latest-fault",
-    "speed_at_fault": "http://127.0.0.1:8080/api/fault/speed-at-fault",
-    "freq_at_fault": "http://127.0.0.1:8080/api/fault/freq-at-fault",
-    "voltage_at_fault": "http://127.0.0.1:8080/api/fault/voltage-at-fault",
-    "current_at_fault": "http://127.0.0.1:8080/api/fault/current-at-fault",
-    "torque_at_fault": "http://127.0.0.1:8080/api/fault/torque-at-fault",
-    "status_at_fault": "http://127.0.0.1:8080/api/fault/status-at-fault",
-}
+# Deltas of every register map tag past its deadband, see ChangeDetector
+CHANGES_ENDPOINT = "http://127.0.0.1:8080/api/changes"
 
 API_ENDPOINTS_WATER_PUMP = {
     "speed_dir": "http://127.0.0.1:8080/api/wp/data/speed-dir",
@@ -59,38 +42,55 @@ def fetch_data(endpoint):
         print(f"Exception occurred while fetching data from {endpoint}: {str(e)}")
         return None
 
+# Database column -> (API result key, register map tag)
+DATA_FIELDS = {
+    "speed_rpm": ("speed_dir", "speed"),
+    "output_frequency": ("output_frequency", "output_frequency"),
+    "current_amps": ("current", "current"),
+    "torque_percent": ("torque", "torque"),
+    "power_kw": ("power", "power"),
+    "dc_bus_voltage": ("dc_bus_voltage", "dc_bus_voltage"),
+    "output_voltage": ("output_voltage", "output_voltage"),
+    "drive_temp_c": ("drive_temp", "drive_temp"),
+    "drive_cb_temp_c": ("drive_cb_temp", "drive_cb_temp"),
+    "motor_thermal_stress_percent": ("mot_therm_stress", "mot_therm_stress"),
+    "latest_fault": ("latest_fault", "latest_fault"),
+    "speed_at_fault": ("speed_at_fault", "speed_at_fault"),
+    "freq_at_fault": ("freq_at_fault", "freq_at_fault"),
+    "voltage_at_fault": ("voltage_at_fault", "voltage_at_fault"),
+    "current_at_fault": ("current_at_fault", "current_at_fault"),
+    "torque_at_fault": ("torque_at_fault", "torque_at_fault"),
+    "status_at_fault": ("status_at_fault", "status_at_fault"),
+}
+
 def prepare_data_to_log(results):
-    data_fields = {
-        "speed_rpm": ("speed_dir", "Speed & Direction"),
-        "output_frequency": ("output_frequency", "Output Frequency"),
-        "current_amps": ("current", "Current"),
-        "torque_percent": ("torque", "Torque"),
-        "power_kw": ("power", "Power"),
-        "dc_bus_voltage": ("dc_bus_voltage", "DC Bus Voltage"),
-        "output_voltage": ("output_voltage", "Output Voltage"),
-        "drive_temp_c": ("drive_temp", "Drive Temperature"),
-        "drive_cb_temp_c": ("drive_cb_temp", "Drive CB Temperature"),
-        "motor_thermal_stress_percent": ("mot_therm_stress", "Motor Thermal Stress"),
-        "latest_fault": ("latest_fault", "Latest Fault"),
-        "speed_at_fault": ("speed_at_fault", "Speed at Fault"),
-        "freq_at_fault": ("freq_at_fault", "Frequency at Fault"),
-        "voltage_at_fault": ("voltage_at_fault", "Voltage at Fault"),
-        "current_at_fault": ("current_at_fault", "Current at Fault"),
-        "torque_at_fault": ("torque_at_fault", "Torque at Fault"),
-        "status_at_fault": ("status_at_fault", "Status at Fault"),
-    }
-    
+    # The API labels each value with its register map label
     return {
-        key: results[api_key].get(display_name, {}).get("value")
-        for key, (api_key, display_name) in data_fields.items()
+        key: (results[api_key] or {}).get(REGISTER_MAP[f"vfd1.{tag}"].label, {}).get("value")
+        for key, (api_key, tag) in DATA_FIELDS.items()
     }
 
+def prepare_changes_to_log(values):
+    return {key: values.get(f"vfd1.{tag}") for key, (api_key, tag) in DATA_FIELDS.items()}
+
 def poll_data():
+    seq = 0
+    values = {}
     while True:
-        results = {key: fetch_data(endpoint) for key, endpoint in API_ENDPOINTS.items()}
-        results_wp = {key: fetch_data(endpoint) for key, endpoint in API_ENDPOINTS_WATER_PUMP.items()}
+        # Only log a cutter face row when a VFD value changed or hit its heartbeat
+        changes = fetch_data(f"{CHANGES_ENDPOINT}?since={seq}")
+        if changes:
+            if changes["reset"]:
+                values = {}
+            changed = False
+            for delta in changes["changes"]:
+                values.update(delta["values"])
+                changed = changed or any(name.startswith("vfd1.") for name in delta["values"])
+            seq = changes["seq"]
+            if changed:
+                db.log_operating_data(prepare_changes_to_log(values))
 
-        db.log_operating_data(prepare_data_to_log(results))
+        results_wp = {key: fetch_data(endpoint) for key, endpoint in API_ENDPOINTS_WATER_PUMP.items()}
         db.log_operating_data_water_pump(prepare_data_to_log(results_wp))
 
         time.sleep(0.1)
@@ -7,12 +7,18 @@ import sys
 import os
 import glob
 import serial
-import struct
 from Services.database_service import Database as db
 import sqlite3
 from flask_cors import CORS
 import threading
 from Services.modbus_service import ModbusConnection
+from Services.sequence_engine import STARTUP_SEQUENCE
+from Services.bus_scheduler import PRIORITY_EMERGENCY, PRIORITY_CONTROL, CONTROL_WRITE_TIMEOUT
+from Services.bus_services import BusServices, snapshot_response, stream_response, batch_response
+from Services.device_discovery import parse_units, PROBE_TIMEOUT
+from Services.register_map import REGISTER_MAP, RegisterTag, HOLDING
+from Services.scan_planner import read_tag
+from Services.power_meter import latest_sample
 from Services.logger_service import info, error
 from Models.ModbusDB.operating_data_table import OperatingData
 import atexit
@@ -20,50 +26,54 @@ import atexit
 # Add the project root directory to Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-MAX_RETRIES = 3  # Maximum number of connection attempts
-RETRY_DELAY = 2  # Seconds between retries
-
 # Create a single Flask app instance
 app = Flask(__name__)
 CORS(app)
+services = None
 modbus = None
+bus = None
+acquisition = None
+setpoints = None
+sequences = None
+discovery = None
+supervisor = None
 rs485_connected = False
 
 def cleanup_modbus():
-    global modbus
-    if modbus and hasattr(modbus, 'client'):
-        try:
-            modbus.client.close()
-            info("Modbus connection closed during cleanup")
-        except Exception as e:
-            error(f"Error during Modbus cleanup: {str(e)}")
+    global services, modbus, bus, acquisition, setpoints, sequences, discovery, supervisor
+    if services:
+        services.stop()
+        services = None
+    modbus = bus = acquisition = setpoints = sequences = discovery = supervisor = None
 
 # Register the cleanup function
 atexit.register(cleanup_modbus)
 
 def run_server():
-    global modbus, rs485_connected
+    global services, modbus, bus, acquisition, setpoints, sequences, discovery, supervisor, rs485_connected
     
     # Clean up any existing connection first
     cleanup_modbus()
     
-    # Try to establish Modbus connection
-    retry_count = 0
-    while retry_count < MAX_RETRIES:
-        try:
-            modbus = ModbusConnection()
-            rs485_connected = True
-            info("Successfully connected to RS485")
-            break
-        except Exception as e:
-            retry_count += 1
-            error(f"Failed to connect to RS485 (Attempt {retry_count}/{MAX_RETRIES}): {str(e)}")
-            if retry_count < MAX_RETRIES:
-                time.sleep(RETRY_DELAY)
-            else:
-                error("Failed to establish RS485 connection after maximum retries")
-                rs485_connected = False
-                break
+    # One connection per RS485 segment, the first one is the default bus.
+    # Creating them does not open the ports, so a missing adapter no longer
+    # holds up start-up; the supervisor opens and re-opens them.
+    try:
+        services = BusServices()
+        rs485_connected = True
+    except Exception as e:
+        error(f"Invalid RS485 configuration: {str(e)}")
+        rs485_connected = False
+
+    if rs485_connected:
+        services.start()
+        modbus = services.modbus
+        bus = services.bus
+        setpoints = services.setpoints
+        sequences = services.sequences
+        discovery = services.discovery
+        acquisition = services.acquisition
+        supervisor = services.supervisor
 
     try:
         app.run(use_reloader=False, host='0.0.0.0', port=8080)
@@ -73,28 +83,58 @@ def run_server():
 @app.route('/rs485', methods=['GET'])
 def get_rs485_status():
     """Get the current status of the RS485 connection"""
-    global rs485_connected
+    if not supervisor:
+        return jsonify({
+            "connected": False,
+            "message": "RS485 connection is not available"
+        })
     try:
-        # Just check if we have an active Modbus client
-        if modbus and modbus.client and modbus.client.is_socket_open():
-            return jsonify({
-                "connected": True,
-                "message": "RS485 connection is active"
-            })
-        else:
-            rs485_connected = False
-            return jsonify({
-                "connected": False,
-                "message": "RS485 connection is not active"
-            })
+        connected = supervisor.connected
+        return jsonify({
+            "connected": connected,
+            "message": "RS485 connection is active" if connected
+                       else "RS485 port lost, re-opening in the background and serving the last data",
+            "stale": acquisition.is_stale(),
+            "ports": supervisor.status()
+        })
     except Exception as e:
-        rs485_connected = False
         error(f"RS485 connection check failed: {str(e)}")
         return jsonify({
             "connected": False,
             "message": f"RS485 connection error: {str(e)}"
         })
 
+@app.after_request
+def mark_stale_data(response):
+    """Flag every response served while a bus is being re-opened"""
+    if acquisition and acquisition.is_stale():
+        response.headers["X-Data-Stale"] = "true"
+    return response
+
+@app.route('/api/bus/stats', methods=['GET'])
+def get_bus_stats():
+    """Transaction latency, error counts and utilization of the RS485 bus"""
+    if not rs485_connected:
+        return jsonify({
+            "status": "error",
+            "message": "RS485 connection is not available"
+        }), 503
+    try:
+        stats = modbus.stats.snapshot()
+        stats["queue"] = bus.pending()
+        stats["health"] = {str(unit): health for unit, health in modbus.health.stats().items()}
+        stats["setpoints"] = setpoints.stats()
+        stats["scan_plan"] = acquisition.plan_report()
+        stats["buses"] = bus.stats()
+        stats["ports"] = supervisor.status()
+        return jsonify(stats)
+    except Exception as e:
+        error(f"Bus stats failed: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
 # Decorator for handling Modbus errors
 def handle_modbus_errors(f):
     @wraps(f)
@@ -140,16 +180,43 @@ def format_response(value, name, unit, multiplier=1):
 @app.route('/api/modbus/read', methods=['GET'])
 @handle_modbus_errors
 def read_modbus():
-    """Read from Modbus register with optional range"""
+    """
+    Read from Modbus register with optional range. With a type (float32,
+    int32, ...) the value's registers are read in one transaction and
+    returned decoded, so its words can never come from different scans.
+    """
     unit_id = request.args.get('unitId', type=int)
     register = request.args.get('register', type=int)
     range_val = request.args.get('range', default=1, type=int)
+    data_type = request.args.get('type')
     
     if unit_id is None or register is None:
         return jsonify({
             "status": "error",
             "message": "Missing required parameters: unitId and register"
         }), 400
+
+    if data_type:
+        try:
+            tag = RegisterTag("value", unit_id, register, data_type,
+                              request.args.get('wordOrder', 'big'), table=request.args.get('table', HOLDING))
+        except ValueError as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+        try:
+            value = read_tag(bus, tag)
+        except Exception as e:
+            error(f"Error reading {data_type} at register {register} of unit {unit_id}: {str(e)}")
+            return jsonify({
+                "status": "error",
+                "message": f"Error reading register: {str(e)}"
+            }), 500
+        return jsonify({
+            "status": "success",
+            "register": register,
+            "unitId": unit_id,
+            "type": data_type,
+            "value": value
+        })
     
     # Limit range to prevent excessive reads
     if range_val > 100:
@@ -161,7 +228,7 @@ def read_modbus():
     # Read the registers
     try:
         if range_val == 1:
-            value = modbus.read_register_holding(register, unit_id)
+            value = bus.read_holding_block(register, 1, unit_id).result()[0]
             info(f"Read register {register} from unit {unit_id}: {value}")
             return jsonify({
                 "status": "success",
@@ -170,7 +237,7 @@ def read_modbus():
                 "value": value
             })
         else:
-            value = modbus.read_register_holding(register, unit_id, range_val)
+            value = bus.read_holding_block(register, range_val, unit_id).result()
             
             info(f"Read {range_val} registers starting at {register} from unit {unit_id}")
             return jsonify({
@@ -178,6 +245,7 @@ def read_modbus():
                 "unitId": unit_id,
                 "startRegister": register,
                 "range": range_val,
+                "values": value
             })
     except Exception as e:
         error(f"Error reading Modbus register: {str(e)}")
@@ -186,6 +254,15 @@ def read_modbus():
             "message": f"Error reading register: {str(e)}"
         }), 500
 
+@app.route('/api/modbus/batch', methods=['POST'])
+@handle_modbus_errors
+def batch_read_modbus():
+    """
+    Read a list of {unit, address, type, wordOrder, table} values in the
+    fewest block transactions, with a value or an error for each
+    """
+    return batch_response(bus)
+
 @app.route('/api/modbus/write', methods=['POST'])
 @handle_modbus_errors
 def write_modbus():
@@ -210,7 +287,7 @@ def write_modbus():
     
     # Write to the register
     try:
-        modbus.write_register(register, value, unit_id)
+        bus.write_register(register, value, unit_id, timeout=CONTROL_WRITE_TIMEOUT).result()
         info(f"Wrote value {value} to register {register} on unit {unit_id}")
         return jsonify({
             "status": "success",
@@ -231,21 +308,61 @@ def write_modbus():
 '''
 @app.route('/api/startup-sequence', methods=['GET'])
 def startup_sequence():
-    modbus.write_register(0, 0b110, 1)
-    time.sleep(0.1)
-    modbus.write_register(0, 0b111, 1)
-    modbus.write_register(0, 0b1111, 1)
-    modbus.write_register(0, 0b101111, 1)
-    modbus.write_register(0, 0b1101111, 1)
+    """Start the drive in the background and return the job id to follow it"""
+    job = sequences.run(STARTUP_SEQUENCE, 1)
+    return jsonify({"status": "started", "job_id": job.id}), 202
+
+@app.route('/api/sequences/<job_id>', methods=['GET'])
+def get_sequence_job(job_id):
+    """Progress and per-step timing of a command sequence"""
+    job = sequences.job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown sequence job {job_id}"}), 404
+    return jsonify(job)
+
+@app.route('/api/sequences/<job_id>/cancel', methods=['POST'])
+def cancel_sequence_job(job_id):
+    """Stop a command sequence before its next step"""
+    if not sequences.cancel(job_id):
+        return jsonify({"status": "error", "message": f"Unknown sequence job {job_id}"}), 404
+    return jsonify({"status": "cancelling", "job_id": job_id})
+
+@app.route('/api/discovery', methods=['POST'])
+def start_discovery():
+    """
+    Sweep unit ids on the live buses and fingerprint the responders.
+    Optional JSON body: {"units": "1-32,100" or [ids], "timeout": seconds}
+    """
+    if not rs485_connected:
+        return jsonify({"status": "error", "message": "RS485 connection is not available"}), 503
+    try:
+        data = request.get_json(silent=True) or {}
+        units = data.get("units", "1-247")
+        units = parse_units(units) if isinstance(units, str) else [int(unit) for unit in units]
+        timeout = float(data.get("timeout", PROBE_TIMEOUT))
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid discovery request: {str(e)}"}), 400
+    if not discovery.start(units, timeout):
+        return jsonify({"status": "error", "message": "A discovery sweep is already running"}), 409
+    return jsonify({"status": "started"}), 202
+
+@app.route('/api/discovery', methods=['GET'])
+def get_discovery():
+    """Progress of the discovery sweep and, once done, the configuration it found"""
+    if not rs485_connected:
+        return jsonify({"status": "error", "message": "RS485 connection is not available"}), 503
+    return jsonify(discovery.status())
 
 @app.route('/api/stop-motor', methods=['GET'])
 def stop_motor():
-    modbus.write_register(0, 0, 1)
+    # Keep a running start sequence from re-enabling the drive
+    sequences.cancel_unit(1)
+    bus.write_register(0, 0, 1, priority=PRIORITY_EMERGENCY).result()
 
 #Currently not working
 @app.route('/api/reverse-motor', methods=['GET'])
 def reverse_motor():
-    modbus.write_register(0, 0, 1)
+    bus.write_register(0, 0, 1, timeout=CONTROL_WRITE_TIMEOUT).result()
 
 @app.route('/api/set-frequency', methods=['POST'])
 def set_frequency():
@@ -263,12 +380,14 @@ def set_frequency():
         frequency = int(frequency)
         if -20000 <= frequency <= 20000:  # Allow negative values for reverse
             try:
-                modbus.write_register(1, frequency, 1)
+                ack = setpoints.set(1, frequency, 1).result()
                 info(f"Successfully set frequency to {frequency} ({(frequency * 60/20000):.1f} Hz)")
                 return jsonify({
                     "status": "success",
                     "message": "Frequency set successfully",
-                    "value": frequency
+                    "value": frequency,
+                    "acknowledged": ack["value"],
+                    "latency": ack["latency"]
                 }), 200
             except Exception as e:
                 error(f"Modbus error writing frequency: {str(e)}")
@@ -306,12 +425,14 @@ def reverse_frequency():
         frequency = int(frequency)
         if -20000 <= frequency <= 20000:  # Allow negative values for reverse
             try:
-                modbus.write_register(1, frequency, 1)
+                ack = setpoints.set(1, frequency, 1).result()
                 info(f"Successfully set frequency to {frequency} ({(frequency * 60/20000):.1f} Hz)")
                 return jsonify({
                     "status": "success",
                     "message": "Frequency set successfully",
-                    "value": frequency
+                    "value": frequency,
+                    "acknowledged": ack["value"],
+                    "latency": ack["latency"]
                 }), 200
             except Exception as e:
                 error(f"Modbus error writing frequency: {str(e)}")
@@ -449,6 +570,12 @@ def handle_modbus_errors(f):
     def wrapper(*args, **kwargs):
         try:
             return f(*args, **kwargs)
+        except LookupError as e:
+            # The tag has not been scanned since startup
+            return jsonify({
+                "error": "No data yet",
+                "details": str(e)
+            }), 503
         except Exception as e:
             error(f"Error in {f.__name__}: {str(e)}")
             return jsonify({
@@ -466,6 +593,31 @@ def format_response(value, name, unit="", scale_factor=1):
         }
     })
 
+def tag_response(tag_name):
+    """Format the latest snapshot value of a register map tag"""
+    tag = REGISTER_MAP[tag_name]
+    return format_response(acquisition.get_value(tag_name), tag.label, tag.eng_unit)
+
+'''
+CHANGE STREAM
+'''
+@app.route('/api/changes', methods=['GET'])
+@handle_modbus_errors
+def get_changes():
+    """Tag values that changed past their deadband after the given sequence number"""
+    return jsonify(acquisition.changes.since(request.args.get('since', 0, type=int)))
+
+@app.route('/api/snapshot', methods=['GET'])
+@handle_modbus_errors
+def get_snapshot():
+    """Every current tag value with its timestamp and quality, see bus_services.snapshot_response"""
+    return snapshot_response(acquisition)
+
+@app.route('/api/stream', methods=['GET'])
+@handle_modbus_errors
+def stream_tags():
+    """Server-Sent Events stream of tag updates, filtered like /api/snapshot and throttled to rate per second"""
+    return stream_response(acquisition)
 
 
 '''
@@ -476,71 +628,61 @@ OPERATING DATA REGISTERS (CUTTER FACE)
 @handle_modbus_errors
 def get_speed_dir():
     """Get motor speed and direction (-30000 to 30000 rpm)"""
-    speed = modbus.read_register_holding(100, 1)
-    return format_response(speed, "Speed & Direction", "rpm")
+    return tag_response("vfd1.speed")
 
 @app.route('/api/data/output-frequency', methods=['GET'])
 @handle_modbus_errors
 def get_output_freq():
     """Get output frequency (0.0 - 500Hz)"""
-    frequency = modbus.read_register_holding(102, 1)
-    return format_response(frequency, "Output Frequency", "Hz", 0.1)
+    return tag_response("vfd1.output_frequency")
 
 @app.route('/api/data/current', methods=['GET'])
 @handle_modbus_errors
 def get_current():
     """Get current (0.0 - 2.0 * I2hd)"""
-    current = modbus.read_register_holding(103, 1)
-    return format_response(current, "Current", "A", 0.1)
+    return tag_response("vfd1.current")
 
 @app.route('/api/data/torque', methods=['GET'])
 @handle_modbus_errors
 def get_torque():
     """Get torque (-200 to 200%)"""
-    torque = modbus.read_register_holding(104, 1)
-    return format_response(torque, "Torque", "%")
+    return tag_response("vfd1.torque")
 
 @app.route('/api/data/power', methods=['GET'])
 @handle_modbus_errors
 def get_power():
     """Get power output"""
-    power = modbus.read_register_holding(105, 1)
-    return format_response(power, "Power", "kW", 0.1)
+    return tag_response("vfd1.power")
 
 @app.route('/api/data/dc-bus-voltage', methods=['GET'])
 @handle_modbus_errors
 def get_dc_bus_voltage():
     """Get DC bus voltage"""
-    dc_bus_voltage = modbus.read_register_holding(106, 1)
-    return format_response(dc_bus_voltage, "DC Bus Voltage", "V")
+    return tag_response("vfd1.dc_bus_voltage")
 
 @app.route('/api/data/output-voltage', methods=['GET'])
 @handle_modbus_errors
 def get_output_voltage():
     """Get output voltage"""
-    output_voltage = modbus.read_register_holding(108, 1)
-    return format_response(output_voltage, "Output Voltage", "V")
+    return tag_response("vfd1.output_voltage")
 
 @app.route('/api/data/drive-temp', methods=['GET'])
 @handle_modbus_errors
 def get_drive_temp():
     """Get drive temperature"""
-    drive_temp = modbus.read_register_holding(109, 1)
-    return format_response(drive_temp, "Drive Temperature", "°C")
+    return tag_response("vfd1.drive_temp")
 
 @app.route('/api/data/drive-cb-temp', methods=['GET'])
 @handle_modbus_errors
 def get_cb_temp():
     """Get drive control board temperature"""
-    cb_temp = modbus.read_register_holding(149, 1)
-    return format_response(cb_temp, "Drive CB Temperature", "°C")
+    return tag_response("vfd1.drive_cb_temp")
 
 @app.route('/api/data/mot-therm-stress', methods=['GET'])
 @handle_modbus_errors
 def get_mot_therm_stress():
     """Get motor thermal stress level"""
-    mot_therm_stress = modbus.read_register_holding(152, 1)
-    return format_response(mot_therm_stress, "Motor Thermal Stress", "%")
+    return tag_response("vfd1.mot_therm_stress")
 
 '''
 FAULT HISTORY REGISTERS (CUTTER FACE)
@@ -550,50 +692,43 @@ FAULT HISTORY REGISTERS (CUTTER FACE)
 @handle_modbus_errors
 def get_latest_fault():
     """Get latest fault code"""
-    latest_fault = modbus.read_register_holding(401, 1)
-    return format_response(latest_fault, "Latest Fault", "code")
+    return tag_response("vfd1.latest_fault")
 
 @app.route('/api/fault/speed-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_speed_at_fault():
     """Get speed at time of fault"""
-    speed_at_fault = modbus.read_register_holding(404, 1)
-    return format_response(speed_at_fault, "Speed at Fault", "rpm")
+    return tag_response("vfd1.speed_at_fault")
 
 @app.route('/api/fault/freq-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_freq_at_fault():
     """Get frequency at time of fault"""
-    freq_at_fault = modbus.read_register_holding(405, 1)
-    return format_response(freq_at_fault, "Frequency at Fault", "Hz", 0.1)
+    return tag_response("vfd1.freq_at_fault")
 
 @app.route('/api/fault/voltage-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_voltage_at_fault():
     """Get voltage at time of fault"""
-    voltage_at_fault = modbus.read_register_holding(406, 1)
-    return format_response(voltage_at_fault, "Voltage at Fault", "V")
+    return tag_response("vfd1.voltage_at_fault")
 
 @app.route('/api/fault/current-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_current_at_fault():
     """Get current at time of fault"""
-    current_at_fault = modbus.read_register_holding(407, 1)
-    return format_response(current_at_fault, "Current at Fault", "A", 0.1)
+    return tag_response("vfd1.current_at_fault")
 
 @app.route('/api/fault/torque-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_torque_at_fault():
     """Get torque at time of fault"""
-    torque_at_fault = modbus.read_register_holding(408, 1)
-    return format_response(torque_at_fault, "Torque at Fault", "%")
+    return tag_response("vfd1.torque_at_fault")
 
 @app.route('/api/fault/status-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_status_at_fault():
     """Get status at time of fault"""
-    status_at_fault = modbus.read_register_holding(409, 1)
-    return format_response(status_at_fault, "Status at Fault", "code")
+    return tag_response("vfd1.status_at_fault")
 
 
 @app.route('/api/data/operating', methods=['GET'])
@@ -752,7 +887,7 @@ HEALTH CHECK ENDPOINTS
 def health_check():
     """API health check endpoint"""
     try:
-        modbus.read_register_holding(1, 3)
+        bus.read_register_holding(1, 3).result()
         return jsonify({
             "status": "healthy",
             "message": "API is running and Modbus connection is active"
@@ -772,7 +907,7 @@ def set_120V():
     try:
         data = request.get_json()
         value = data.get('value', 0)  # Get the value from request, default to 0
-        modbus.write_register(6, value, 7)
+        bus.write_register(6, value, 7, priority=PRIORITY_CONTROL, timeout=CONTROL_WRITE_TIMEOUT).result()
         return jsonify({
             "status": "success",
             "message": f"120V set to {value} successfully"
@@ -789,7 +924,7 @@ def set_480():
     try:
         data = request.get_json()
         value = data.get('value', 0)
-        modbus.write_register(6, data, 7)
+        bus.write_register(6, data, 7, priority=PRIORITY_CONTROL, timeout=CONTROL_WRITE_TIMEOUT).result()
         return jsonify({
             "status": "success",
             "message": "480V set successfully"
@@ -805,184 +940,133 @@ def set_480():
 Below Ground Board Endpoints
 '''
 @app.route('/api/bg/get-thrustTop', methods=['GET'])
+@handle_modbus_errors
 def get_thrustTop():
-    value = modbus.read_register_holding(9, 5)
-    return value
+    return jsonify(acquisition.get_value("bg.thrust_top"))
 
 @app.route('/api/bg/get-thrustLeft', methods=['GET'])
+@handle_modbus_errors
 def get_thrustLeft():
-    value = modbus.read_register_holding(10, 5)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("bg.thrust_left"))
 
 @app.route('/api/bg/get-thrustRight', methods=['GET'])
+@handle_modbus_errors
 def get_thrustRight():
-    value = modbus.read_register_holding(11, 5)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("bg.thrust_right"))
 
 @app.route('/api/bg/motor-temp', methods=['GET'])
+@handle_modbus_errors
 def get_motor_temp():
-    value = modbus.read_register_holding(12, 5)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("bg.motor_temp_adc"))
 
 @app.route('/api/bg/earth-preassure', methods=['GET'])
+@handle_modbus_errors
 def get_earth_pressure():
-    value = modbus.read_register_holding(13, 5)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("bg.earth_pressure"))
 
 @app.route('/api/bg/flame', methods=['GET'])
+@handle_modbus_errors
 def get_flame():
-    value = modbus.read_register_holding(14, 5)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("bg.flame"))
 
 @app.route('/api/bg/actuator-A', methods=['GET'])
+@handle_modbus_errors
 def get_actuator_a():
-    value = modbus.read_register_holding(15, 5)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("bg.actuator_a"))
 
 @app.route('/api/bg/actuator-B', methods=['GET'])
+@handle_modbus_errors
 def get_actuator_b():
-    value = modbus.read_register_holding(16, 5)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("bg.actuator_b"))
 
 @app.route('/api/bg/actuator-C', methods=['GET'])
+@handle_modbus_errors
 def get_actuator_c():
-    value = modbus.read_register_holding(17, 5)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("bg.actuator_c"))
 
 @app.route('/api/bg/encoder-speed', methods=['GET'])
+@handle_modbus_errors
 def get_encoder_speed():
-    value = modbus.read_register_holding(62, 5)
-    return value
+    return jsonify(acquisition.get_value("bg.encoder_speed"))
 
 '''
 Above Ground Board Endpoints
 '''
 @app.route('/api/ag/oil-preassure', methods=['GET'])
+@handle_modbus_errors
 def get_oil_pressure():
-    value = modbus.read_register_holding(12, 6)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("ag.oil_pressure"))
 
 @app.route('/api/ag/oil-temp', methods=['GET'])
+@handle_modbus_errors
 def get_oil_temp():
-    value = modbus.read_register_holding(10, 6)
-    return jsonify(value)
+    return jsonify(acquisition.get_value("ag.oil_temp"))
 
 '''
 480 Power Meter Endpoints
 '''
+@app.route('/api/pm480', methods=['GET'])
+@handle_modbus_errors
+def get_480_sample():
+    return jsonify(latest_sample(acquisition, "pm480").to_dict())
+
 @app.route('/api/pm480/V1N', methods=['GET'])
 @handle_modbus_errors
 def get_480_V1N():
-    x = (modbus.read_register_input(8, 3) & 0xFFFF)  
-    y = (modbus.read_register_input(9, 3) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm480.V1N"))
 
 @app.route('/api/pm480/V2N', methods=['GET'])
 @handle_modbus_errors
 def get_480_V2N():
-    x = (modbus.read_register_input(10, 3) & 0xFFFF)  
-    y = (modbus.read_register_input(11, 3) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm480.V2N"))
 
 @app.route('/api/pm480/V3N', methods=['GET'])
 @handle_modbus_errors
 def get_480_V3N():
-    x = (modbus.read_register_input(12, 3) & 0xFFFF)  
-    y = (modbus.read_register_input(13, 3) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm480.V3N"))
 
 @app.route('/api/pm480/I1', methods=['GET'])
 @handle_modbus_errors
 def get_480_I1():
-    x = (modbus.read_register_input(16, 3) & 0xFFFF)  
-    y = (modbus.read_register_input(17, 3) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm480.I1"))
 
 @app.route('/api/pm480/I2', methods=['GET'])
 @handle_modbus_errors
 def get_480_I2():
-    x = (modbus.read_register_input(18, 3) & 0xFFFF)  
-    y = (modbus.read_register_input(19, 3) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm480.I2"))
 
 '''
 120 Power Meter Endpoints
 '''
+@app.route('/api/pm120', methods=['GET'])
+@handle_modbus_errors
+def get_120_sample():
+    return jsonify(latest_sample(acquisition, "pm120").to_dict())
 
 @app.route('/api/pm120/V1N', methods=['GET'])
 @handle_modbus_errors
 def get_120_V1N():
-    x = (modbus.read_register_input(0, 4) & 0xFFFF)  
-    y = (modbus.read_register_input(1, 4) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm120.V1N"))
 
 @app.route('/api/pm120/V2N', methods=['GET'])
 @handle_modbus_errors
 def get_120_V2N():
-    x = (modbus.read_register_input(2, 4) & 0xFFFF)  
-    y = (modbus.read_register_input(3, 4) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm120.V2N"))
 
 @app.route('/api/pm120/V3N', methods=['GET'])
 @handle_modbus_errors
 def get_120_V3N():
-    x = (modbus.read_register_input(4, 4) & 0xFFFF)  
-    y = (modbus.read_register_input(5, 4) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm120.V3N"))
 
 @app.route('/api/pm120/I1', methods=['GET'])
 @handle_modbus_errors
 def get_120_I1():
-    x = (modbus.read_register_input(16, 4) & 0xFFFF)  
-    y = (modbus.read_register_input(17, 4) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm120.I1"))
 
 @app.route('/api/pm120/I2', methods=['GET'])
 @handle_modbus_errors
 def get_120_I2():
-    x = (modbus.read_register_input(18, 4) & 0xFFFF)  
-    y = (modbus.read_register_input(19, 4) & 0xFFFF) << 16
-
-    z = x + y
-
-    float_value = struct.unpack('<f', struct.pack('<I', z))[0]
-    return jsonify(float_value)
+    return jsonify(acquisition.get_value("pm120.I2"))
 
 
 if __name__ == '__main__':
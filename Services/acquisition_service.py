@@ -0,0 +1,355 @@
+import threading
+import time
+from concurrent.futures import Future
+from Services.logger_service import info, error, warning
+from Services.scan_planner import ScanPlanner, DEFAULT_MAX_GAP
+from Services.bus_scheduler import PRIORITY_TELEMETRY, PRIORITY_BACKGROUND, DeadlineExceeded
+from Services.rtu_timing import read_transaction_time
+from Services.change_detector import ChangeDetector
+
+# Poll classes a tag can be assigned to, as the target period in seconds.
+# On demand tags are only read when something asks for them.
+POLL_CLASSES = {
+    "realtime": 0.05,
+    "fast": 0.1,
+    "normal": 0.5,
+    "medium": 1.0,
+    "slow": 5.0,
+    "on_demand": None,
+}
+
+# Groups polled at least this often share the telemetry lane, slower groups
+# are queued in the background lane and only get leftover bus time
+FAST_GROUP_PERIOD = 0.1
+
+
+class PollGroup:
+    """The tags of one poll class, with their scan plan and schedule"""
+
+    def __init__(self, name, period, tags, max_gap=DEFAULT_MAX_GAP):
+        self.name = name
+        self.period = period
+        self.planner = ScanPlanner(tags, max_gap)
+        self.records = {}
+        for tag in self.planner.tags:
+            if tag.record is not None:
+                self.records.setdefault(tag.record, []).append(tag.name)
+        self.priority = PRIORITY_TELEMETRY if period is not None and period <= FAST_GROUP_PERIOD else PRIORITY_BACKGROUND
+
+        self.next_due = 0.0
+        self.requested = False
+        self.in_flight = False
+        self.scans = 0
+        self.overruns = 0
+        self.last_duration = None
+
+
+class AcquisitionEngine:
+    """
+    Background thread that scans the configured tags through the bus
+    scheduler and keeps an in-memory snapshot of the latest value of each.
+
+    Tags are grouped by poll class. Every group is rescanned when its period
+    comes due, fastest group first, and slow groups are queued behind the
+    fast ones so they only use bus time the fast groups leave over.
+
+    Route handlers read from the snapshot instead of talking to the bus, so
+    bus load no longer depends on how many clients are polling the API.
+    Consumers that only need changed values follow the change detector.
+    """
+
+    def __init__(self, bus, tag_groups, max_gap=DEFAULT_MAX_GAP):
+        self.bus = bus
+        self.groups = []
+        for name, tags in tag_groups.items():
+            if name not in POLL_CLASSES:
+                raise ValueError(f"Unknown poll class '{name}'")
+            self.groups.append(PollGroup(name, POLL_CLASSES[name], tags, max_gap))
+        self.groups.sort(key=lambda group: float('inf') if group.period is None else group.period)
+
+        # version only moves when a value or quality changes; changed holds
+        # the version each tag last changed at, so filtered readers can tell
+        # whether anything they follow moved
+        self._snapshot = {"version": 0, "timestamp": None, "values": {}, "timestamps": {}, "records": {},
+                          "changed": {}, "stale": False, "stale_buses": frozenset()}
+        self._stale_buses = set()
+        self.changes = ChangeDetector()
+        self._lock = threading.Lock()
+        self._published = threading.Condition(self._lock)
+        self._wake = threading.Event()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Start the acquisition thread"""
+        if self._running:
+            return
+        self._check_plan()
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        info(f"Acquisition started with {sum(len(group.planner.blocks) for group in self.groups)} block reads "
+             f"across {len(self.groups)} poll groups")
+
+    def stop(self):
+        """Stop the acquisition thread"""
+        self._running = False
+        self._wake.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def request_scan(self, name):
+        """Scan a poll group as soon as possible, including on demand groups"""
+        for group in self.groups:
+            if group.name == name:
+                group.next_due = 0.0
+                group.requested = True
+        self._wake.set()
+
+    def _check_plan(self):
+        report = self.plan_report()
+        if report["over_budget"]:
+            warning(f"Scan plan needs {report['utilization'] * 100:.0f}% of the busiest bus at {report['baudrate']} baud")
+
+    def plan_report(self, baudrate=None):
+        """
+        Estimate how much of the bus each poll group needs at the given baud
+        rate (defaults to each connection's) and flag plans that cannot fit.
+        With several buses the busiest one sets the overall utilization.
+        """
+        groups = []
+        buses = {}
+        for group in self.groups:
+            cycle_time = 0.0
+            for block in group.planner.blocks:
+                scheduler = self.bus.bus_for(block.unit)
+                block_time = _block_time(block, scheduler.modbus, baudrate)
+                cycle_time += block_time
+                if group.period:
+                    buses[scheduler.name] = buses.get(scheduler.name, 0.0) + block_time / group.period
+            load = cycle_time / group.period if group.period else 0.0
+            groups.append({
+                "name": group.name,
+                "period": group.period,
+                "blocks": len(group.planner.blocks),
+                "cycle_time": cycle_time,
+                "utilization": load,
+                "scans": group.scans,
+                "overruns": group.overruns,
+                "last_duration": group.last_duration,
+            })
+
+        utilization = max(buses.values(), default=0.0)
+        return {
+            "baudrate": baudrate or getattr(self.bus.modbus, 'BAUDRATE', 9600),
+            "utilization": utilization,
+            "over_budget": utilization > 1.0,
+            "buses": buses,
+            "groups": groups,
+        }
+
+    def _run(self):
+        while self._running:
+            self._wake.clear()
+            now = time.monotonic()
+            for group in self.groups:
+                if group.in_flight:
+                    continue
+                if group.period is None and not group.requested:
+                    continue
+                if now < group.next_due:
+                    continue
+
+                if group.period is not None:
+                    next_due = group.next_due + group.period
+                    if next_due <= now:
+                        # First scan, or a whole period behind: restart the grid from now
+                        if group.next_due:
+                            group.overruns += 1
+                        next_due = now + group.period
+                    group.next_due = next_due
+                group.requested = False
+                self._scan_group(group)
+
+            self._wake.wait(self._time_to_next_due())
+
+    def _time_to_next_due(self):
+        now = time.monotonic()
+        waits = [group.next_due - now for group in self.groups
+                 if group.period is not None and not group.in_flight]
+        return max(0.001, min(waits)) if waits else FAST_GROUP_PERIOD
+
+    def _scan_group(self, group):
+        """
+        Queue every block of a group as its own bus request so control writes
+        and faster groups can be served between blocks. The group's values
+        are published together once its last block completes.
+        """
+        blocks = list(group.planner.blocks)
+        if not blocks:
+            return
+
+        group.in_flight = True
+        started = time.monotonic()
+        values = {}
+        remaining = [len(blocks)]
+        lock = threading.Lock()
+
+        def on_done(future, block):
+            try:
+                result = future.result()
+            except DeadlineExceeded:
+                # Stale request, keep the previous values rather than blanking them
+                result = {}
+            except Exception as e:
+                error(f"Scan of unit {block.unit} at {block.start} failed: {str(e)}")
+                result = {tag.name: None for tag in block.tags}
+
+            with lock:
+                values.update(result)
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                group.last_duration = time.monotonic() - started
+                group.scans += 1
+                group.in_flight = False
+                if values:
+                    self._publish(values, group.records)
+                self._wake.set()
+
+        for block in blocks:
+            try:
+                future = self.bus.submit(
+                    lambda modbus, block=block: group.planner.read_block(modbus, block),
+                    group.priority,
+                    timeout=group.period,
+                    modbus_id=block.unit,
+                )
+            except Exception as e:
+                error(f"Could not queue scan of unit {block.unit} at {block.start}: {str(e)}")
+                future = _failed_future(e)
+            future.add_done_callback(lambda future, block=block: on_done(future, block))
+
+    def _publish(self, values, records=None):
+        """
+        Swap in a new snapshot; readers always see a complete group scan.
+        A record is only replaced when every one of its tags was read, so it
+        always holds values from a single transaction. The version is only
+        bumped, and waiters only woken, when a value actually changed.
+        """
+        timestamp = time.time()
+        with self._lock:
+            previous = self._snapshot
+            moved = [name for name, value in values.items()
+                     if name not in previous["timestamps"] or previous["values"].get(name) != value]
+            version = previous["version"] + 1 if moved else previous["version"]
+            changed = previous["changed"]
+            if moved:
+                changed = dict(changed)
+                changed.update(dict.fromkeys(moved, version))
+            merged = dict(previous["values"])
+            merged.update(values)
+            timestamps = dict(previous["timestamps"])
+            timestamps.update(dict.fromkeys(values, timestamp))
+            merged_records = previous["records"]
+            for record, names in (records or {}).items():
+                if all(values.get(name) is not None for name in names):
+                    if merged_records is previous["records"]:
+                        merged_records = dict(merged_records)
+                    merged_records[record] = {
+                        "timestamp": timestamp,
+                        "values": {name: values[name] for name in names},
+                    }
+            self._snapshot = {
+                "version": version,
+                "timestamp": timestamp,
+                "values": merged,
+                "timestamps": timestamps,
+                "records": merged_records,
+                "changed": changed,
+                "stale": bool(self._stale_buses),
+                "stale_buses": frozenset(self._stale_buses),
+            }
+            if moved:
+                self._published.notify_all()
+        self.changes.process(values, timestamp)
+
+    def set_stale(self, bus, stale):
+        """
+        Mark the snapshot stale while a bus is down. The last values stay in
+        place so the API keeps serving them.
+        """
+        with self._lock:
+            if stale:
+                self._stale_buses.add(bus)
+            else:
+                self._stale_buses.discard(bus)
+            if frozenset(self._stale_buses) == self._snapshot["stale_buses"]:
+                return
+            version = self._snapshot["version"] + 1
+            # The quality of every tag on the bus changes with it
+            changed = dict(self._snapshot["changed"])
+            changed.update(dict.fromkeys((tag.name for group in self.groups for tag in group.planner.tags
+                                          if self.bus.bus_for(tag.unit).name == bus), version))
+            self._snapshot = dict(self._snapshot, version=version, changed=changed,
+                                  stale=bool(self._stale_buses), stale_buses=frozenset(self._stale_buses))
+            self._published.notify_all()
+
+    def is_stale(self):
+        return self._snapshot["stale"]
+
+    def snapshot(self):
+        """Return the latest published snapshot (treat it as read-only)"""
+        return self._snapshot
+
+    def version_of(self, names, snapshot=None):
+        """Version at which any of the named tags last changed value or quality, 0 if none has been read"""
+        changed = (snapshot or self._snapshot)["changed"]
+        return max((changed.get(name, 0) for name in names), default=0)
+
+    def wait_for_update(self, version, timeout=None, names=None):
+        """
+        Block until a snapshot newer than version is published or the
+        timeout runs out, and return the latest snapshot either way. With
+        names, version is compared with version_of(names), so only changes
+        to those tags end the wait.
+        """
+        if names is None:
+            current = lambda: self._snapshot["version"]
+        else:
+            current = lambda: self.version_of(names)
+        with self._published:
+            self._published.wait_for(lambda: current() != version, timeout)
+            return self._snapshot
+
+    def latest(self, name):
+        """Return the latest value of a tag, or None if it has not been read yet"""
+        return self._snapshot["values"].get(name)
+
+    def record(self, name):
+        """Return the latest complete read of a record, or None if there is none yet"""
+        return self._snapshot["records"].get(name)
+
+    def get_value(self, name):
+        """Return the latest value of a tag or raise if it has not been read yet"""
+        value = self._snapshot["values"].get(name)
+        if value is None:
+            raise LookupError(f"No data for tag {name}")
+        return value
+
+def _block_time(block, modbus, baudrate=None):
+    """Wire time of one block read with the framing of the connection it goes out on"""
+    return read_transaction_time(
+        block.count,
+        baudrate or getattr(modbus, 'BAUDRATE', 9600),
+        bytesize=getattr(modbus, 'BYTESIZE', 8),
+        parity=getattr(modbus, 'PARITY', 'N'),
+        stopbits=getattr(modbus, 'STOPBITS', 1),
+    )
+
+
+def _failed_future(exception):
+    future = Future()
+    future.set_exception(exception)
+    return future
@@ -0,0 +1,122 @@
+import asyncio
+import time
+from Services.logger_service import info, error
+from Services.acquisition_service import AcquisitionEngine, FAST_GROUP_PERIOD
+from Services.bus_scheduler import DeadlineExceeded
+
+
+class AsyncAcquisitionEngine(AcquisitionEngine):
+    """
+    AcquisitionEngine on the AsyncBus event loop. Every poll group is a
+    coroutine that scans its blocks concurrently and sleeps until its next
+    period, so no thread is spent per group or per slow device. Snapshot,
+    records and change detection are shared with the threaded engine.
+    """
+
+    def __init__(self, bus, tag_groups, **kwargs):
+        super().__init__(bus, tag_groups, **kwargs)
+        self._tasks = []
+        self._requested = None
+
+    def start(self):
+        """Start one polling coroutine per group on the bus loop"""
+        if self._running:
+            return
+        self._check_plan()
+        self._running = True
+        self.bus.call(self._start()).result()
+        info(f"Acquisition started with {sum(len(group.planner.blocks) for group in self.groups)} block reads "
+             f"across {len(self.groups)} poll groups on the event loop")
+
+    def stop(self):
+        """Cancel the polling coroutines"""
+        if not self._running:
+            return
+        self._running = False
+        if self.bus.loop and self.bus.loop.is_running():
+            self.bus.call(self._stop()).result(timeout=5)
+
+    def request_scan(self, name):
+        """Scan a poll group as soon as possible, including on demand groups"""
+        for group in self.groups:
+            if group.name == name:
+                group.next_due = 0.0
+                group.requested = True
+        if self._requested is not None:
+            self.bus.loop.call_soon_threadsafe(self._requested.set)
+
+    async def _start(self):
+        self._requested = asyncio.Event()
+        self._tasks = [asyncio.ensure_future(self._poll(group)) for group in self.groups]
+
+    async def _stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _poll(self, group):
+        while self._running:
+            if group.period is None or group.next_due > time.monotonic():
+                await self._wait_until_due(group)
+                continue
+
+            if group.period is not None:
+                now = time.monotonic()
+                next_due = group.next_due + group.period
+                if next_due <= now:
+                    # First scan, or a whole period behind: restart the grid from now
+                    if group.next_due:
+                        group.overruns += 1
+                    next_due = now + group.period
+                group.next_due = next_due
+            group.requested = False
+            await self._scan(group)
+
+    async def _wait_until_due(self, group):
+        """Sleep until the group is due, waking early for request_scan"""
+        if group.requested:
+            group.requested = False
+            if group.period is None:
+                await self._scan(group)
+            else:
+                group.next_due = 0.0
+            return
+        timeout = group.next_due - time.monotonic() if group.period is not None else FAST_GROUP_PERIOD * 10
+        self._requested.clear()
+        try:
+            await asyncio.wait_for(self._requested.wait(), max(0.0, timeout))
+        except asyncio.TimeoutError:
+            pass
+
+    async def _scan(self, group):
+        """Read every block of a group concurrently and publish them together"""
+        blocks = list(group.planner.blocks)
+        if not blocks:
+            return
+        group.in_flight = True
+        started = time.monotonic()
+        results = await asyncio.gather(*(self._read(group, block) for block in blocks))
+        values = {}
+        for result in results:
+            values.update(result)
+        group.last_duration = time.monotonic() - started
+        group.scans += 1
+        group.in_flight = False
+        if values:
+            self._publish(values, group.records)
+
+    async def _read(self, group, block):
+        try:
+            return await self.bus.execute(
+                lambda modbus: group.planner.read_block_async(modbus, block),
+                group.priority,
+                timeout=group.period,
+                modbus_id=block.unit,
+            )
+        except DeadlineExceeded:
+            # Stale request, keep the previous values rather than blanking them
+            return {}
+        except Exception as e:
+            error(f"Scan of unit {block.unit} at {block.start} failed: {str(e)}")
+            return {tag.name: None for tag in block.tags}
@@ -0,0 +1,240 @@
+import asyncio
+import heapq
+import itertools
+import os
+import threading
+import time
+from Services.logger_service import info, error
+from Services.async_modbus import AsyncModbusConnection
+from Services.bus_scheduler import (PRIORITY_TELEMETRY, PRIORITY_CONTROL, LANE_NAMES, DeadlineExceeded)
+from Services.single_flight import SingleFlight
+
+# Set to 1 to run acquisition and bus access on the asyncio core
+ASYNC_ENV = "MODBUS_ASYNC"
+
+
+def async_enabled():
+    return os.getenv(ASYNC_ENV, "").strip().lower() in ("1", "true", "yes", "on")
+
+
+def open_async_connections(config=None, **connection_args):
+    """One AsyncModbusConnection per configured port, as open_connections does for the sync core"""
+    if not config:
+        return [(AsyncModbusConnection(**connection_args), None)]
+    return [(AsyncModbusConnection(port=port, **connection_args), units) for port, units in config]
+
+
+class AsyncLane:
+    """Priority queue and worker coroutines of one connection"""
+
+    def __init__(self, modbus, units):
+        self.modbus = modbus
+        self.units = list(units or [])
+        self.name = modbus.PORT
+        self.reads = SingleFlight()
+        self.queue = []
+        self.ready = None
+        self.workers = []
+
+
+class AsyncBus:
+    """
+    Event loop thread that owns every bus connection. Scans, timeouts and
+    reconnects run as coroutines on this one loop, and a transaction waiting
+    on a slow unit costs a suspended coroutine instead of a blocked thread.
+
+    Requests are queued per connection by priority lane like BusScheduler,
+    with one worker coroutine per transaction the connection can carry at
+    once. Thread callers (Flask, the setpoint writer, the sequence engine)
+    use the same methods as on BusScheduler and get concurrent futures back;
+    coroutines on the loop await execute() directly.
+    """
+
+    def __init__(self, connections):
+        if not connections:
+            raise ValueError("At least one bus is required")
+        self.lanes = [AsyncLane(modbus, units) for modbus, units in connections]
+        self._routes = {unit: lane for lane in self.lanes for unit in lane.units}
+        self.default = self.lanes[0]
+        self.loop = None
+        self._sequence = itertools.count()
+        self._thread = None
+        self._running = False
+
+    @property
+    def modbus(self):
+        """Connection of the default bus"""
+        return self.default.modbus
+
+    def bus_for(self, modbus_id):
+        return self._routes.get(modbus_id, self.default)
+
+    def connections(self):
+        return [lane.modbus for lane in self.lanes]
+
+    def start(self):
+        """Start the event loop thread and connect every bus"""
+        if self._running:
+            return
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+        self._running = True
+        asyncio.run_coroutine_threadsafe(self._start(), self.loop).result()
+        info(f"Async bus started on {', '.join(lane.name for lane in self.lanes)}")
+
+    def stop(self):
+        """Fail queued requests, close every connection and stop the loop"""
+        if not self._running:
+            return
+        self._running = False
+        try:
+            asyncio.run_coroutine_threadsafe(self._stop(), self.loop).result(timeout=5)
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._thread.join(timeout=5)
+            self.loop.close()
+            self._thread = None
+
+    def call(self, coroutine):
+        """Run a coroutine on the loop from another thread and return a concurrent future"""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def submit(self, operation, priority=PRIORITY_TELEMETRY, deadline=None, timeout=None, modbus_id=None):
+        """
+        Thread-safe: queue the coroutine function operation(modbus) on the bus
+        of modbus_id and return a concurrent Future with its result
+        """
+        if not self._running:
+            raise RuntimeError("Bus scheduler is not running")
+        return self.call(self.execute(operation, priority, deadline, timeout, modbus_id))
+
+    def submit_to(self, modbus, operation, priority=PRIORITY_TELEMETRY, deadline=None, timeout=None):
+        """Thread-safe: queue operation on the bus of a given connection, whatever units it is routed"""
+        for lane in self.lanes:
+            if lane.modbus is modbus:
+                if not self._running:
+                    raise RuntimeError("Bus scheduler is not running")
+                return self.call(self.execute(operation, priority, deadline, timeout, lane=lane))
+        raise ValueError(f"{getattr(modbus, 'PORT', modbus)} is not one of the routed buses")
+
+    async def execute(self, operation, priority=PRIORITY_TELEMETRY, deadline=None, timeout=None, modbus_id=None,
+                      lane=None):
+        """Queue operation(modbus) and wait for its result; call from the loop"""
+        if timeout is not None:
+            expires = time.monotonic() + timeout
+            deadline = expires if deadline is None else min(deadline, expires)
+        lane = lane or self.bus_for(modbus_id)
+        future = self.loop.create_future()
+        heapq.heappush(lane.queue, (priority, next(self._sequence), operation, deadline, time.monotonic(), future))
+        lane.ready.set()
+        return await future
+
+    def pending(self):
+        """Return the number of queued requests per lane, summed over every bus"""
+        counts = {name: 0 for name in LANE_NAMES.values()}
+        for lane in self.lanes:
+            for name, count in _lane_counts(lane).items():
+                counts[name] += count
+        return counts
+
+    def stats(self):
+        """Per bus transaction stats, queue depth and unit health"""
+        buses = {}
+        for lane in self.lanes:
+            stats = lane.modbus.stats.snapshot()
+            stats["units_routed"] = lane.units
+            stats["queue"] = _lane_counts(lane)
+            stats["health"] = {str(unit): health for unit, health in lane.modbus.health.stats().items()}
+            stats["coalesced_reads"] = lane.reads.stats()
+            buses[lane.name] = stats
+        return buses
+
+    # Convenience wrappers mirroring BusScheduler, for thread callers.
+    # Concurrent reads of the same registers share one transaction.
+
+    def read_register_holding(self, register, modbus_id=None, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self._read(("holding_register", modbus_id, register, 1),
+                          lambda modbus: modbus.read_register_holding(register, modbus_id), priority, timeout)
+
+    def read_holding_block(self, start, count, modbus_id=None, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self._read(("holding", modbus_id, start, count),
+                          lambda modbus: modbus.read_holding_block(start, count, modbus_id), priority, timeout)
+
+    def read_register_input(self, address, count, slave=1, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self._read(("input_register", slave, address, count),
+                          lambda modbus: modbus.read_register_input(address, count, slave), priority, timeout)
+
+    def read_input_block(self, start, count, modbus_id=None, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self._read(("input", modbus_id, start, count),
+                          lambda modbus: modbus.read_input_block(start, count, modbus_id), priority, timeout)
+
+    def write_register(self, register, values, modbus_id=None, priority=PRIORITY_CONTROL, timeout=None):
+        # Reads queued before the write must not be handed to callers after it
+        reads = self.bus_for(modbus_id).reads
+        count = len(values) if isinstance(values, (list, tuple)) else 1
+        reads.invalidate(modbus_id, register, count)
+        future = self.submit(lambda modbus: modbus.write_register(register, values, modbus_id), priority,
+                             timeout=timeout, modbus_id=modbus_id)
+        future.add_done_callback(lambda future: reads.invalidate(modbus_id, register, count))
+        return future
+
+    def _read(self, key, operation, priority, timeout):
+        unit = key[1]
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return self.bus_for(unit).reads.run(key, lambda: self.submit(
+            operation, priority, deadline, modbus_id=unit), priority, deadline)
+
+    async def _start(self):
+        for lane in self.lanes:
+            lane.ready = asyncio.Event()
+            if not await lane.modbus.connect():
+                error(f"Could not connect to {lane.name}, retrying in the background")
+            lane.workers = [asyncio.ensure_future(self._work(lane)) for _ in range(lane.modbus.concurrency)]
+
+    async def _stop(self):
+        for lane in self.lanes:
+            for worker in lane.workers:
+                worker.cancel()
+            await asyncio.gather(*lane.workers, return_exceptions=True)
+            lane.workers = []
+            for entry in lane.queue:
+                if not entry[5].done():
+                    entry[5].set_exception(RuntimeError("Bus scheduler stopped"))
+            lane.queue = []
+            lane.modbus.close()
+
+    async def _work(self, lane):
+        while True:
+            while not lane.queue:
+                lane.ready.clear()
+                await lane.ready.wait()
+            priority, _, operation, deadline, submitted, future = heapq.heappop(lane.queue)
+            if future.done():
+                continue
+            if deadline is not None and time.monotonic() > deadline:
+                future.set_exception(DeadlineExceeded(
+                    f"{LANE_NAMES.get(priority, priority)} request expired after "
+                    f"{time.monotonic() - submitted:.3f}s in queue"
+                ))
+                continue
+            try:
+                result = await operation(lane.modbus)
+            except asyncio.CancelledError:
+                if not future.done():
+                    future.set_exception(RuntimeError("Bus scheduler stopped"))
+                raise
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+            else:
+                if not future.done():
+                    future.set_result(result)
+
+
+def _lane_counts(lane):
+    counts = {name: 0 for name in LANE_NAMES.values()}
+    for entry in list(lane.queue):
+        name = LANE_NAMES.get(entry[0], str(entry[0]))
+        counts[name] = counts.get(name, 0) + 1
+    return counts
@@ -0,0 +1,335 @@
+import asyncio
+import time
+from pymodbus.client import AsyncModbusSerialClient, AsyncModbusTcpClient
+from pymodbus.pdu import ExceptionResponse
+from Services.logger_service import info, warning
+from Services.modbus_service import SlaveException, result_outcome
+from Services.register_map import HOLDING
+from Services.frame_replay import is_replay_port
+from Services.modbus_transport import (is_tcp_port, parse_tcp_port, TransportUnavailable, DEFAULT_POOL_SIZE,
+                                       RECONNECT_DELAY, MAX_RECONNECT_DELAY)
+from Services.unit_health import UnitHealthMonitor, UnitUnavailable
+from Services.bus_stats import (BusStats, FC_READ_HOLDING, FC_READ_INPUT, FC_WRITE_MULTIPLE,
+                                OK, TIMEOUT, CRC_ERROR, EXCEPTION_RESPONSE, ERROR)
+
+# pymodbus drops and reopens the connection when its own response timeout
+# expires, which on a serial line would stall every other unit. Its timeout
+# is set this many times ours so the request is always abandoned by us first.
+# An abandoned request stays in pymodbus's transaction table, and RTU frames
+# carry no transaction id to tell a late answer from the next one, so a
+# serial client is reopened after every missed response (see _release).
+CLIENT_TIMEOUT_FACTOR = 2
+
+
+class AsyncModbusConnection:
+    """
+    asyncio counterpart of ModbusConnection on the pymodbus async clients,
+    with the same unit health, adaptive timeouts and bus stats. Coroutines
+    must run on the loop that called connect().
+
+    A serial port (or socket:// RTU URL) is one client; a tcp:// gateway is a
+    pool of pool_size clients, each handling one transaction at a time.
+    Clients that drop are reconnected in the background with backoff while
+    requests for them fail fast with TransportUnavailable.
+    """
+
+    def __init__(self,
+            port='/dev/tty.usbserial-0001',
+            baudrate=9600,
+            parity='N',
+            unit_id=1,
+            stopbits=1,
+            bytesize=8,
+            timeout=2,
+            pool_size=DEFAULT_POOL_SIZE):
+        self.PORT = port
+        self.BAUDRATE = baudrate
+        self.PARITY = parity
+        self.UNIT_ID = unit_id
+        self.STOPBITS = stopbits
+        self.BYTESIZE = bytesize
+        self.TIMEOUT = timeout
+        self.POOL_SIZE = pool_size if is_tcp_port(port) else 1
+
+        self.clients = []
+        self.health = UnitHealthMonitor(timeout)
+        self.stats = BusStats()
+        self._idle = None
+        self._reconnecting = {}
+        self._loop = None
+        self._suspended = False
+
+    @property
+    def concurrency(self):
+        return self.POOL_SIZE
+
+    @property
+    def client(self):
+        return self.clients[0] if self.clients else None
+
+    def _create_client(self):
+        if is_replay_port(self.PORT):
+            raise ValueError(f"{self.PORT}: capture replay runs on the threaded core only")
+        client_timeout = self.TIMEOUT * CLIENT_TIMEOUT_FACTOR
+        if is_tcp_port(self.PORT):
+            host, port = parse_tcp_port(self.PORT)
+            return AsyncModbusTcpClient(host, port=port, timeout=client_timeout, retries=0,
+                                        reconnect_delay=RECONNECT_DELAY, reconnect_delay_max=MAX_RECONNECT_DELAY)
+        return _count_received(AsyncModbusSerialClient(
+            port=self.PORT,
+            baudrate=self.BAUDRATE,
+            parity=self.PARITY,
+            stopbits=self.STOPBITS,
+            bytesize=self.BYTESIZE,
+            timeout=client_timeout,
+            retries=0,
+            reconnect_delay=RECONNECT_DELAY,
+            reconnect_delay_max=MAX_RECONNECT_DELAY,
+        ))
+
+    async def connect(self):
+        """Open every client; the connection is usable if at least one is up"""
+        self._loop = asyncio.get_running_loop()
+        self.clients = [self._create_client() for _ in range(self.POOL_SIZE)]
+        self._idle = asyncio.Queue()
+        for client in self.clients:
+            self._idle.put_nowait(client)
+        results = await asyncio.gather(*(client.connect() for client in self.clients), return_exceptions=True)
+        for client, connected in zip(self.clients, results):
+            if connected is not True:
+                self._schedule_reconnect(client)
+        return any(result is True for result in results)
+
+    def close(self):
+        for task in self._reconnecting.values():
+            task.cancel()
+        self._reconnecting = {}
+        for client in self.clients:
+            client.close()
+        self.clients = []
+
+    def is_connected(self):
+        return any(client.connected for client in self.clients)
+
+    def suspend(self):
+        """Fail requests with TransportUnavailable until reopen() succeeds"""
+        self._suspended = True
+
+    def reopen(self, port=None):
+        """Thread-safe: recreate the clients, optionally on a new port, and connect them"""
+        future = asyncio.run_coroutine_threadsafe(self._reopen(port), self._loop)
+        return future.result(timeout=self.TIMEOUT * CLIENT_TIMEOUT_FACTOR + 1)
+
+    async def _reopen(self, port):
+        self.close()
+        if port:
+            self.PORT = port
+        # Failures while the port was gone were not the units' fault
+        self.health.reset()
+        connected = await self.connect()
+        self._suspended = not connected
+        return connected
+
+    def _schedule_reconnect(self, client):
+        # pymodbus reconnects on its own after a connection it had is lost,
+        # this covers clients that never connected or gave up
+        if client in self._reconnecting or getattr(client.ctx, 'reconnect_task', None):
+            return
+        self._reconnecting[client] = asyncio.ensure_future(self._reconnect(client))
+
+    async def _reconnect(self, client):
+        delay = RECONNECT_DELAY
+        warning(f"Lost connection to {self.PORT}, retrying with backoff")
+        try:
+            while not client.connected:
+                await asyncio.sleep(delay)
+                if await client.connect():
+                    info(f"Reconnected to {self.PORT}")
+                    return
+                delay = min(delay * 2, MAX_RECONNECT_DELAY)
+        finally:
+            self._reconnecting.pop(client, None)
+
+    async def _request(self, modbus_id, call, function_code, count, use_breaker=True):
+        """Same contract as ModbusConnection._request, as a coroutine"""
+        health = self.health.unit(modbus_id)
+        if use_breaker:
+            if not health.allow_request():
+                raise UnitUnavailable(f"Unit {modbus_id} is not responding")
+            timeout = health.timeout(self.TIMEOUT)
+        else:
+            timeout = self.TIMEOUT
+
+        # Transport errors are not the unit's fault and leave its health alone
+        try:
+            if self._suspended:
+                raise TransportUnavailable(f"{self.PORT} is being reopened")
+            # Clients go back to the pool they came from, even if reopen() replaced it
+            idle = self._idle
+            client = await idle.get()
+            try:
+                if not client.connected:
+                    self._schedule_reconnect(client)
+                    raise TransportUnavailable(f"{self.PORT} is not connected")
+                started = time.monotonic()
+                received = getattr(client, 'received', 0)
+                garbled = False
+                try:
+                    result = await asyncio.wait_for(call(client), timeout)
+                    if _stray(result, modbus_id):
+                        result = None
+                except asyncio.TimeoutError:
+                    # Recorded like the sync client's missing response; bytes
+                    # that never made a frame were dropped by the CRC check
+                    result = None
+                    garbled = getattr(client, 'received', 0) > received
+                except Exception:
+                    self.stats.record(modbus_id, function_code, count, time.monotonic() - started, ERROR)
+                    raise
+                elapsed = time.monotonic() - started
+            except BaseException as e:
+                # A cancelled request leaves its transaction behind like a timeout
+                self._release(client, idle, missed=isinstance(e, asyncio.CancelledError))
+                raise
+        except BaseException:
+            health.record_aborted()
+            raise
+        self._release(client, idle, missed=result is None)
+
+        if result is None:
+            outcome = CRC_ERROR if garbled else TIMEOUT
+        else:
+            outcome = result_outcome(result)
+        self.stats.record(modbus_id, function_code, count, elapsed, outcome)
+        if outcome in (OK, EXCEPTION_RESPONSE):
+            health.record_success(elapsed)
+        else:
+            health.record_failure()
+        if result is None:
+            raise TimeoutError(f"No response from unit {modbus_id} within {timeout:.3f}s")
+        return result
+
+    async def probe(self, modbus_id, table, start, count, timeout=None):
+        """ModbusConnection.probe as a coroutine"""
+        if self._suspended:
+            raise TransportUnavailable(f"{self.PORT} is being reopened")
+        idle = self._idle
+        client = await idle.get()
+        try:
+            if not client.connected:
+                self._schedule_reconnect(client)
+                raise TransportUnavailable(f"{self.PORT} is not connected")
+            read = client.read_holding_registers if table == HOLDING else client.read_input_registers
+            try:
+                result = await asyncio.wait_for(read(start, count, modbus_id), timeout or self.TIMEOUT)
+            except asyncio.TimeoutError:
+                result = None
+        except BaseException as e:
+            # A cancelled request leaves its transaction behind like a timeout
+            self._release(client, idle, missed=isinstance(e, asyncio.CancelledError))
+            raise
+        missed = result is None or _stray(result, modbus_id)
+        self._release(client, idle, missed)
+        if missed:
+            raise TimeoutError(f"No response from unit {modbus_id}")
+        outcome = result_outcome(result)
+        if outcome == EXCEPTION_RESPONSE:
+            raise SlaveException(f"Modbus error: {result}")
+        if outcome != OK:
+            raise TimeoutError(f"No response from unit {modbus_id}")
+        return result.registers
+
+    def _release(self, client, idle, missed=False):
+        """
+        Return a client to the pool it came from. A serial client that missed
+        a response is reopened first, in the background, so the late answer
+        and the abandoned transaction are gone before its next request.
+        """
+        if missed and not is_tcp_port(self.PORT):
+            asyncio.ensure_future(self._flush(client, idle))
+        else:
+            idle.put_nowait(client)
+
+    async def _flush(self, client, idle):
+        try:
+            client.close()
+            client.ctx.transaction.reset()
+            if client in self.clients and not self._suspended:
+                await client.connect()
+        except Exception as e:
+            warning(f"Could not reopen {self.PORT} after a missed response: {str(e)}")
+        finally:
+            idle.put_nowait(client)
+
+    async def read_holding_block(self, start, count, modbus_id=None):
+        """Read a contiguous block of holding registers and return the raw words"""
+        if modbus_id is None:
+            modbus_id = self.UNIT_ID
+        result = await self._request(modbus_id, lambda client: client.read_holding_registers(start, count, modbus_id),
+                                     FC_READ_HOLDING, count)
+        return _registers(result)
+
+    async def read_input_block(self, start, count, modbus_id=None):
+        """Read a contiguous block of input registers and return the raw words"""
+        if modbus_id is None:
+            modbus_id = self.UNIT_ID
+        result = await self._request(modbus_id, lambda client: client.read_input_registers(start, count, modbus_id),
+                                     FC_READ_INPUT, count)
+        return _registers(result)
+
+    async def read_register_holding(self, register, modbus_id=None):
+        if modbus_id is None:
+            modbus_id = self.UNIT_ID
+        return await self._request(modbus_id, lambda client: client.read_holding_registers(register, 1, modbus_id),
+                                   FC_READ_HOLDING, 1)
+
+    async def read_register_input(self, address, count, slave=1):
+        result = await self._request(slave, lambda client: client.read_input_registers(address, count, slave),
+                                     FC_READ_INPUT, count)
+        _registers(result)
+        return result
+
+    async def write_register(self, register, values, modbus_id=None):
+        """Write registers without the breaker; returns the response, or None if it failed"""
+        if modbus_id is None:
+            modbus_id = self.UNIT_ID
+        count = len(values) if isinstance(values, (list, tuple)) else 1
+        try:
+            return await self._request(modbus_id,
+                                       lambda client: client.write_registers(register, values, modbus_id, False),
+                                       FC_WRITE_MULTIPLE, count, use_breaker=False)
+        except Exception as e:
+            warning(f"Error writing register {register} on unit {modbus_id}: {e}")
+            return None
+
+
+def _count_received(client):
+    """
+    Count the bytes a serial client receives in client.received. pymodbus
+    drops frames failing the CRC check, so bytes without a response are the
+    only sign of one.
+    """
+    protocol = client.ctx
+    callback = protocol.callback_data
+
+    def counted(data, addr=None):
+        client.received += len(data)
+        return callback(data, addr)
+
+    client.received = 0
+    protocol.callback_data = counted
+    return client
+
+
+def _stray(result, modbus_id):
+    """A response from another unit, i.e. the late answer to an abandoned request"""
+    slave_id = getattr(result, 'slave_id', None)
+    return bool(modbus_id) and slave_id is not None and slave_id != modbus_id
+
+
+def _registers(result):
+    if isinstance(result, ExceptionResponse):
+        raise SlaveException(f"Modbus error: {result}")
+    if hasattr(result, 'isError') and result.isError():
+        raise Exception(f"Modbus error: {result}")
+    return result.registers
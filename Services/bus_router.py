@@ -0,0 +1,148 @@
+import os
+import re
+from Services.logger_service import info
+from Services.modbus_service import ModbusConnection
+from Services.bus_scheduler import BusScheduler, PRIORITY_TELEMETRY, PRIORITY_CONTROL, LANE_NAMES
+
+# Which units are wired to which port, as "port=unit,unit;port=unit,unit".
+# Ports are serial devices or socket://host:port URLs of RTU gateways. Units
+# that are not listed, and requests without a unit, go to the first port.
+# Unset means a single bus on the default port.
+BUSES_ENV = "MODBUS_BUSES"
+
+
+def parse_bus_config(text):
+    """Parse a MODBUS_BUSES string into a list of (port, [units])"""
+    config = []
+    seen = {}
+    for entry in filter(None, (part.strip() for part in text.split(";"))):
+        # Ports may contain "=" themselves (replay://capture?speed=4), units never do
+        port, separator, units = entry.rpartition("=")
+        if not separator or not re.fullmatch(r"[\d,\s]*", units):
+            port, units = entry, ""
+        port = port.strip()
+        if not port:
+            raise ValueError(f"Bus entry '{entry}' has no port")
+        unit_ids = [int(unit) for unit in units.split(",") if unit.strip()]
+        for unit in unit_ids:
+            if unit in seen:
+                raise ValueError(f"Unit {unit} is routed to both {seen[unit]} and {port}")
+            seen[unit] = port
+        config.append((port, unit_ids))
+    return config
+
+
+def bus_config():
+    """Read the port routing from the environment, or None for a single bus"""
+    text = os.getenv(BUSES_ENV, "").strip()
+    return parse_bus_config(text) if text else None
+
+
+def open_connections(config=None, **connection_args):
+    """Create and initialize one ModbusConnection per configured port"""
+    if not config:
+        modbus = ModbusConnection(**connection_args)
+        modbus.initialize()
+        return [(modbus, None)]
+    connections = []
+    for port, units in config:
+        modbus = ModbusConnection(port=port, **connection_args)
+        modbus.initialize()
+        connections.append((modbus, units))
+    return connections
+
+
+class BusRouter:
+    """
+    Fans requests out over several RS485 segments. Every port keeps its own
+    BusScheduler thread, so transactions on different ports run in parallel
+    while each line still carries one transaction at a time. Requests are
+    routed by unit id; the first bus takes unrouted units.
+
+    Exposes the BusScheduler interface, so the acquisition engine, setpoint
+    writer and sequence engine work unchanged on one bus or several.
+    """
+
+    def __init__(self, connections):
+        if not connections:
+            raise ValueError("At least one bus is required")
+        self.buses = []
+        self._routes = {}
+        for modbus, units in connections:
+            scheduler = BusScheduler(modbus)
+            self.buses.append((scheduler, list(units or [])))
+            for unit in units or []:
+                self._routes[unit] = scheduler
+        self.default = self.buses[0][0]
+
+    @property
+    def modbus(self):
+        """Connection of the default bus"""
+        return self.default.modbus
+
+    def bus_for(self, modbus_id):
+        """Return the scheduler of the bus a unit is wired to"""
+        return self._routes.get(modbus_id, self.default)
+
+    def connections(self):
+        return [scheduler.modbus for scheduler, _ in self.buses]
+
+    def start(self):
+        for scheduler, _ in self.buses:
+            scheduler.start()
+        if len(self.buses) > 1:
+            info("Bus routing: " + ", ".join(
+                f"{scheduler.name} -> {units or 'unrouted units'}" for scheduler, units in self.buses))
+
+    def stop(self):
+        for scheduler, _ in self.buses:
+            scheduler.stop()
+
+    def submit(self, operation, priority=PRIORITY_TELEMETRY, deadline=None, timeout=None, modbus_id=None):
+        """Queue operation(modbus) on the bus of modbus_id and return a Future with its result"""
+        return self.bus_for(modbus_id).submit(operation, priority, deadline, timeout)
+
+    def submit_to(self, modbus, operation, priority=PRIORITY_TELEMETRY, deadline=None, timeout=None):
+        """Queue operation on the bus of a given connection, e.g. to sweep units that are not routed yet"""
+        for scheduler, _ in self.buses:
+            if scheduler.modbus is modbus:
+                return scheduler.submit(operation, priority, deadline, timeout)
+        raise ValueError(f"{getattr(modbus, 'PORT', modbus)} is not one of the routed buses")
+
+    def pending(self):
+        """Return the number of queued requests per lane, summed over every bus"""
+        counts = {name: 0 for name in LANE_NAMES.values()}
+        for scheduler, _ in self.buses:
+            for lane, count in scheduler.pending().items():
+                counts[lane] = counts.get(lane, 0) + count
+        return counts
+
+    def stats(self):
+        """Per bus transaction stats, queue depth and unit health"""
+        buses = {}
+        for scheduler, units in self.buses:
+            modbus = scheduler.modbus
+            stats = modbus.stats.snapshot()
+            stats["units_routed"] = units
+            stats["queue"] = scheduler.pending()
+            stats["health"] = {str(unit): health for unit, health in modbus.health.stats().items()}
+            stats["coalesced_reads"] = scheduler.reads.stats()
+            buses[scheduler.name] = stats
+        return buses
+
+    # Convenience wrappers mirroring BusScheduler
+
+    def read_register_holding(self, register, modbus_id=None, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self.bus_for(modbus_id).read_register_holding(register, modbus_id, priority, timeout)
+
+    def read_holding_block(self, start, count, modbus_id=None, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self.bus_for(modbus_id).read_holding_block(start, count, modbus_id, priority, timeout)
+
+    def read_register_input(self, address, count, slave=1, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self.bus_for(slave).read_register_input(address, count, slave, priority, timeout)
+
+    def read_input_block(self, start, count, modbus_id=None, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self.bus_for(modbus_id).read_input_block(start, count, modbus_id, priority, timeout)
+
+    def write_register(self, register, values, modbus_id=None, priority=PRIORITY_CONTROL, timeout=None):
+        return self.bus_for(modbus_id).write_register(register, values, modbus_id, priority, timeout)
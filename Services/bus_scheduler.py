@@ -0,0 +1,191 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Future
+from Services.logger_service import info
+from Services.single_flight import SingleFlight
+
+# Priority lanes, lower numbers go first. Requests in the same lane run in
+# the order they were submitted.
+PRIORITY_EMERGENCY = 0   # E-stop and power cut writes
+PRIORITY_CONTROL = 1     # Setpoint and control word writes
+PRIORITY_TELEMETRY = 2   # Scan reads that feed the acquisition snapshot
+PRIORITY_BACKGROUND = 3  # Diagnostics and anything that can use leftover time
+
+# Seconds a control write may wait in the queue before it is dropped rather
+# than applied late
+CONTROL_WRITE_TIMEOUT = 1.0
+
+LANE_NAMES = {
+    PRIORITY_EMERGENCY: "emergency",
+    PRIORITY_CONTROL: "control",
+    PRIORITY_TELEMETRY: "telemetry",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+class DeadlineExceeded(Exception):
+    """Raised through a future when its request expired before reaching the bus"""
+
+
+class BusRequest:
+    """A queued operation waiting for its turn on the bus"""
+
+    def __init__(self, operation, priority, deadline):
+        self.operation = operation
+        self.priority = priority
+        self.deadline = deadline
+        self.future = Future()
+        self.submitted = time.monotonic()
+
+
+class BusScheduler:
+    """
+    Single owner of a ModbusConnection. Every transaction on the RS485 line is
+    queued here and executed one at a time on the scheduler thread, so Flask
+    threads, the PID loop and the acquisition loop never talk over each other.
+
+    Requests are served by priority lane, so a control write only ever waits
+    for the transaction that is already on the wire. Transports that carry
+    several transactions at once (a pool of TCP gateway connections) get one
+    worker thread per connection.
+    """
+
+    def __init__(self, modbus, name=None):
+        self.modbus = modbus
+        self.name = name or getattr(modbus, 'PORT', 'bus')
+        self.reads = SingleFlight()
+
+        self._queue = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._running = False
+        self._threads = []
+
+    def start(self):
+        """Start the threads that own the port, one per transaction the transport can carry at once"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        workers = getattr(self.modbus, 'concurrency', 1)
+        self._threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self._threads:
+            thread.start()
+        info(f"Bus scheduler started on {self.name}" + (f" with {workers} workers" if workers > 1 else ""))
+
+    def stop(self):
+        """Stop the scheduler and fail any requests still waiting in the queue"""
+        with self._condition:
+            self._running = False
+            pending = [entry[2] for entry in self._queue]
+            self._queue = []
+            self._condition.notify_all()
+
+        for request in pending:
+            if request.future.set_running_or_notify_cancel():
+                request.future.set_exception(RuntimeError("Bus scheduler stopped"))
+
+        for thread in self._threads:
+            thread.join(timeout=5)
+        self._threads = []
+
+    def submit(self, operation, priority=PRIORITY_TELEMETRY, deadline=None, timeout=None, modbus_id=None):
+        """
+        Queue operation(modbus) and return a Future with its result.
+        modbus_id is only used for routing when several buses are in use.
+
+        deadline is an absolute time.monotonic() value and timeout is the same
+        thing relative to now. A request still queued when its deadline passes
+        is dropped and its future raises DeadlineExceeded.
+        """
+        if timeout is not None:
+            expires = time.monotonic() + timeout
+            deadline = expires if deadline is None else min(deadline, expires)
+
+        request = BusRequest(operation, priority, deadline)
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("Bus scheduler is not running")
+            heapq.heappush(self._queue, (priority, next(self._sequence), request))
+            self._condition.notify()
+        return request.future
+
+    def submit_to(self, modbus, operation, priority=PRIORITY_TELEMETRY, deadline=None, timeout=None):
+        """Queue operation on the bus of a given connection, whatever units it is routed"""
+        if modbus is not self.modbus:
+            raise ValueError(f"{getattr(modbus, 'PORT', modbus)} is not served by this scheduler")
+        return self.submit(operation, priority, deadline, timeout)
+
+    def bus_for(self, modbus_id):
+        """A single scheduler serves every unit"""
+        return self
+
+    def pending(self):
+        """Return the number of queued requests per lane"""
+        with self._condition:
+            counts = {name: 0 for name in LANE_NAMES.values()}
+            for priority, _, _ in self._queue:
+                counts[LANE_NAMES.get(priority, str(priority))] += 1
+            return counts
+
+    # Convenience wrappers mirroring ModbusConnection. Concurrent reads of
+    # the same registers share one transaction, see SingleFlight.
+
+    def read_register_holding(self, register, modbus_id=None, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self._read(("holding_register", modbus_id, register, 1),
+                          lambda modbus: modbus.read_register_holding(register, modbus_id), priority, timeout)
+
+    def read_holding_block(self, start, count, modbus_id=None, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self._read(("holding", modbus_id, start, count),
+                          lambda modbus: modbus.read_holding_block(start, count, modbus_id), priority, timeout)
+
+    def read_register_input(self, address, count, slave=1, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self._read(("input_register", slave, address, count),
+                          lambda modbus: modbus.read_register_input(address, count, slave), priority, timeout)
+
+    def read_input_block(self, start, count, modbus_id=None, priority=PRIORITY_TELEMETRY, timeout=None):
+        return self._read(("input", modbus_id, start, count),
+                          lambda modbus: modbus.read_input_block(start, count, modbus_id), priority, timeout)
+
+    def write_register(self, register, values, modbus_id=None, priority=PRIORITY_CONTROL, timeout=None):
+        # Reads queued before the write must not be handed to callers after it
+        count = len(values) if isinstance(values, (list, tuple)) else 1
+        self.reads.invalidate(modbus_id, register, count)
+        future = self.submit(lambda modbus: modbus.write_register(register, values, modbus_id), priority, timeout=timeout)
+        future.add_done_callback(lambda future: self.reads.invalidate(modbus_id, register, count))
+        return future
+
+    def _read(self, key, operation, priority, timeout):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        return self.reads.run(key, lambda: self.submit(operation, priority, deadline), priority, deadline)
+
+    def _next_request(self):
+        with self._condition:
+            while self._running and not self._queue:
+                self._condition.wait()
+            if not self._running:
+                return None
+            return heapq.heappop(self._queue)[2]
+
+    def _run(self):
+        while True:
+            request = self._next_request()
+            if request is None:
+                return
+
+            if not request.future.set_running_or_notify_cancel():
+                continue
+
+            if request.deadline is not None and time.monotonic() > request.deadline:
+                waited = time.monotonic() - request.submitted
+                request.future.set_exception(DeadlineExceeded(
+                    f"{LANE_NAMES.get(request.priority, request.priority)} request expired after {waited:.3f}s in queue"
+                ))
+                continue
+
+            try:
+                request.future.set_result(request.operation(self.modbus))
+            except Exception as e:
+                request.future.set_exception(e)
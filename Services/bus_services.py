@@ -0,0 +1,171 @@
+"""
+The bus wiring and tag routes shared by the Flask app in CritSrvs/server.py
+and the modbus blueprint in modbus_routes.py. Both start their buses with
+BusServices and hand the snapshot, stream and batch routes to the handlers
+here, so the two APIs cannot drift apart.
+"""
+import os
+from flask import Response, jsonify, request
+from Services.acquisition_service import AcquisitionEngine
+from Services.async_acquisition import AsyncAcquisitionEngine
+from Services.async_bus import AsyncBus, async_enabled, open_async_connections
+from Services.bus_router import BusRouter, bus_config, open_connections
+from Services.connection_supervisor import ConnectionSupervisor
+from Services.device_discovery import DiscoveryService
+from Services.logger_service import info, error
+from Services.register_map import REGISTER_MAP
+from Services.scan_planner import batch_query, DEFAULT_MAX_GAP
+from Services.sequence_engine import SequenceEngine
+from Services.setpoint_writer import SetpointWriter
+from Services.tag_snapshot import (select_tags, split_list, SnapshotCache, parse_etag, parse_wait, etag,
+                                   DEFAULT_WAIT)
+from Services.tag_stream import TagStream, parse_rate
+
+# Serialized /api/snapshot documents, shared by every poller until the next publish
+snapshots = SnapshotCache()
+
+# MQTT topic the change detector's deltas are published to; unset publishes nothing
+MQTT_CHANGES_ENV = "MQTT_CHANGES_TOPIC"
+
+
+class BusServices:
+    """
+    Everything that talks to the RS485 buses. Creating it only builds the
+    connections, one per segment (MODBUS_BUSES) with the first one as the
+    default bus, and raises on an invalid configuration. start() brings up
+    the rest; ports that are not there yet are opened by the supervisor.
+    """
+
+    def __init__(self, use_async=None):
+        # MODBUS_ASYNC runs bus access and acquisition on one event loop
+        self.use_async = async_enabled() if use_async is None else use_async
+        self.connections = (open_async_connections if self.use_async else open_connections)(bus_config())
+        self.modbus = self.connections[0][0]
+        self.bus = None
+        self.setpoints = None
+        self.sequences = None
+        self.discovery = None
+        self.acquisition = None
+        self.supervisor = None
+        self._publish_changes = None
+
+    def start(self):
+        # Every transaction goes through the scheduler of the bus its unit is wired to
+        self.bus = AsyncBus(self.connections) if self.use_async else BusRouter(self.connections)
+        self.bus.start()
+
+        # Setpoint writes are coalesced so a slider cannot flood the line
+        self.setpoints = SetpointWriter(self.bus)
+        self.setpoints.start()
+
+        # Start sequences run in the background as control-lane transactions
+        self.sequences = SequenceEngine(self.bus)
+
+        # Unit id sweeps for commissioning, in the background lane of the live buses
+        self.discovery = DiscoveryService(self.bus)
+
+        # Every tag in the register map is kept fresh by the acquisition engine
+        engine = AsyncAcquisitionEngine if self.use_async else AcquisitionEngine
+        self.acquisition = engine(self.bus, REGISTER_MAP.poll_groups())
+        self.acquisition.start()
+
+        # Lost ports are re-opened in the background while the last snapshot
+        # is served marked stale
+        acquisition = self.acquisition
+        self.supervisor = ConnectionSupervisor(self.bus.connections())
+        self.supervisor.subscribe(lambda name, connected: acquisition.set_stale(name, not connected))
+        self.supervisor.start()
+
+        # Report-by-exception: only values that moved past their deadband go to MQTT
+        topic = os.getenv(MQTT_CHANGES_ENV, "").strip()
+        if topic:
+            from Services.CritSrvs.mqtt_service import MQTTService
+            mqtt = MQTTService()
+            self._publish_changes = lambda delta: mqtt.publish_changes(topic, delta)
+            self.acquisition.changes.subscribe(self._publish_changes)
+            info(f"Publishing tag changes to MQTT topic {topic}")
+        return self
+
+    def stop(self):
+        """Stop everything started, in reverse order, and close every connection"""
+        if self.supervisor:
+            self.supervisor.stop()
+        if self._publish_changes:
+            self.acquisition.changes.unsubscribe(self._publish_changes)
+            self._publish_changes = None
+        if self.acquisition:
+            self.acquisition.stop()
+        if self.setpoints:
+            self.setpoints.stop()
+        if self.bus:
+            self.bus.stop()
+        for connection, _ in self.connections[1:]:
+            connection.close()
+        try:
+            self.modbus.close()
+            info("Modbus connection closed")
+        except Exception as e:
+            error(f"Error closing Modbus connection: {str(e)}")
+
+
+def snapshot_response(acquisition):
+    """
+    /api/snapshot: every current tag value with its timestamp and quality,
+    optionally filtered by device or tag. Answers 304 when the client
+    already has the current seq of its tags (If-None-Match or since=),
+    after holding a since= request up to wait seconds for one of them to
+    change.
+    """
+    devices = split_list(request.args.get('devices'))
+    names = split_list(request.args.get('tags'))
+    since = request.args.get('since', type=int)
+    try:
+        tags = select_tags(devices, names)
+        wait = parse_wait(request.args.get('wait'), DEFAULT_WAIT if since is not None else 0)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+
+    known = since if since is not None else parse_etag(request.headers.get('If-None-Match'))
+    if known is not None and wait:
+        acquisition.wait_for_update(known, wait, [tag.name for tag in tags])
+    seq, body = snapshots.get(acquisition, tags, (tuple(devices or ()), tuple(names or ())))
+    headers = {'ETag': etag(seq), 'Cache-Control': 'no-cache'}
+    if seq == known:
+        return Response(status=304, headers=headers)
+    return Response(body, mimetype='application/json', headers=headers)
+
+
+def stream_response(acquisition):
+    """/api/stream: Server-Sent Events of tag updates, filtered like /api/snapshot and throttled to rate per second"""
+    try:
+        tags = select_tags(split_list(request.args.get('devices')), split_list(request.args.get('tags')))
+        stream = TagStream(acquisition, tags, parse_rate(request.args.get('rate')))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return Response(stream.events(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+def batch_response(bus):
+    """
+    Batch read: a list of {unit, address, type, wordOrder, table} values
+    read in the fewest block transactions, with a value or an error for each
+    """
+    data = request.get_json(silent=True) or {}
+    reads = data.get('reads')
+    max_gap = data.get('maxGap', DEFAULT_MAX_GAP)
+    if not isinstance(reads, list) or not isinstance(max_gap, int) or max_gap < 0:
+        return jsonify({
+            "status": "error",
+            "message": "Expected {\"reads\": [{\"unit\", \"address\", \"type\"}, ...]} with an optional maxGap >= 0"
+        }), 400
+    try:
+        results, transactions = batch_query(bus, reads, max_gap)
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    info(f"Batch read of {len(reads)} values in {transactions} transactions")
+    return jsonify({
+        "status": "success",
+        "transactions": transactions,
+        "results": results
+    })
@@ -0,0 +1,171 @@
+import bisect
+import threading
+import time
+from Services.rtu_timing import (READ_REQUEST_BYTES, READ_RESPONSE_OVERHEAD,
+                                 WRITE_REQUEST_OVERHEAD, WRITE_RESPONSE_BYTES)
+
+# Upper bounds in seconds of the latency histogram buckets. The last bucket
+# catches everything slower.
+LATENCY_BUCKETS = (0.005, 0.01, 0.02, 0.05, 0.1, 0.2, 0.5, 1.0, 2.0)
+
+# Seconds of busy time history kept to compute the bus utilization
+UTILIZATION_WINDOW = 60
+
+# Modbus function codes we issue
+FC_READ_HOLDING = 3
+FC_READ_INPUT = 4
+FC_WRITE_MULTIPLE = 16
+
+EXCEPTION_RESPONSE_BYTES = 5     # id, fc | 0x80, exception code, crc(2)
+
+OK = "ok"
+TIMEOUT = "timeout"
+CRC_ERROR = "crc_error"
+EXCEPTION_RESPONSE = "exception"
+ERROR = "error"
+OUTCOMES = (OK, TIMEOUT, CRC_ERROR, EXCEPTION_RESPONSE, ERROR)
+
+
+class LatencyHistogram:
+    """Fixed bucket latency histogram; observing a value allocates nothing"""
+
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, percent):
+        """Upper bound of the bucket holding the given percentile"""
+        if not self.count:
+            return None
+        target = self.count * percent / 100
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max
+        return self.max
+
+    def to_dict(self):
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else None,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p95": self.percentile(95),
+            "p99": self.percentile(99),
+            "buckets": dict(zip([str(bound) for bound in LATENCY_BUCKETS] + ["inf"], self.counts)),
+        }
+
+
+class TransactionCounters:
+    """Outcome and byte counters of one (unit, function code) pair"""
+
+    __slots__ = ("latency", "outcomes", "bytes_sent", "bytes_received")
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.outcomes = dict.fromkeys(OUTCOMES, 0)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    def to_dict(self):
+        return {
+            "latency": self.latency.to_dict(),
+            "outcomes": dict(self.outcomes),
+            "bytes_sent": self.bytes_sent,
+            "bytes_received": self.bytes_received,
+        }
+
+
+def frame_bytes(function_code, count, outcome):
+    """Request and response bytes on the wire for one transaction"""
+    if function_code == FC_WRITE_MULTIPLE:
+        sent, received = WRITE_REQUEST_OVERHEAD + 2 * count, WRITE_RESPONSE_BYTES
+    else:
+        sent, received = READ_REQUEST_BYTES, READ_RESPONSE_OVERHEAD + 2 * count
+    if outcome == EXCEPTION_RESPONSE:
+        received = EXCEPTION_RESPONSE_BYTES
+    elif outcome != OK:
+        received = 0
+    return sent, received
+
+
+class BusStats:
+    """
+    Transaction instrumentation for a ModbusConnection: latency histograms
+    and outcome counters per unit and function code, bytes on the wire and
+    the share of the last minute the bus spent in transactions. Counters are
+    created once per (unit, function code) pair, so recording is only a few
+    additions under a lock.
+    """
+
+    def __init__(self, window=UTILIZATION_WINDOW):
+        self.window = window
+        self.started = time.monotonic()
+        self._counters = {}
+        self._busy = [0.0] * window
+        self._busy_second = [0] * window
+        self._lock = threading.Lock()
+
+    def record(self, modbus_id, function_code, count, elapsed, outcome):
+        sent, received = frame_bytes(function_code, count, outcome)
+        second = int(time.monotonic())
+        slot = second % self.window
+        with self._lock:
+            counters = self._counters.get((modbus_id, function_code))
+            if counters is None:
+                counters = self._counters[(modbus_id, function_code)] = TransactionCounters()
+            counters.latency.observe(elapsed)
+            counters.outcomes[outcome] += 1
+            counters.bytes_sent += sent
+            counters.bytes_received += received
+
+            if self._busy_second[slot] != second:
+                self._busy_second[slot] = second
+                self._busy[slot] = 0.0
+            self._busy[slot] += elapsed
+
+    def utilization(self):
+        """Fraction of the last window seconds the bus spent in transactions"""
+        now = int(time.monotonic())
+        with self._lock:
+            busy = sum(busy for busy, second in zip(self._busy, self._busy_second)
+                       if now - self.window < second <= now)
+        span = min(self.window, max(1.0, time.monotonic() - self.started))
+        return min(1.0, busy / span)
+
+    def snapshot(self):
+        """Return all counters, per unit and function code, plus totals"""
+        with self._lock:
+            counters = {key: value.to_dict() for key, value in self._counters.items()}
+
+        units = {}
+        totals = dict.fromkeys(OUTCOMES, 0)
+        bytes_sent = bytes_received = 0
+        for (modbus_id, function_code), value in sorted(counters.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+            units.setdefault(str(modbus_id), {})[str(function_code)] = value
+            for outcome, count in value["outcomes"].items():
+                totals[outcome] += count
+            bytes_sent += value["bytes_sent"]
+            bytes_received += value["bytes_received"]
+
+        return {
+            "uptime": time.monotonic() - self.started,
+            "utilization_percent": self.utilization() * 100,
+            "transactions": sum(totals.values()),
+            "outcomes": totals,
+            "bytes_sent": bytes_sent,
+            "bytes_received": bytes_received,
+            "units": units,
+        }
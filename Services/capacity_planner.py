@@ -0,0 +1,221 @@
+"""
+Bus capacity planner and throughput benchmark.
+
+Predicts how much of the RS485 line a set of tags needs at each baud rate,
+from frame sizes, inter-frame gaps and slave turnaround, and optionally
+measures the real scan rate against hardware or the simulator.
+
+    python -m Services.capacity_planner --baud 9600 19200 115200
+    python -m Services.capacity_planner --tags tags.json --benchmark /dev/ttyUSB0 --baud 9600
+    python -m Services.capacity_planner --simulate --baud 19200 --duration 10
+
+A tags file is a JSON list of {"name", "unit", "address", "period"} objects,
+with optional "type" (default uint16), "word_order" (big or little) and
+"table" (holding or input).
+"""
+import argparse
+import json
+import time
+from Services.register_map import REGISTER_MAP, RegisterTag, HOLDING
+from Services.scan_planner import plan_reads, ScanPlanner, DEFAULT_MAX_GAP
+from Services.acquisition_service import POLL_CLASSES
+from Services.rtu_timing import (char_time, inter_frame_gap, DEFAULT_TURNAROUND,
+                                 READ_REQUEST_BYTES, READ_RESPONSE_OVERHEAD)
+
+COMMON_BAUDRATES = (9600, 19200, 38400, 57600, 115200)
+
+# Utilization above this leaves too little room for control writes and retries
+SAFE_UTILIZATION = 0.7
+
+
+def tags_by_period(tags=None):
+    """Group register map tags (or tags with a .period) by poll period in seconds"""
+    groups = {}
+    if tags is None:
+        for poll_class, class_tags in REGISTER_MAP.poll_groups().items():
+            period = POLL_CLASSES.get(poll_class)
+            if period is not None:
+                groups.setdefault(period, []).extend(class_tags)
+        return groups
+    for tag, period in tags:
+        groups.setdefault(period, []).append(tag)
+    return groups
+
+
+def load_tags(path):
+    """Read a JSON tags file into (RegisterTag, period) pairs"""
+    with open(path) as f:
+        entries = json.load(f)
+    return [(RegisterTag(entry["name"], entry["unit"], entry["address"], entry.get("type", "uint16"),
+                         entry.get("word_order", "big"), table=entry.get("table", HOLDING)), float(entry["period"]))
+            for entry in entries]
+
+
+def block_timing(count, baudrate, bytesize=8, parity='N', stopbits=1, turnaround=DEFAULT_TURNAROUND):
+    """Wire time breakdown of one read of count registers"""
+    char = char_time(baudrate, bytesize, parity, stopbits)
+    gap = inter_frame_gap(baudrate, bytesize, parity, stopbits)
+    request_bytes = READ_REQUEST_BYTES
+    response_bytes = READ_RESPONSE_OVERHEAD + 2 * count
+    request_time = request_bytes * char
+    response_time = response_bytes * char
+    return {
+        "count": count,
+        "request_bytes": request_bytes,
+        "response_bytes": response_bytes,
+        "request_time": request_time,
+        "response_time": response_time,
+        "gaps": 2 * gap,
+        "turnaround": turnaround,
+        "total": request_time + response_time + 2 * gap + turnaround,
+    }
+
+
+def plan_capacity(groups, baudrate, max_gap=DEFAULT_MAX_GAP, turnaround=DEFAULT_TURNAROUND, **framing):
+    """
+    Predict the bus load of polling each group at its period. The maximum
+    cycle rate is how often every tag could be read if the bus did nothing
+    else; headroom is how much faster all groups could poll before the
+    bus is saturated.
+    """
+    report_groups = []
+    utilization = 0.0
+    full_cycle = 0.0
+    for period, tags in sorted(groups.items()):
+        blocks = plan_reads(tags, max_gap)
+        timings = [block_timing(block.count, baudrate, turnaround=turnaround, **framing) for block in blocks]
+        cycle_time = sum(timing["total"] for timing in timings)
+        load = cycle_time / period
+        utilization += load
+        full_cycle += cycle_time
+        report_groups.append({
+            "period": period,
+            "tags": len(tags),
+            "blocks": len(blocks),
+            "registers": sum(block.count for block in blocks),
+            "cycle_time": cycle_time,
+            "utilization": load,
+            "max_rate": 1 / cycle_time if cycle_time else None,
+            "transactions": [dict(timing, unit=block.unit, start=block.start)
+                             for block, timing in zip(blocks, timings)],
+        })
+
+    return {
+        "baudrate": baudrate,
+        "char_time": char_time(baudrate, **framing),
+        "inter_frame_gap": inter_frame_gap(baudrate, **framing),
+        "turnaround": turnaround,
+        "utilization": utilization,
+        "headroom": 1 / utilization if utilization else None,
+        "max_cycle_rate": 1 / full_cycle if full_cycle else None,
+        "feasible": utilization <= SAFE_UTILIZATION,
+        "groups": report_groups,
+    }
+
+
+def benchmark(modbus, groups, duration=10.0, max_gap=DEFAULT_MAX_GAP):
+    """
+    Read every group back to back for duration seconds and measure the real
+    cycle rate and transaction time, to compare with plan_capacity
+    """
+    tags = [tag for group in groups.values() for tag in group]
+    planner = ScanPlanner(tags, max_gap)
+    transactions = len(planner.blocks)
+
+    cycles = 0
+    failures = 0
+    started = time.monotonic()
+    while time.monotonic() - started < duration:
+        values = planner.read(modbus)
+        failures += sum(1 for value in values.values() if value is None)
+        cycles += 1
+    elapsed = time.monotonic() - started
+
+    return {
+        "cycles": cycles,
+        "elapsed": elapsed,
+        "cycle_rate": cycles / elapsed if cycles and elapsed else None,
+        "cycle_time": elapsed / cycles if cycles else None,
+        "transaction_time": elapsed / (cycles * transactions) if cycles and transactions else None,
+        "transactions_per_cycle": transactions,
+        "failed_values": failures,
+    }
+
+
+def format_report(report, measured=None):
+    max_rate = report["max_cycle_rate"]
+    predicted = 1 / max_rate if max_rate else None
+    lines = [f"{report['baudrate']} baud: {report['utilization'] * 100:.1f}% of the bus, "
+             f"full scan {_ms(predicted)} ({_rate(max_rate)} max), "
+             f"{'ok' if report['feasible'] else 'OVER BUDGET'}"]
+    for group in report["groups"]:
+        lines.append(f"  every {group['period']}s: {group['tags']} tags in {group['blocks']} reads, "
+                     f"{_ms(group['cycle_time'])} per scan, {group['utilization'] * 100:.1f}% of the bus")
+    if measured:
+        cycle_time = measured["cycle_time"]
+        ratio = f"{cycle_time / predicted:.2f}x" if cycle_time and predicted else "n/a"
+        lines.append(f"  measured: {_rate(measured['cycle_rate'])}, {_ms(cycle_time)} per scan "
+                     f"({ratio} predicted), {measured['failed_values']} failed values")
+    return "\n".join(lines)
+
+
+def _ms(seconds):
+    """Seconds as milliseconds, or n/a when there is nothing to time (an empty plan or no completed cycle)"""
+    return "n/a" if seconds is None else f"{seconds * 1000:.1f} ms"
+
+
+def _rate(rate):
+    return "n/a" if rate is None else f"{rate:.1f} scans/s"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Predict and measure RS485 bus capacity for a scan plan")
+    parser.add_argument("--tags", help="JSON tags file, defaults to the register map")
+    parser.add_argument("--baud", type=int, nargs="+", default=list(COMMON_BAUDRATES))
+    parser.add_argument("--turnaround", type=float, default=DEFAULT_TURNAROUND, help="slave turnaround in seconds")
+    parser.add_argument("--max-gap", type=int, default=DEFAULT_MAX_GAP)
+    parser.add_argument("--benchmark", metavar="PORT", help="measure against the devices on this serial port")
+    parser.add_argument("--simulate", action="store_true", help="measure against the virtual slave farm")
+    parser.add_argument("--duration", type=float, default=10.0, help="benchmark seconds per baud rate")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+
+    groups = tags_by_period(load_tags(args.tags) if args.tags else None)
+    results = []
+    for baudrate in args.baud:
+        report = plan_capacity(groups, baudrate, args.max_gap, args.turnaround)
+        measured = None
+        if args.benchmark or args.simulate:
+            measured = _run_benchmark(args, groups, baudrate)
+        results.append({"plan": report, "measured": measured})
+        if not args.json:
+            print(format_report(report, measured))
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+def _run_benchmark(args, groups, baudrate):
+    from Services.modbus_service import ModbusConnection
+
+    farm = None
+    port = args.benchmark
+    if args.simulate:
+        from Simulator.farm import SlaveFarm
+        farm = SlaveFarm(response_delay=args.turnaround, baudrate=baudrate)
+        port = farm.start_tcp()
+
+    modbus = ModbusConnection(port=port, baudrate=baudrate, timeout=1)
+    modbus.initialize()
+    try:
+        if not modbus.connect():
+            raise RuntimeError(f"Could not open {port}")
+        return benchmark(modbus, groups, args.duration, args.max_gap)
+    finally:
+        modbus.close()
+        if farm:
+            farm.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+import threading
+import time
+from collections import deque
+from Services.logger_service import error
+from Services.register_map import REGISTER_MAP
+
+# A tag is reported at least this often even if it stays inside its deadband
+MAX_SILENCE = 60.0
+
+# Deltas kept for consumers catching up with since()
+HISTORY_SIZE = 1000
+
+
+class ChangeDetector:
+    """
+    Report-by-exception stage behind the acquisition snapshot.
+
+    Every published scan is compared against the value last reported for
+    each tag. Only values that moved outside the tag's deadband, changed
+    between None and a reading, or have been silent for max_silence are
+    emitted, as one delta with a sequence number. Consumers either
+    subscribe to deltas or fetch the ones after a sequence they have seen.
+    """
+
+    def __init__(self, register_map=REGISTER_MAP, max_silence=MAX_SILENCE, history_size=HISTORY_SIZE):
+        self.register_map = register_map
+        self.max_silence = max_silence
+        self.seq = 0
+        self._current = {}
+        self._reported = {}
+        self._history = deque(maxlen=history_size)
+        self._subscribers = []
+        self._lock = threading.Lock()
+
+    def subscribe(self, callback):
+        """Call callback(delta) for every delta from now on"""
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def process(self, values, timestamp=None):
+        """Compare a scan against the last reported values and emit a delta if anything changed"""
+        timestamp = time.time() if timestamp is None else timestamp
+        with self._lock:
+            self._current.update(values)
+            changed = {}
+            for name, value in self._current.items():
+                reported = self._reported.get(name)
+                if reported is None:
+                    changed[name] = value
+                elif name in values and self._exceeds_deadband(name, reported[0], value):
+                    changed[name] = value
+                elif timestamp - reported[1] >= self.max_silence:
+                    changed[name] = value
+
+            if not changed:
+                return None
+
+            for name, value in changed.items():
+                self._reported[name] = (value, timestamp)
+            self.seq += 1
+            delta = {"seq": self.seq, "timestamp": timestamp, "values": changed}
+            self._history.append(delta)
+            subscribers = list(self._subscribers)
+
+        for callback in subscribers:
+            try:
+                callback(delta)
+            except Exception as e:
+                error(f"Change subscriber failed: {str(e)}")
+        return delta
+
+    def since(self, seq):
+        """
+        Return the deltas after seq. A consumer that fell out of the history
+        gets the full set of last reported values instead, flagged as a reset.
+        """
+        with self._lock:
+            oldest = self._history[0]["seq"] if self._history else self.seq + 1
+            if seq == self.seq:
+                return {"seq": self.seq, "reset": False, "changes": []}
+            # Ahead of us means the server restarted since the consumer last asked
+            if seq > self.seq or seq + 1 < oldest:
+                values = {name: reported[0] for name, reported in self._reported.items()}
+                return {
+                    "seq": self.seq,
+                    "reset": True,
+                    "changes": [{"seq": self.seq, "timestamp": time.time(), "values": values}],
+                }
+            return {
+                "seq": self.seq,
+                "reset": False,
+                "changes": [delta for delta in self._history if delta["seq"] > seq],
+            }
+
+    def _exceeds_deadband(self, name, old, new):
+        if old is None or new is None or isinstance(old, list) or isinstance(new, list):
+            return old != new
+
+        if name in self.register_map:
+            tag = self.register_map[name]
+            deadband = tag.deadband
+            if tag.deadband_percent is not None:
+                deadband = max(deadband, abs(old) * tag.deadband_percent / 100)
+        else:
+            deadband = 0
+
+        if deadband == 0:
+            return new != old
+        return abs(new - old) > deadband
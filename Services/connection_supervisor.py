@@ -0,0 +1,158 @@
+import glob
+import os
+import threading
+import time
+from Services.logger_service import info, warning
+
+# Seconds between checks of every port
+CHECK_INTERVAL = 1.0
+
+# Backoff between attempts to re-open a lost port
+REOPEN_DELAY = 1.0
+MAX_REOPEN_DELAY = 30.0
+
+# Where udev links USB serial adapters by vendor, model and serial number.
+# These names survive re-plugging, unlike /dev/ttyUSBn.
+SERIAL_BY_ID = "/dev/serial/by-id"
+
+# Glob of the adapter names in SERIAL_BY_ID a lost port may be re-opened on,
+# e.g. "usb-FTDI_*". Unset means only the configured port is retried.
+ADAPTER_ENV = "MODBUS_ADAPTER"
+
+
+class PortState:
+    """Supervision state of one bus connection"""
+
+    def __init__(self, modbus):
+        self.modbus = modbus
+        self.name = modbus.PORT
+        self.connected = modbus.is_connected()
+        self.since = time.time()
+        self.attempts = 0
+        self.delay = REOPEN_DELAY
+        self.next_attempt = 0.0
+        self.last_error = None
+
+    def to_dict(self):
+        return {
+            "bus": self.name,
+            "port": self.modbus.PORT,
+            "connected": self.connected,
+            "since": self.since,
+            "attempts": self.attempts,
+            "next_attempt_in": None if self.connected else max(0.0, self.next_attempt - time.monotonic()),
+            "last_error": self.last_error,
+        }
+
+
+class ConnectionSupervisor:
+    """
+    Watches every bus connection from one background thread. A port that
+    disappears (adapter unplugged, socket closed) is suspended so requests
+    fail fast instead of waiting out timeouts, then re-opened with backoff.
+    With an adapter pattern, a device path that is gone is replaced by a
+    matching /dev/serial/by-id link. Request threads never wait on a re-open.
+
+    Subscribers are called with (bus name, connected) on every change, e.g.
+    to mark the acquisition snapshot stale while a bus is down.
+    """
+
+    def __init__(self, connections, interval=CHECK_INTERVAL, adapter=None):
+        self.states = [PortState(modbus) for modbus in connections]
+        self.interval = interval
+        self.adapter = os.getenv(ADAPTER_ENV) if adapter is None else adapter
+        self._subscribers = []
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def connected(self):
+        return all(state.connected for state in self.states)
+
+    def subscribe(self, callback):
+        self._subscribers.append(callback)
+
+    def start(self):
+        """Open every port in the background and keep watching them"""
+        if self._thread:
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def status(self):
+        return [state.to_dict() for state in self.states]
+
+    def _run(self):
+        while not self._stop.is_set():
+            for state in self.states:
+                try:
+                    self._check(state)
+                except Exception as e:
+                    state.last_error = str(e)
+                    warning(f"Supervisor check of {state.name} failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def _check(self, state):
+        if state.connected:
+            if not self._lost(state.modbus):
+                return
+            warning(f"Lost {state.modbus.PORT}, serving the last snapshot while it is re-opened")
+            state.modbus.suspend()
+            self._set_connected(state, False)
+            return
+
+        now = time.monotonic()
+        if now < state.next_attempt:
+            return
+        state.attempts += 1
+        port = self._find_port(state)
+        try:
+            reopened = state.modbus.reopen(port)
+            state.last_error = None if reopened else f"Could not open {port}"
+        except Exception as e:
+            reopened = False
+            state.last_error = str(e)
+
+        if reopened:
+            info(f"Opened {state.modbus.PORT} after {state.attempts} attempt(s)")
+            state.attempts = 0
+            state.delay = REOPEN_DELAY
+            self._set_connected(state, True)
+        else:
+            state.next_attempt = now + state.delay
+            state.delay = min(state.delay * 2, MAX_REOPEN_DELAY)
+
+    def _lost(self, modbus):
+        port = modbus.PORT
+        if port.startswith("/dev/") and not os.path.exists(port):
+            return True
+        return not modbus.is_connected()
+
+    def _find_port(self, state):
+        """The configured port if it exists, else an unused adapter from /dev/serial/by-id"""
+        port = state.modbus.PORT
+        if not port.startswith("/dev/") or os.path.exists(port) or not self.adapter:
+            return port
+        in_use = {other.modbus.PORT for other in self.states if other is not state}
+        for candidate in sorted(glob.glob(os.path.join(SERIAL_BY_ID, self.adapter))):
+            if candidate in in_use:
+                continue
+            info(f"{port} is gone, trying adapter {candidate}")
+            return candidate
+        return port
+
+    def _set_connected(self, state, connected):
+        state.connected = connected
+        state.since = time.time()
+        for callback in self._subscribers:
+            try:
+                callback(state.name, connected)
+            except Exception as e:
+                warning(f"Connection subscriber failed: {str(e)}")
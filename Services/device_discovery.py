@@ -0,0 +1,427 @@
+"""
+Unit id discovery and device fingerprinting for commissioning.
+
+Sweeps unit ids on every port, trying each baud rate and parity until a
+line setting gets answers, then fingerprints every responder by reading the
+registers of the devices in the register map. The result is a configuration
+ready to use: the MODBUS_BUSES routing, the line settings per port and the
+tags re-addressed to the unit ids found, in the capacity planner's tags
+file format. Ports are swept in parallel.
+
+    python -m Services.device_discovery --port /dev/ttyUSB0 /dev/ttyUSB1 --output bus.json
+    python -m Services.device_discovery --port /dev/ttyUSB0 --baud 9600 19200 --parity N E --units 1-32
+    python -m Services.device_discovery --simulate
+
+Run it on ports the HMI is not using. On a running server, POST /api/discovery
+sweeps the live buses at their configured line settings instead.
+"""
+import argparse
+import asyncio
+import json
+import logging
+import re
+import threading
+import time
+from pymodbus.exceptions import ModbusIOException, ConnectionException
+from Services.logger_service import info, error
+from Services.register_map import REGISTER_MAP, HOLDING
+from Services.scan_planner import plan_reads
+from Services.modbus_service import SlaveException
+from Services.async_modbus import AsyncModbusConnection
+from Services.acquisition_service import POLL_CLASSES
+from Services.bus_scheduler import PRIORITY_BACKGROUND
+
+# Every address a Modbus RTU slave may use
+ALL_UNITS = range(1, 248)
+
+# Line settings tried in order; most of our devices ship at 9600 8N1
+DISCOVERY_BAUDRATES = (9600, 19200, 38400, 57600, 115200)
+DISCOVERY_PARITIES = ("N", "E", "O")
+
+# Silence after which a unit id is taken as unused. Answering a one register
+# read takes about 20 ms at 9600 baud plus the slave's turnaround.
+PROBE_TIMEOUT = 0.1
+
+# Timeout of the fingerprint reads, sent to units known to be there
+FINGERPRINT_TIMEOUT = 0.5
+
+# Register every responder is first asked for. Any answer, even an
+# exception response, proves a unit is at that address.
+PRESENCE_REGISTER = 0
+
+# What a probe of an unused address raises: silence, or the client giving
+# up on the read itself
+ABSENT = (TimeoutError, ModbusIOException, ConnectionException)
+
+IDLE = "idle"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+def parse_units(text):
+    """Parse a unit list such as "1-32,100" into sorted unit ids"""
+    units = set()
+    for part in filter(None, (part.strip() for part in text.split(","))):
+        first, _, last = part.partition("-")
+        units.update(range(int(first), int(last or first) + 1))
+    invalid = [unit for unit in units if unit not in ALL_UNITS]
+    if invalid:
+        raise ValueError(f"Unit ids must be 1-247, got {invalid}")
+    return sorted(units)
+
+
+class DeviceTemplate:
+    """
+    One device of the register map (the tags sharing a name prefix, e.g.
+    "vfd1" or "pm480") and the reads that fingerprint it
+    """
+
+    def __init__(self, name, unit, tags):
+        self.name = name
+        self.unit = unit
+        self.tags = tags
+        # Mapped registers only, so gaps a real device rejects are never read
+        self.blocks = plan_reads(tags, max_gap=0)
+
+    @property
+    def registers(self):
+        return sum(block.count for block in self.blocks)
+
+    def tags_for(self, unit, name=None):
+        """The template's tags re-addressed to a unit, as tags file entries"""
+        entries = []
+        for tag in self.tags:
+            entry = {
+                "name": tag.name if name is None else name + tag.name[len(self.name):],
+                "unit": unit,
+                "address": tag.address,
+                "type": tag.type,
+                "table": tag.table,
+                "word_order": tag.word_order,
+                "scale": tag.scale,
+                "eng_unit": tag.eng_unit,
+                "label": tag.label,
+                "poll": tag.poll,
+            }
+            if POLL_CLASSES.get(tag.poll) is not None:
+                entry["period"] = POLL_CLASSES[tag.poll]
+            entries.append(entry)
+        return entries
+
+
+def device_templates(register_map=REGISTER_MAP):
+    """One template per device of the register map, keyed by name prefix"""
+    devices = {}
+    for tag in register_map:
+        name = tag.name.split(".")[0] if isinstance(tag.name, str) and "." in tag.name else f"unit{tag.unit}"
+        devices.setdefault((name, tag.unit), []).append(tag)
+    return [DeviceTemplate(name, unit, tags) for (name, unit), tags in sorted(devices.items())]
+
+
+async def fingerprint(probe, unit, templates):
+    """
+    Read each template's registers from a unit and return the names of the
+    templates it answers in full, most registers first
+    """
+    answered = {}
+    matches = []
+    for template in templates:
+        for block in template.blocks:
+            key = (block.table, block.start, block.count)
+            if key not in answered:
+                try:
+                    await probe(unit, block.table, block.start, block.count, FINGERPRINT_TIMEOUT)
+                    answered[key] = True
+                except (SlaveException, *ABSENT):
+                    answered[key] = False
+            if not answered[key]:
+                break
+        else:
+            matches.append(template)
+    matches.sort(key=lambda template: (-template.registers, template.name))
+    return [template.name for template in matches]
+
+
+async def sweep(probe, units=ALL_UNITS, timeout=PROBE_TIMEOUT, progress=None, workers=1):
+    """
+    Return the unit ids that answer a presence read. probe(unit, table,
+    start, count, timeout) is a connection's probe coroutine or a queued
+    equivalent; with workers above 1 (a TCP gateway pool) units are probed
+    concurrently.
+    """
+    pending = iter(list(units))
+    found = []
+
+    async def run():
+        for unit in pending:
+            try:
+                await probe(unit, HOLDING, PRESENCE_REGISTER, 1, timeout)
+                present = True
+            except SlaveException:
+                present = True
+            except ABSENT:
+                present = False
+            if present:
+                found.append(unit)
+            if progress:
+                progress(unit, present)
+
+    # A port failure ends the sweep, the remaining units cannot be told apart
+    await asyncio.gather(*(run() for _ in range(max(1, workers))))
+    return sorted(found)
+
+
+def assign_templates(devices, templates):
+    """
+    Give every discovered device the tags of the template it matches. A
+    device keeps the template configured at its own unit id; the rest take
+    the unclaimed template they match best, e.g. a swapped board that came
+    up at a different address. Further devices of the same kind get a copy
+    of the template under a new name (vfd1 -> vfd2).
+    """
+    by_name = {template.name: template for template in templates}
+    claimed = set()
+    taken = {template.name for template in templates}
+
+    for device in devices:
+        for name in device["matches"]:
+            if by_name[name].unit == device["unit"] and name not in claimed:
+                device["device"] = name
+                claimed.add(name)
+                break
+
+    for device in devices:
+        if device.get("device") or not device["matches"]:
+            continue
+        for name in device["matches"]:
+            if name not in claimed:
+                device["device"] = name
+                claimed.add(name)
+                break
+        else:
+            device["device"] = _instance_name(device["matches"][0], taken)
+            device["template"] = device["matches"][0]
+        taken.add(device["device"])
+
+    tags = []
+    for device in devices:
+        name = device.get("device")
+        if name is None:
+            device["device"] = None
+            continue
+        template = by_name[device.get("template", name)]
+        tags.extend(template.tags_for(device["unit"], name))
+    return tags
+
+
+def _instance_name(name, taken):
+    """Next free name for another device like name: vfd1 -> vfd2, bg -> bg2"""
+    match = re.match(r"(.*?)(\d+)$", name)
+    base, number = (match.group(1), int(match.group(2))) if match else (name, 1)
+    while True:
+        number += 1
+        candidate = f"{base}{number}"
+        if candidate not in taken:
+            return candidate
+
+
+def build_config(buses, templates):
+    """
+    Configuration for the buses found: [{"port", "baudrate", "parity",
+    "devices": [...]}] becomes the MODBUS_BUSES routing, line settings,
+    devices and tags
+    """
+    devices = [device for bus in buses for device in bus["devices"]]
+    tags = assign_templates(devices, templates)
+    routed = [bus for bus in buses if bus["devices"]]
+    return {
+        "buses": ";".join(f"{bus['port']}={','.join(str(device['unit']) for device in bus['devices'])}"
+                          for bus in routed),
+        "ports": [{key: bus[key] for key in ("port", "baudrate", "parity", "duration")} for bus in buses],
+        "devices": devices,
+        "tags": tags,
+    }
+
+
+async def discover_port(port, baudrates=DISCOVERY_BAUDRATES, parities=DISCOVERY_PARITIES, units=ALL_UNITS,
+                        timeout=PROBE_TIMEOUT, templates=None, exhaustive=False, progress=None, **connection_args):
+    """
+    Sweep one idle port at each line setting until one gets answers (all of
+    them with exhaustive) and fingerprint the responders. Uses the async
+    client, whose probes give up exactly at the timeout.
+    """
+    templates = device_templates() if templates is None else templates
+    started = time.monotonic()
+    result = {"port": port, "baudrate": None, "parity": None, "devices": [], "duration": None}
+    for baudrate in baudrates:
+        for parity in parities:
+            # Every probe brings its own timeout; the connection's bounds how
+            # long the client itself waits, so it must cover the slowest probe
+            modbus = AsyncModbusConnection(port=port, baudrate=baudrate, parity=parity,
+                                           timeout=max(timeout, FINGERPRINT_TIMEOUT), **connection_args)
+            try:
+                if not await modbus.connect():
+                    raise ConnectionError(f"Could not open {port}")
+                found = await sweep(modbus.probe, units, timeout, progress, modbus.concurrency)
+                devices = [{"port": port, "unit": unit, "baudrate": baudrate, "parity": parity,
+                            "matches": await fingerprint(modbus.probe, unit, templates)} for unit in found]
+            finally:
+                modbus.close()
+            if devices:
+                info(f"{port} at {baudrate} {parity}: units {found}")
+                if result["baudrate"] is None:
+                    result.update(baudrate=baudrate, parity=parity)
+                result["devices"].extend(devices)
+                if not exhaustive:
+                    result["duration"] = time.monotonic() - started
+                    return result
+    result["duration"] = time.monotonic() - started
+    return result
+
+
+def discover(ports, **kwargs):
+    """Sweep several idle ports in parallel and return the configuration"""
+    templates = kwargs.pop("templates", None) or device_templates()
+    buses = asyncio.run(_in_parallel(ports, lambda port: discover_port(port, templates=templates, **kwargs)))
+    return build_config(buses, templates)
+
+
+async def _in_parallel(items, work):
+    """Await work(item) for every item at once; fails only if every item failed"""
+    results = await asyncio.gather(*(work(item) for item in items), return_exceptions=True)
+    failures = []
+    for item, result in zip(items, results):
+        if isinstance(result, Exception):
+            failures.append(result)
+            error(f"Discovery on {getattr(item, 'PORT', item)} failed: {str(result)}")
+    if failures and len(failures) == len(items):
+        raise failures[0]
+    return [result for result in results if not isinstance(result, Exception)]
+
+
+class DiscoveryService:
+    """
+    Runs one discovery sweep at a time over the live buses, in the
+    background lane so acquisition and control writes keep priority. The
+    ports stay at their configured line settings; trying other baud rates
+    needs the ports to themselves and is left to the command line tool.
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.state = IDLE
+        self.error = None
+        self.started = None
+        self.finished = None
+        self.progress = {}
+        self.result = None
+        self._lock = threading.Lock()
+
+    def start(self, units=ALL_UNITS, timeout=PROBE_TIMEOUT):
+        """Start a sweep; returns False if one is already running"""
+        with self._lock:
+            if self.state == RUNNING:
+                return False
+            units = list(units)
+            self.state = RUNNING
+            self.error = None
+            self.result = None
+            self.started = time.time()
+            self.finished = None
+            self.progress = {modbus.PORT: {"probed": 0, "total": len(units), "found": []}
+                             for modbus in self.bus.connections()}
+        threading.Thread(target=self._run, args=(units, timeout), daemon=True).start()
+        return True
+
+    def status(self):
+        return {
+            "state": self.state,
+            "error": self.error,
+            "started": self.started,
+            "finished": self.finished,
+            "progress": self.progress,
+            "result": self.result,
+        }
+
+    def _run(self, units, timeout):
+        templates = device_templates()
+        try:
+            buses = asyncio.run(_in_parallel(self.bus.connections(),
+                                             lambda modbus: self._sweep_bus(modbus, units, timeout, templates)))
+            self.result = build_config(buses, templates)
+            self.state = DONE
+            info(f"Discovery found {len(self.result['devices'])} devices: {self.result['buses']}")
+        except Exception as e:
+            self.error = str(e)
+            self.state = FAILED
+            error(f"Discovery failed: {str(e)}")
+        finally:
+            self.finished = time.time()
+
+    async def _sweep_bus(self, modbus, units, timeout, templates):
+        started = time.monotonic()
+        progress = self.progress[modbus.PORT]
+
+        async def probe(unit, table, start, count, probe_timeout):
+            operation = lambda connection: connection.probe(unit, table, start, count, probe_timeout)
+            return await asyncio.wrap_future(self.bus.submit_to(modbus, operation, PRIORITY_BACKGROUND))
+
+        def report(unit, present):
+            progress["probed"] += 1
+            if present:
+                progress["found"].append(unit)
+
+        found = await sweep(probe, units, timeout, report, modbus.concurrency)
+        devices = [{"port": modbus.PORT, "unit": unit, "baudrate": modbus.BAUDRATE, "parity": modbus.PARITY,
+                    "matches": await fingerprint(probe, unit, templates)} for unit in found]
+        return {"port": modbus.PORT, "baudrate": modbus.BAUDRATE, "parity": modbus.PARITY, "devices": devices,
+                "duration": time.monotonic() - started}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find Modbus units on RS485 ports and fingerprint them")
+    parser.add_argument("--port", nargs="+", help="serial ports (or socket:// / tcp:// URLs) to sweep")
+    parser.add_argument("--simulate", action="store_true", help="sweep the virtual slave farm")
+    parser.add_argument("--baud", type=int, nargs="+", default=list(DISCOVERY_BAUDRATES))
+    parser.add_argument("--parity", nargs="+", default=list(DISCOVERY_PARITIES), choices=["N", "E", "O"])
+    parser.add_argument("--units", type=parse_units, default=list(ALL_UNITS), help="e.g. 1-32,100 (default 1-247)")
+    parser.add_argument("--timeout", type=float, default=PROBE_TIMEOUT, help="presence read timeout in seconds")
+    parser.add_argument("--all-settings", action="store_true",
+                        help="keep trying line settings after one gets answers")
+    parser.add_argument("--output", help="write the configuration to this JSON file")
+    args = parser.parse_args()
+
+    # Exception responses are expected while fingerprinting, keep them quiet
+    logging.getLogger('pymodbus').setLevel(logging.CRITICAL)
+
+    farm = None
+    ports = args.port
+    if args.simulate:
+        from Simulator.farm import SlaveFarm
+        farm = SlaveFarm(response_delay=0.002)
+        ports = [farm.start_tcp()]
+    if not ports:
+        parser.error("give --port or --simulate")
+
+    try:
+        config = discover(ports, baudrates=args.baud, parities=args.parity, units=args.units,
+                          timeout=args.timeout, exhaustive=args.all_settings)
+    finally:
+        if farm:
+            farm.stop()
+
+    for port in config["ports"]:
+        setting = f"{port['baudrate']} {port['parity']}" if port["baudrate"] else "no answer"
+        print(f"{port['port']}: {setting} ({port['duration']:.1f}s)")
+    for device in config["devices"]:
+        print(f"  unit {device['unit']:3d}  {device['device'] or 'unknown':8s}  matches {device['matches']}")
+    print(f"MODBUS_BUSES={config['buses']}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(config, f, indent=2)
+        print(f"Wrote {len(config['tags'])} tags to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Raw Modbus frame capture.
+
+With MODBUS_CAPTURE set to a directory, every connection records each
+request and response frame it puts on or takes off the wire to a capture
+file named after its port, with the monotonic time it was seen. Files are
+append-only and rotate at a size limit, keeping a few backups like a
+rotating log. Captures are played back by the replay:// transport.
+
+    MODBUS_CAPTURE=/var/lib/hmi/capture python main.py
+    python -m Services.frame_capture /var/lib/hmi/capture/dev_ttyUSB0.mbr
+
+File layout, little endian: a header (magic, version, framing, wall clock and
+monotonic start), then one record per chunk read or written: monotonic ns,
+direction, channel, length, and the raw bytes. A response may span several
+records, as pymodbus reads a frame in pieces.
+"""
+import argparse
+import os
+import re
+import struct
+import threading
+import time
+from pymodbus.client import ModbusSerialClient, ModbusTcpClient
+from Services.logger_service import info, error
+
+MAGIC = b"MBFR"
+VERSION = 1
+HEADER = struct.Struct("<4sBBdQ")
+RECORD = struct.Struct("<QBBH")
+
+# Direction of a record
+TX = 0
+RX = 1
+
+# Wire framing of a capture: RTU frames with CRC from a serial port or
+# socket:// URL, or MBAP frames from a Modbus TCP gateway
+FRAMING_RTU = 0
+FRAMING_SOCKET = 1
+
+# Directory to write capture files to; unset disables capture
+CAPTURE_ENV = "MODBUS_CAPTURE"
+
+# Size at which a capture file is rotated, and how many rotated files are kept
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_BACKUPS = 5
+
+# Records are buffered and written out at least this often
+FLUSH_INTERVAL = 1.0
+
+CAPTURE_SUFFIX = ".mbr"
+
+
+class FrameRecorder:
+    """Append-only, size-rotated capture file shared by the channels of one connection"""
+
+    def __init__(self, path, framing=FRAMING_RTU, max_bytes=DEFAULT_MAX_BYTES, backups=DEFAULT_BACKUPS):
+        self.path = path
+        self.framing = framing
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self.frames = 0
+        self._file = None
+        self._size = 0
+        self._last_flush = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, direction, channel, data):
+        """Append one chunk of wire bytes"""
+        if not data:
+            return
+        now = time.monotonic_ns()
+        entry = RECORD.pack(now, direction, channel, len(data)) + bytes(data)
+        with self._lock:
+            try:
+                if self._file is None:
+                    self._open()
+                elif self._size + len(entry) > self.max_bytes:
+                    self._rotate()
+                self._file.write(entry)
+                self._size += len(entry)
+                self.frames += 1
+                if now / 1e9 - self._last_flush >= FLUSH_INTERVAL:
+                    self._file.flush()
+                    self._last_flush = now / 1e9
+            except OSError as e:
+                # Capture must never break the bus, drop the record instead
+                error(f"Frame capture to {self.path} failed: {str(e)}")
+                self._file = None
+
+    def close(self):
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(self.path, "ab")
+        self._size = self._file.tell()
+        if self._size == 0:
+            self._file.write(HEADER.pack(MAGIC, VERSION, self.framing, time.time(), time.monotonic_ns()))
+            self._size = HEADER.size
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for index in range(self.backups - 1, 0, -1):
+            older = f"{self.path}.{index}"
+            if os.path.exists(older):
+                os.replace(older, f"{self.path}.{index + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._open()
+
+
+def capture_path(directory, port):
+    """Capture file of a port: /dev/ttyUSB0 -> <directory>/dev_ttyUSB0.mbr"""
+    name = re.sub(r"[^A-Za-z0-9.-]+", "_", port).strip("_")
+    return os.path.join(directory, name + CAPTURE_SUFFIX)
+
+
+def recorder_for(port, framing):
+    """A recorder for the port if capture is enabled, else None"""
+    directory = os.getenv(CAPTURE_ENV, "").strip()
+    if not directory:
+        return None
+    path = capture_path(directory, port)
+    info(f"Capturing Modbus frames of {port} to {path}")
+    return FrameRecorder(path, framing)
+
+
+class RecordingSerialClient(ModbusSerialClient):
+    """
+    ModbusSerialClient that hands every chunk it sends or receives to a
+    recorder. received counts the bytes read, so a transaction that got
+    bytes but no frame pymodbus could decode shows up as a CRC error.
+    """
+
+    recorder = None
+    channel_id = 0
+    received = 0
+
+    def send(self, request):
+        size = super().send(request)
+        if self.recorder and size:
+            self.recorder.record(TX, self.channel_id, request[:size])
+        return size
+
+    def recv(self, size):
+        data = super().recv(size)
+        if data:
+            self.received += len(data)
+            if self.recorder:
+                self.recorder.record(RX, self.channel_id, data)
+        return data
+
+
+class RecordingTcpClient(ModbusTcpClient):
+    """ModbusTcpClient that hands every chunk it sends or receives to a recorder"""
+
+    recorder = None
+    channel_id = 0
+
+    def send(self, request):
+        size = super().send(request)
+        if self.recorder and size:
+            self.recorder.record(TX, self.channel_id, request[:size])
+        return size
+
+    def recv(self, size):
+        data = super().recv(size)
+        if self.recorder and data:
+            self.recorder.record(RX, self.channel_id, data)
+        return data
+
+
+def capture_files(path):
+    """A capture file and its rotated backups, oldest first"""
+    backups = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        backups.append(f"{path}.{index}")
+        index += 1
+    files = list(reversed(backups))
+    if os.path.exists(path):
+        files.append(path)
+    if not files:
+        raise FileNotFoundError(f"No capture at {path}")
+    return files
+
+
+def read_capture(path):
+    """
+    Read one capture file. Returns (framing, wall clock start, records),
+    each record a (monotonic ns, direction, channel, bytes) tuple. A record
+    cut short by a crash ends the list.
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a frame capture")
+    magic, version, framing, started, _ = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError(f"{path} is not a version {VERSION} frame capture")
+    records = []
+    offset = HEADER.size
+    while offset + RECORD.size <= len(data):
+        timestamp, direction, channel, length = RECORD.unpack_from(data, offset)
+        offset += RECORD.size
+        if offset + length > len(data):
+            break
+        records.append((timestamp, direction, channel, data[offset:offset + length]))
+        offset += length
+    return framing, started, records
+
+
+def read_captures(path):
+    """read_capture over a capture file and its rotated backups, in order"""
+    framing = None
+    started = None
+    records = []
+    for name in capture_files(path):
+        file_framing, file_started, file_records = read_capture(name)
+        if framing is not None and file_framing != framing:
+            raise ValueError(f"{name} uses a different framing than the rest of the capture")
+        framing = file_framing
+        started = file_started if started is None else started
+        records.extend(file_records)
+    return framing, started, records
+
+
+def summarize(path):
+    """Frame counts, span and units of a capture"""
+    framing, started, records = read_captures(path)
+    units = {}
+    for _, direction, _, data in records:
+        if direction != TX:
+            continue
+        header = data[6:8] if framing == FRAMING_SOCKET else data[:2]
+        if len(header) == 2:
+            key = f"{header[0]}"
+            units.setdefault(key, {})
+            units[key][header[1]] = units[key].get(header[1], 0) + 1
+    span = (records[-1][0] - records[0][0]) / 1e9 if records else 0.0
+    return {
+        "framing": "socket" if framing == FRAMING_SOCKET else "rtu",
+        "started": started,
+        "duration": span,
+        "requests": sum(1 for record in records if record[1] == TX),
+        "records": len(records),
+        "bytes": sum(len(record[3]) for record in records),
+        "units": {unit: {str(code): count for code, count in codes.items()} for unit, codes in sorted(units.items())},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize a Modbus frame capture")
+    parser.add_argument("path", help="capture file; rotated backups next to it are included")
+    args = parser.parse_args()
+    summary = summarize(args.path)
+    print(f"{args.path}: {summary['framing']} framing, started "
+          f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(summary['started']))}")
+    print(f"{summary['requests']} requests, {summary['records']} records, {summary['bytes']} bytes "
+          f"over {summary['duration']:.1f}s")
+    for unit, codes in summary["units"].items():
+        print(f"  unit {unit}: " + ", ".join(f"fc{code} x{count}" for code, count in codes.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Deterministic replay of a frame capture.
+
+A replay:// port plays a capture back under ModbusConnection in place of a
+serial port, so the acquisition, decode, logging and API layers run on real
+shift data without hardware:
+
+    MODBUS_BUSES="replay:///var/lib/hmi/capture/dev_ttyUSB0.mbr?speed=4=1,2,3,4" python main.py
+    python -m Services.frame_replay capture.mbr --speed max --duration 20
+
+Each request the app sends is answered with the next recorded response to
+the same request, so the values come back in the order they were seen on
+the line. speed=1 hands responses out no earlier than they arrived in the
+field, speed=N compresses the recording N times and speed=max answers
+straight away. A request the capture never saw gets no answer, like a
+silent unit. With loop=1 the capture starts over when it runs out.
+"""
+import argparse
+import time
+from collections import deque
+from urllib.parse import parse_qs
+from pymodbus.client import ModbusSerialClient, ModbusTcpClient
+from Services.frame_capture import read_captures, TX, RX, FRAMING_SOCKET
+
+REPLAY_SCHEME = "replay://"
+
+# Speed that answers every request immediately
+MAX_SPEED = 0.0
+
+
+def is_replay_port(port):
+    return isinstance(port, str) and port.startswith(REPLAY_SCHEME)
+
+
+def parse_replay_port(port):
+    """Split replay://path[?speed=N&loop=1] into (path, speed, loop)"""
+    path, _, query = port[len(REPLAY_SCHEME):].partition("?")
+    options = {key: values[-1] for key, values in parse_qs(query).items()}
+    speed = options.get("speed", "1")
+    speed = MAX_SPEED if speed == "max" else float(speed)
+    if speed < 0:
+        raise ValueError(f"Replay speed must be positive or max, got {speed}")
+    return path, speed, options.get("loop", "0").lower() in ("1", "true", "yes")
+
+
+class Exchange:
+    """One recorded request and the response bytes that followed it"""
+
+    __slots__ = ("request", "response", "sent", "answered")
+
+    def __init__(self, request, sent):
+        self.request = request
+        self.response = b""
+        self.sent = sent
+        self.answered = None
+
+
+class ReplayLog:
+    """The exchanges of a capture, queued per distinct request"""
+
+    def __init__(self, path, loop=False):
+        self.framing, self.started, records = read_captures(path)
+        self.loop = loop
+        self.origin = records[0][0] if records else 0
+        self.span = records[-1][0] - self.origin if records else 0
+        self.exchanges = {}
+        self.served = 0
+        self.unmatched = 0
+
+        current = {}
+        for timestamp, direction, channel, data in records:
+            if direction == TX:
+                exchange = Exchange(bytes(data), timestamp)
+                current[channel] = exchange
+                self.exchanges.setdefault(self._key(exchange.request), []).append(exchange)
+            elif direction == RX and channel in current:
+                exchange = current[channel]
+                if exchange.answered is None:
+                    exchange.answered = timestamp
+                exchange.response += bytes(data)
+        self._queues = {key: deque(exchanges) for key, exchanges in self.exchanges.items()}
+        self._cycles = {key: 0 for key in self.exchanges}
+
+    def _key(self, request):
+        # MBAP transaction ids differ from run to run, the rest of the frame does not
+        return request[2:] if self.framing == FRAMING_SOCKET else request
+
+    def take(self, request):
+        """
+        The next recorded exchange for a request and its offset in seconds
+        from the start of the capture, or (None, None) if there is none
+        """
+        key = self._key(request)
+        queue = self._queues.get(key)
+        if not queue:
+            if not (self.loop and key in self.exchanges):
+                self.unmatched += 1
+                return None, None
+            queue = self._queues[key] = deque(self.exchanges[key])
+            self._cycles[key] += 1
+        exchange = queue.popleft()
+        self.served += 1
+        moment = exchange.answered if exchange.answered is not None else exchange.sent
+        return exchange, (moment - self.origin + self._cycles[key] * self.span) / 1e9
+
+
+class _ReplaySocket:
+    """Stands in for the serial port or socket the pymodbus client would open"""
+
+    def __init__(self):
+        self.is_open = True
+        self.timeout = None
+
+    def close(self):
+        self.is_open = False
+
+
+class _ReplayMixin:
+    """send() looks the request up in the capture, recv() hands out its response"""
+
+    def _init_replay(self, log, speed):
+        self.log = log
+        self.speed = speed
+        self._pending = b""
+        self._clock = None
+
+    def connect(self):
+        if not self.socket:
+            self.socket = _ReplaySocket()
+        return True
+
+    def close(self):
+        if self.socket:
+            self.socket.close()
+        self.socket = None
+
+    def is_socket_open(self):
+        return self.socket is not None
+
+    def send(self, request):
+        exchange, offset = self.log.take(bytes(request))
+        if exchange is None:
+            self._pending = b""
+            return len(request)
+        response = exchange.response
+        if self.log.framing == FRAMING_SOCKET and len(response) >= 2:
+            response = bytes(request[:2]) + response[2:]
+        if self.speed != MAX_SPEED:
+            now = time.monotonic()
+            if self._clock is None:
+                self._clock = now - offset / self.speed
+            delay = self._clock + offset / self.speed - now
+            if delay > 0:
+                time.sleep(delay)
+        self._pending = response
+        return len(request)
+
+    def recv(self, size):
+        if size is None:
+            size = len(self._pending)
+        data, self._pending = self._pending[:size], self._pending[size:]
+        return data
+
+
+class ReplaySerialClient(_ReplayMixin, ModbusSerialClient):
+    """RTU framed replay of a serial capture"""
+
+    def __init__(self, log, speed, timeout):
+        ModbusSerialClient.__init__(self, port="replay", timeout=timeout, retries=0)
+        self._init_replay(log, speed)
+
+    @property
+    def connected(self):
+        return self.connect()
+
+
+class ReplayTcpClient(_ReplayMixin, ModbusTcpClient):
+    """MBAP framed replay of a Modbus TCP gateway capture"""
+
+    def __init__(self, log, speed, timeout):
+        ModbusTcpClient.__init__(self, "replay", timeout=timeout, retries=0)
+        self._init_replay(log, speed)
+
+
+def create_replay_client(port, timeout):
+    """The replay client for a replay:// port, framed like the capture"""
+    path, speed, loop = parse_replay_port(port)
+    log = ReplayLog(path, loop)
+    if log.framing == FRAMING_SOCKET:
+        return ReplayTcpClient(log, speed, timeout)
+    return ReplaySerialClient(log, speed, timeout)
+
+
+def main():
+    from Services.modbus_service import ModbusConnection
+    from Services.bus_scheduler import BusScheduler
+    from Services.acquisition_service import AcquisitionEngine
+    from Services.register_map import REGISTER_MAP
+
+    parser = argparse.ArgumentParser(description="Run acquisition on a frame capture and report its throughput")
+    parser.add_argument("path", help="capture file; rotated backups next to it are included")
+    parser.add_argument("--speed", default="max",
+                        help="playback speed: 1 for real time, N, or max to scan back to back")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+    parser.add_argument("--loop", action="store_true", help="start over when the capture runs out")
+    args = parser.parse_args()
+
+    port = f"{REPLAY_SCHEME}{args.path}?speed={args.speed}&loop={int(args.loop)}"
+    modbus = ModbusConnection(port=port, timeout=1)
+    modbus.initialize()
+    modbus.connect()
+    bus = BusScheduler(modbus)
+    bus.start()
+    acquisition = AcquisitionEngine(bus, REGISTER_MAP.poll_groups())
+    started = time.monotonic()
+    acquisition.start()
+    try:
+        if args.speed == "max":
+            # Scan every group again as soon as it finishes instead of waiting out its period
+            while time.monotonic() - started < args.duration:
+                for group in acquisition.groups:
+                    if not group.in_flight:
+                        acquisition.request_scan(group.name)
+                time.sleep(0.001)
+        else:
+            time.sleep(args.duration)
+    finally:
+        acquisition.stop()
+        bus.stop()
+        modbus.close()
+    elapsed = time.monotonic() - started
+
+    log = modbus.client.log
+    stats = modbus.stats.snapshot()
+    print(f"{log.served} responses replayed in {elapsed:.1f}s ({log.served / elapsed:.0f}/s), "
+          f"{log.unmatched} requests not in the capture")
+    print(f"{acquisition.snapshot()['version']} snapshot changes, transactions: {stats['transactions']}")
+    for group in acquisition.groups:
+        print(f"  {group.name}: {group.scans} scans, last {1000 * (group.last_duration or 0):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
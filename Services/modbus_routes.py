@@ -8,6 +8,12 @@ sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
 from flask import Blueprint, Flask, jsonify, request
 from Services.modbus_service import ModbusConnection
+from Services.sequence_engine import STARTUP_SEQUENCE
+from Services.bus_scheduler import PRIORITY_EMERGENCY, CONTROL_WRITE_TIMEOUT
+from Services.bus_services import BusServices, snapshot_response, stream_response, batch_response
+from Services.device_discovery import parse_units, PROBE_TIMEOUT
+from Services.register_map import REGISTER_MAP, RegisterTag, HOLDING
+from Services.scan_planner import read_tag
 from Services.logger_service import info, error
 import traceback
 from Test.pid_controller import WaterPumpSimulation
@@ -17,8 +23,40 @@ from flask_cors import CORS
 from Services.database_service import Database as db
 
 modbus_bp = Blueprint('modbus', __name__)
-modbus_client = ModbusConnection()
-modbus_client.initialize()
+# Buses, setpoint writer, sequences, discovery, acquisition and the
+# connection supervisor of the app the blueprint is registered on. They
+# are built once by the app (see create_app) and handed over on
+# registration, so the blueprint never opens a port of its own.
+services = None
+modbus_client = None
+bus = None
+setpoints = None
+sequences = None
+discovery = None
+acquisition = None
+supervisor = None
+
+
+def use_services(bus_services):
+    """Serve the routes from a started BusServices"""
+    global services, modbus_client, bus, setpoints, sequences, discovery, acquisition, supervisor
+    services = bus_services
+    modbus_client = bus_services.modbus
+    bus = bus_services.bus
+    setpoints = bus_services.setpoints
+    sequences = bus_services.sequences
+    discovery = bus_services.discovery
+    acquisition = bus_services.acquisition
+    supervisor = bus_services.supervisor
+
+
+@modbus_bp.record_once
+def attach_services(state):
+    """register_blueprint(modbus_bp, services=...) or app.extensions['bus_services'] provides the buses"""
+    bus_services = state.options.get('services') or state.app.extensions.get('bus_services')
+    if bus_services is None:
+        raise RuntimeError("Register modbus_bp with services=BusServices().start()")
+    use_services(bus_services)
 
 # Create a global instance of the simulation
 water_pump_sim = WaterPumpSimulation()
@@ -35,26 +73,33 @@ def read_register():
         unit_id = request.args.get('unitId', type=int)
         register = request.args.get('register', type=int)
         range_size = request.args.get('range', 1, type=int)
+        data_type = request.args.get('type')
 
         if not all([isinstance(x, int) for x in [unit_id, register]]):
             return jsonify({'message': 'Invalid parameters'}), 400
 
-        if not modbus_client.client or not modbus_client.client.is_socket_open():
+        if not modbus_client.is_connected():
             return jsonify({'message': 'No Modbus connection available'}), 503
 
-        if range_size > 1:
-            # Read multiple registers
-            result = []
-            for i in range(range_size):
-                value = modbus_client.read_register_holding(register + i, unit_id)
-                result.append({
-                    'register': register + i,
-                    'value': value
-                })
-            return jsonify(result)
+        if data_type:
+            # Multi-register values are read and decoded in one transaction
+            try:
+                tag = RegisterTag('value', unit_id, register, data_type,
+                                  request.args.get('wordOrder', 'big'), table=request.args.get('table', HOLDING))
+            except ValueError as e:
+                return jsonify({'message': str(e)}), 400
+            return jsonify({
+                'register': register,
+                'type': data_type,
+                'value': read_tag(bus, tag)
+            })
+        elif range_size > 1:
+            # Read multiple registers in one request
+            values = bus.read_holding_block(register, range_size, unit_id).result()
+            return jsonify([{'register': register + i, 'value': value} for i, value in enumerate(values)])
         else:
             # Read single register
-            value = modbus_client.read_register_holding(register, unit_id)
+            value = bus.read_holding_block(register, 1, unit_id).result()[0]
             return jsonify({
                 'register': register,
                 'value': value
@@ -64,6 +109,18 @@ def read_register():
         error(f"Error reading Modbus register: {str(e)}\n{traceback.format_exc()}")
         return jsonify({'message': str(e)}), 500
 
+@modbus_bp.route('/batch', methods=['POST'])
+def batch_read():
+    """Read a list of {unit, address, type, wordOrder, table} values in the fewest block transactions"""
+    try:
+        if not modbus_client.is_connected():
+            return jsonify({'message': 'No Modbus connection available'}), 503
+        return batch_response(bus)
+
+    except Exception as e:
+        error(f"Error in batch read: {str(e)}\n{traceback.format_exc()}")
+        return jsonify({'message': str(e)}), 500
+
 @modbus_bp.route('/write', methods=['POST'])
 def write_register():
     try:
@@ -74,10 +131,10 @@ def write_register():
         if not all([isinstance(x, int) for x in [unit_id, register, value]]):
             return jsonify({'message': 'Invalid parameters'}), 400
 
-        if not modbus_client.client or not modbus_client.client.is_socket_open():
+        if not modbus_client.is_connected():
             return jsonify({'message': 'No Modbus connection available'}), 503
 
-        modbus_client.write_register(register, [value], unit_id)
+        bus.write_register(register, [value], unit_id, timeout=CONTROL_WRITE_TIMEOUT).result()
         return jsonify({
             'message': 'Write successful',
             'register': register,
@@ -98,7 +155,7 @@ def water_pump_pid():
         target_pressure = target_pressure_psi / 14.5038  # Convert PSI to bar
         
         # Turn on the water pump first
-        modbus_client.write_register(WATER_PUMP_STATE_REGISTER, 1)  # 1 for ON
+        bus.write_register(WATER_PUMP_STATE_REGISTER, 1, timeout=CONTROL_WRITE_TIMEOUT).result()  # 1 for ON
         pid_control_active = True
         
         # Start PID control loop in a background thread
@@ -107,10 +164,11 @@ def water_pump_pid():
                 try:
                     result = water_pump_sim.update(target_pressure, dt=0.1)
                     # Update the VFD frequency through modbus
-                    modbus_client.write_register(
+                    bus.write_register(
                         VFD_FREQUENCY_REGISTER, 
-                        int(result['frequency'] * 100)
-                    )
+                        int(result['frequency'] * 100),
+                        timeout=CONTROL_WRITE_TIMEOUT
+                    ).result()
                     time.sleep(0.1)
                 except Exception as e:
                     error(f"Error in PID loop: {str(e)}")
@@ -162,7 +220,7 @@ def control_water_pump():
             water_pump_sim.current_pressure = 0
             water_pump_sim.current_frequency = 0
             
-        modbus_client.write_register(WATER_PUMP_STATE_REGISTER, 1 if state else 0)
+        bus.write_register(WATER_PUMP_STATE_REGISTER, 1 if state else 0, timeout=CONTROL_WRITE_TIMEOUT).result()
         return jsonify({'status': 'success'})
         
     except Exception as e:
@@ -179,9 +237,16 @@ def control_water_pump():
 @modbus_bp.route('/rs485', methods=['GET'])
 def get_rs485_status():
     """Get the current status of the RS485 connection"""
+    if not supervisor.connected:
+        return jsonify({
+            "connected": False,
+            "message": "RS485 port lost, re-opening in the background and serving the last data",
+            "stale": acquisition.is_stale(),
+            "ports": supervisor.status()
+        })
     try:
         # Try to read a register to check connection
-        result = modbus_client.read_register_holding(0, 3)
+        result = bus.read_register_holding(0, 3).result()
         
         # Check if result is None or an error
         if result is None:
@@ -210,6 +275,32 @@ def get_rs485_status():
             "message": f"RS485 connection error: {str(e)}"
         })
 
+@modbus_bp.after_app_request
+def mark_stale_data(response):
+    """Flag every response served while a bus is being re-opened"""
+    if acquisition.is_stale():
+        response.headers["X-Data-Stale"] = "true"
+    return response
+
+@modbus_bp.route('/api/bus/stats', methods=['GET'])
+def get_bus_stats():
+    """Transaction latency, error counts and utilization of the RS485 bus"""
+    try:
+        stats = modbus_client.stats.snapshot()
+        stats["queue"] = bus.pending()
+        stats["health"] = {str(unit): health for unit, health in modbus_client.health.stats().items()}
+        stats["setpoints"] = setpoints.stats()
+        stats["scan_plan"] = acquisition.plan_report()
+        stats["buses"] = bus.stats()
+        stats["ports"] = supervisor.status()
+        return jsonify(stats)
+    except Exception as e:
+        error(f"Bus stats failed: {str(e)}")
+        return jsonify({
+            "status": "error",
+            "message": str(e)
+        }), 500
+
 '''
 Power Meter Endpoints
 '''
@@ -375,22 +466,52 @@ IMU data
 
 @modbus_bp.route('/api/startup-sequence', methods=['GET'])
 def startup_sequence():
-    modbus_client.write_register(0, 0b110, 2)
-    time.sleep(0.1)
-    modbus_client.write_register(0, 0b111, 2)
-    modbus_client.write_register(0, 0b1111, 2)
-    modbus_client.write_register(0, 0b101111, 2)
-    modbus_client.write_register(0, 0b1101111, 2)
-    modbus_client.write_register(0, [6], 2)
-    time.sleep(0.1)
-    modbus_client.write_register(0, [7], 2)
-    modbus_client.write_register(0, [15], 2)
-    modbus_client.write_register(0, [47], 2)
-    modbus_client.write_register(0, [111], 2)
+    """Start the drive in the background and return the job id to follow it"""
+    job = sequences.run(STARTUP_SEQUENCE, 2)
+    return jsonify({"status": "started", "job_id": job.id}), 202
+
+@modbus_bp.route('/api/sequences/<job_id>', methods=['GET'])
+def get_sequence_job(job_id):
+    """Progress and per-step timing of a command sequence"""
+    job = sequences.job(job_id)
+    if job is None:
+        return jsonify({"status": "error", "message": f"Unknown sequence job {job_id}"}), 404
+    return jsonify(job)
+
+@modbus_bp.route('/api/sequences/<job_id>/cancel', methods=['POST'])
+def cancel_sequence_job(job_id):
+    """Stop a command sequence before its next step"""
+    if not sequences.cancel(job_id):
+        return jsonify({"status": "error", "message": f"Unknown sequence job {job_id}"}), 404
+    return jsonify({"status": "cancelling", "job_id": job_id})
+
+@modbus_bp.route('/api/discovery', methods=['POST'])
+def start_discovery():
+    """
+    Sweep unit ids on the live buses and fingerprint the responders.
+    Optional JSON body: {"units": "1-32,100" or [ids], "timeout": seconds}
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        units = data.get("units", "1-247")
+        units = parse_units(units) if isinstance(units, str) else [int(unit) for unit in units]
+        timeout = float(data.get("timeout", PROBE_TIMEOUT))
+    except (TypeError, ValueError) as e:
+        return jsonify({"status": "error", "message": f"Invalid discovery request: {str(e)}"}), 400
+    if not discovery.start(units, timeout):
+        return jsonify({"status": "error", "message": "A discovery sweep is already running"}), 409
+    return jsonify({"status": "started"}), 202
+
+@modbus_bp.route('/api/discovery', methods=['GET'])
+def get_discovery():
+    """Progress of the discovery sweep and, once done, the configuration it found"""
+    return jsonify(discovery.status())
 
 @modbus_bp.route('/api/stop-motor', methods=['GET'])
 def stop_motor():
-    modbus_client.write_register(0, [0], 2)
+    # Keep a running start sequence from re-enabling the drive
+    sequences.cancel_unit(2)
+    bus.write_register(0, [0], 2, priority=PRIORITY_EMERGENCY).result()
 
 @modbus_bp.route('/api/set-frequency', methods=['POST'])
 def set_frequency():
@@ -408,12 +529,14 @@ def set_frequency():
         frequency = int(frequency)
         if -20000 <= frequency <= 20000:  # Allow negative values for reverse
             try:
-                modbus_client.write_register(1, [frequency], 2)
+                ack = setpoints.set(1, [frequency], 2).result()
                 info(f"Successfully set frequency to {frequency} ({(frequency * 60/20000):.1f} Hz)")
                 return jsonify({
                     "status": "success",
                     "message": "Frequency set successfully",
-                    "value": frequency
+                    "value": frequency,
+                    "acknowledged": ack["value"],
+                    "latency": ack["latency"]
                 }), 200
             except Exception as e:
                 error(f"Modbus error writing frequency: {str(e)}")
@@ -451,12 +574,14 @@ def reverse_frequency():
         frequency = int(frequency)
         if -20000 <= frequency <= 20000:  # Allow negative values for reverse
             try:
-                modbus_client.write_register(1, [frequency], 2)
+                ack = setpoints.set(1, [frequency], 2).result()
                 info(f"Successfully set frequency to {frequency} ({(frequency * 60/20000):.1f} Hz)")
                 return jsonify({
                     "status": "success",
                     "message": "Frequency set successfully",
-                    "value": frequency
+                    "value": frequency,
+                    "acknowledged": ack["value"],
+                    "latency": ack["latency"]
                 }), 200
             except Exception as e:
                 error(f"Modbus error writing frequency: {str(e)}")
@@ -482,27 +607,20 @@ def reverse_frequency():
 '''
 @modbus_bp.route('/api/wp/startup-sequence', methods=['GET'])
 def startup_sequence_wp():
-    modbus_client.write_register(0, 0b110, 1)
-    time.sleep(0.1)
-    modbus_client.write_register(0, 0b111, 1)
-    modbus_client.write_register(0, 0b1111, 1)
-    modbus_client.write_register(0, 0b101111, 1)
-    modbus_client.write_register(0, 0b1101111, 1)
-    modbus_client.write_register(0, [6], 1)
-    time.sleep(0.1)
-    modbus_client.write_register(0, [7], 1)
-    modbus_client.write_register(0, [15], 1)
-    modbus_client.write_register(0, [47], 1)
-    modbus_client.write_register(0, [111], 1)
+    """Start the drive in the background and return the job id to follow it"""
+    job = sequences.run(STARTUP_SEQUENCE, 1)
+    return jsonify({"status": "started", "job_id": job.id}), 202
 
 @modbus_bp.route('/api/wp/stop-motor', methods=['GET'])
 def stop_motor_wp():
-    modbus_client.write_register(0, 0, 1)
+    # Keep a running start sequence from re-enabling the drive
+    sequences.cancel_unit(1)
+    bus.write_register(0, 0, 1, priority=PRIORITY_EMERGENCY).result()
 
 #Currently not working
 @modbus_bp.route('/api/wp/reverse-motor', methods=['GET'])
 def reverse_motor_wp():
-    modbus_client.write_register(0, 0, 1)
+    bus.write_register(0, 0, 1, timeout=CONTROL_WRITE_TIMEOUT).result()
 
 @modbus_bp.route('/api/wp/set-frequency', methods=['POST'])
 def set_frequency_wp():
@@ -520,12 +638,14 @@ def set_frequency_wp():
         frequency = int(frequency)
         if -20000 <= frequency <= 20000:  # Allow negative values for reverse
             try:
-                modbus_client.write_register(1, [frequency], 1)
+                ack = setpoints.set(1, [frequency], 1).result()
                 info(f"Successfully set frequency to {frequency} ({(frequency * 60/20000):.1f} Hz)")
                 return jsonify({
                     "status": "success",
                     "message": "Frequency set successfully",
-                    "value": frequency
+                    "value": frequency,
+                    "acknowledged": ack["value"],
+                    "latency": ack["latency"]
                 }), 200
             except Exception as e:
                 error(f"Modbus error writing frequency: {str(e)}")
@@ -563,12 +683,14 @@ def reverse_frequency_wp():
         frequency = int(frequency)
         if -20000 <= frequency <= 20000:  # Allow negative values for reverse
             try:
-                modbus_client.write_register(1, [frequency], 2)
+                ack = setpoints.set(1, [frequency], 2).result()
                 info(f"Successfully set frequency to {frequency} ({(frequency * 60/20000):.1f} Hz)")
                 return jsonify({
                     "status": "success",
                     "message": "Frequency set successfully",
-                    "value": frequency
+                    "value": frequency,
+                    "acknowledged": ack["value"],
+                    "latency": ack["latency"]
                 }), 200
             except Exception as e:
                 error(f"Modbus error writing frequency: {str(e)}")
@@ -599,6 +721,13 @@ def handle_modbus_errors(f):
         try:
             # Apply a timeout to the function execution
             return f(*args, **kwargs)
+        except LookupError as e:
+            # The tag has not been scanned since startup
+            return jsonify({
+                "error": "No data yet",
+                "details": str(e),
+                "status": "error"
+            }), 503
         except Exception as e:
             # Log the error but don't allow it to block the server
             error(f"Error in {f.__name__}: {str(e)}")
@@ -619,75 +748,88 @@ def format_response(value, name, unit="", scale_factor=1):
         }
     })
 
+def tag_response(tag_name):
+    """Format the latest snapshot value of a register map tag"""
+    tag = REGISTER_MAP[tag_name]
+    return format_response(acquisition.get_value(tag_name), tag.label, tag.eng_unit)
+
+@modbus_bp.route('/api/changes', methods=['GET'])
+@handle_modbus_errors
+def get_changes():
+    """Tag values that changed past their deadband after the given sequence number"""
+    return jsonify(acquisition.changes.since(request.args.get('since', 0, type=int)))
+
+@modbus_bp.route('/api/snapshot', methods=['GET'])
+@handle_modbus_errors
+def get_snapshot():
+    """Every current tag value with its timestamp and quality, see bus_services.snapshot_response"""
+    return snapshot_response(acquisition)
+
+@modbus_bp.route('/api/stream', methods=['GET'])
+@handle_modbus_errors
+def stream_tags():
+    """Server-Sent Events stream of tag updates, filtered like /api/snapshot and throttled to rate per second"""
+    return stream_response(acquisition)
+
 @modbus_bp.route('/api/data/speed-dir', methods=['GET'])
 @handle_modbus_errors
 def get_speed_dir():
     """Get motor speed and direction (-30000 to 30000 rpm)"""
-    speed = modbus_client.read_register_holding(100, 1)
-    return format_response(speed, "Speed & Direction", "rpm")
+    return tag_response("vfd1.speed")
 
 @modbus_bp.route('/api/data/output-frequency', methods=['GET'])
 @handle_modbus_errors
 def get_output_freq():
     """Get output frequency (0.0 - 500Hz)"""
-    frequency = modbus_client.read_register_holding(102, 1)
-    return format_response(frequency, "Output Frequency", "Hz", 0.1)
+    return tag_response("vfd1.output_frequency")
 
 @modbus_bp.route('/api/data/current', methods=['GET'])
 @handle_modbus_errors
 def get_current():
     """Get current (0.0 - 2.0 * I2hd)"""
-    current = modbus_client.read_register_holding(103, 1)
-    return format_response(current, "Current", "A", 0.1)
+    return tag_response("vfd1.current")
 
 @modbus_bp.route('/api/data/torque', methods=['GET'])
 @handle_modbus_errors
 def get_torque():
     """Get torque (-200 to 200%)"""
-    torque = modbus_client.read_register_holding(104, 1)
-    return format_response(torque, "Torque", "%")
+    return tag_response("vfd1.torque")
 
 @modbus_bp.route('/api/data/power', methods=['GET'])
 @handle_modbus_errors
 def get_power():
     """Get power output"""
-    power = modbus_client.read_register_holding(105, 1)
-    return format_response(power, "Power", "kW", 0.1)
+    return tag_response("vfd1.power")
 
 @modbus_bp.route('/api/data/dc-bus-voltage', methods=['GET'])
 @handle_modbus_errors
 def get_dc_bus_voltage():
     """Get DC bus voltage"""
-    dc_bus_voltage = modbus_client.read_register_holding(106, 1)
-    return format_response(dc_bus_voltage, "DC Bus Voltage", "V")
+    return tag_response("vfd1.dc_bus_voltage")
 
 @modbus_bp.route('/api/data/output-voltage', methods=['GET'])
 @handle_modbus_errors
 def get_output_voltage():
     """Get output voltage"""
-    output_voltage = modbus_client.read_register_holding(108, 1)
-    return format_response(output_voltage, "Output Voltage", "V")
+    return tag_response("vfd1.output_voltage")
 
 @modbus_bp.route('/api/data/drive-temp', methods=['GET'])
 @handle_modbus_errors
 def get_drive_temp():
     """Get drive temperature"""
-    drive_temp = modbus_client.read_register_holding(109, 1)
-    return format_response(drive_temp, "Drive Temperature", "°C")
+    return tag_response("vfd1.drive_temp")
 
 @modbus_bp.route('/api/data/drive-cb-temp', methods=['GET'])
 @handle_modbus_errors
 def get_cb_temp():
     """Get drive control board temperature"""
-    cb_temp = modbus_client.read_register_holding(149, 1)
-    return format_response(cb_temp, "Drive CB Temperature", "°C")
+    return tag_response("vfd1.drive_cb_temp")
 
 @modbus_bp.route('/api/data/mot-therm-stress', methods=['GET'])
 @handle_modbus_errors
 def get_mot_therm_stress():
     """Get motor thermal stress level"""
-    mot_therm_stress = modbus_client.read_register_holding(152, 2)
-    return jsonify(mot_therm_stress)
+    return tag_response("vfd1.mot_therm_stress")
 
 '''
 #FAULT HISTORY REGISTERS (CUTTER FACE)
@@ -697,50 +839,43 @@ def get_mot_therm_stress():
 @handle_modbus_errors
 def get_latest_fault():
     """Get latest fault code"""
-    latest_fault = modbus_client.read_register_holding(401, 1)
-    return format_response(latest_fault, "Latest Fault", "code")
+    return tag_response("vfd1.latest_fault")
 
 @modbus_bp.route('/api/fault/speed-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_speed_at_fault():
     """Get speed at time of fault"""
-    speed_at_fault = modbus_client.read_register_holding(404, 1)
-    return format_response(speed_at_fault, "Speed at Fault", "rpm")
+    return tag_response("vfd1.speed_at_fault")
 
 @modbus_bp.route('/api/fault/freq-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_freq_at_fault():
     """Get frequency at time of fault"""
-    freq_at_fault = modbus_client.read_register_holding(405, 1)
-    return format_response(freq_at_fault, "Frequency at Fault", "Hz", 0.1)
+    return tag_response("vfd1.freq_at_fault")
 
 @modbus_bp.route('/api/fault/voltage-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_voltage_at_fault():
     """Get voltage at time of fault"""
-    voltage_at_fault = modbus_client.read_register_holding(406, 1)
-    return format_response(voltage_at_fault, "Voltage at Fault", "V")
+    return tag_response("vfd1.voltage_at_fault")
 
 @modbus_bp.route('/api/fault/current-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_current_at_fault():
     """Get current at time of fault"""
-    current_at_fault = modbus_client.read_register_holding(407, 1)
-    return format_response(current_at_fault, "Current at Fault", "A", 0.1)
+    return tag_response("vfd1.current_at_fault")
 
 @modbus_bp.route('/api/fault/torque-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_torque_at_fault():
     """Get torque at time of fault"""
-    torque_at_fault = modbus_client.read_register_holding(408, 1)
-    return format_response(torque_at_fault, "Torque at Fault", "%")
+    return tag_response("vfd1.torque_at_fault")
 
 @modbus_bp.route('/api/fault/status-at-fault', methods=['GET'])
 @handle_modbus_errors
 def get_status_at_fault():
     """Get status at time of fault"""
-    status_at_fault = modbus_client.read_register_holding(409, 1)
-    return format_response(status_at_fault, "Status at Fault", "code")
+    return tag_response("vfd1.status_at_fault")
 
 
 @modbus_bp.route('/api/data/operating', methods=['GET'])
@@ -783,40 +918,32 @@ def get_thrustRight():
     return 1000
 '''
 @modbus_bp.route('/api/bg/motor-temp', methods=['GET'])
+@handle_modbus_errors
 def get_motor_temp():
-    response = modbus_client.read_register_holding(12, 5)
-    print(response.registers[0])
-    if hasattr(response, 'registers') and len(response.registers) > 0:
-        adc_value = response.registers[0]
+    adc_value = acquisition.get_value("bg.motor_temp_adc")
 
-        # Known calibration points
-        adc1, temp1 = 650, 22.0
-        adc2, temp2 = 4000, 50.0
+    # Known calibration points
+    adc1, temp1 = 650, 22.0
+    adc2, temp2 = 4000, 50.0
 
-        # Linear equation: Temp = m * adc + b
-        m = (temp2 - temp1) / (adc2 - adc1)
-        b = temp1 - m * adc1
+    # Linear equation: Temp = m * adc + b
+    m = (temp2 - temp1) / (adc2 - adc1)
+    b = temp1 - m * adc1
 
-        temperature = m * adc_value + b
+    temperature = m * adc_value + b
 
-        return jsonify(round(temperature, 1))
-    
-    return jsonify(None)
+    return jsonify(round(temperature, 1))
 
 
 @modbus_bp.route('/api/bg/earth-preassure', methods=['GET'])
+@handle_modbus_errors
 def get_earth_pressure():
-    response = modbus_client.read_register_holding(13, 5)
-    if hasattr(response, 'registers') and len(response.registers) > 0:
-        return jsonify(response.registers[0])
-    return jsonify(None)
+    return jsonify(acquisition.get_value("bg.earth_pressure"))
 
 @modbus_bp.route('/api/bg/flame', methods=['GET'])
+@handle_modbus_errors
 def get_flame():
-    response = modbus_client.read_register_holding(14, 5)
-    if hasattr(response, 'registers') and len(response.registers) > 0:
-        return jsonify(response.registers[0])
-    return jsonify(None)
+    return jsonify(acquisition.get_value("bg.flame"))
 
 '''@modbus_bp.route('/api/bg/actuator-A', methods=['GET'])
 def get_actuator_a():
@@ -840,11 +967,9 @@ def get_actuator_c():
     return jsonify(None)'''
 
 @modbus_bp.route('/api/bg/encoder-speed', methods=['GET'])
+@handle_modbus_errors
 def get_encoder_speed():
-    response = modbus_client.read_register_holding(62, 5)
-    if hasattr(response, 'registers') and len(response.registers) > 0:
-        return jsonify(response.registers[0])
-    return jsonify(None)
+    return jsonify(acquisition.get_value("bg.encoder_speed"))
 
 '''
 Above Ground Board Endpoints
@@ -863,10 +988,9 @@ def get_oil_temp():
 @modbus_bp.route('/api/ag/water-preassure', methods=['GET'])
 def get_water_pressure():
     try:
-        value = modbus_client.read_register_holding(11, 6)
-        # Check if value is a successful response with registers
-        if hasattr(value, 'registers'):
-            return jsonify(value.registers[0])
+        value = acquisition.latest("ag.water_pressure")
+        if value is not None:
+            return jsonify(value)
         else:
             # This is an error response, handle it gracefully
             return jsonify({"error": "Failed to read water pressure", "value": None}), 200
@@ -893,10 +1017,12 @@ def get_pm_board_id():
     value = modbus_client.read_register_holding(0, 7)
     return jsonify(value.registers[0])'''
 # Create a standalone app when this file is run directly
-def create_app():
+def create_app(bus_services=None):
+    """Standalone app for the blueprint; builds and starts the buses unless given them"""
     app = Flask(__name__)
     CORS(app)
-    
+    app.extensions['bus_services'] = bus_services or BusServices().start()
+
     # Register the blueprint with no prefix when running standalone
     app.register_blueprint(modbus_bp)
     
@@ -938,9 +1064,4 @@ if __name__ == '__main__':
         error(f"Server error: {str(e)}")
     finally:
         # Clean up resources
-        if hasattr(modbus_client, 'client') and modbus_client.client:
-            try:
-                modbus_client.client.close()
-                info("Modbus connection closed")
-            except Exception as e:
-                error(f"Error closing Modbus connection: {str(e)}") 
\ No newline at end of file
+        app.extensions['bus_services'].stop() 
\ No newline at end of file
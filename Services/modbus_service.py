@@ -1,8 +1,31 @@
-from pymodbus.client import ModbusSerialClient as ModbusClient
+from pymodbus.pdu import ExceptionResponse
+from Services.modbus_transport import create_transport, DEFAULT_POOL_SIZE, TransportUnavailable
+from Services.unit_health import UnitHealthMonitor, UnitUnavailable
+from Services.register_map import HOLDING
+from Services.bus_stats import (BusStats, FC_READ_HOLDING, FC_READ_INPUT, FC_WRITE_MULTIPLE,
+                                OK, TIMEOUT, CRC_ERROR, EXCEPTION_RESPONSE, ERROR)
 import logging
 import time
 import sys
 
+
+class SlaveException(Exception):
+    """The slave answered, but with a Modbus exception code"""
+
+
+def result_outcome(result, garbled=False):
+    """
+    Classify a pymodbus result for the bus stats and unit health. pymodbus
+    drops frames failing the CRC check and reports a missing response, so
+    garbled says whether bytes arrived during the transaction anyway.
+    """
+    if isinstance(result, ExceptionResponse):
+        return EXCEPTION_RESPONSE
+    if hasattr(result, 'isError') and result.isError():
+        return CRC_ERROR if garbled else TIMEOUT
+    return OK
+
+
 class ModbusConnection:
     def __init__(self, 
             port='/dev/tty.usbserial-0001', 
@@ -11,7 +34,8 @@ class ModbusConnection:
             unit_id=1, 
             stopbits=1, 
             bytesize=8, 
-            timeout=2):
+            timeout=2,
+            pool_size=DEFAULT_POOL_SIZE):
         # Set up logging
         logging.basicConfig()
         self.logger = logging.getLogger(__name__)
@@ -26,33 +50,90 @@ class ModbusConnection:
         self.STOPBITS = stopbits
         self.BYTESIZE = bytesize
         self.TIMEOUT = timeout
+        self.POOL_SIZE = pool_size
 
+        self.transport = None
         self.client = None
+        self.health = UnitHealthMonitor(timeout)
+        self.stats = BusStats()
 
     def initialize(self):
-        self.client = ModbusClient(
-            port=self.PORT,
-            baudrate=self.BAUDRATE,
-            parity=self.PARITY,
-            stopbits=self.STOPBITS,
-            bytesize=self.BYTESIZE,
-            timeout=self.TIMEOUT,
-        )
+        """
+        Open the transport for the port: a serial client for device paths and
+        socket:// URLs, a pool of Modbus TCP connections for tcp:// gateways.
+        client stays the first connection for callers that use it directly.
+        """
+        self.transport = create_transport(self.PORT, self.BAUDRATE, self.PARITY, self.STOPBITS,
+                                          self.BYTESIZE, self.TIMEOUT, self.POOL_SIZE)
+        self.client = self.transport.client
         return self.client
 
+    @property
+    def concurrency(self):
+        """How many transactions the transport can have in flight at once"""
+        return self.transport.size if self.transport else 1
+
+    def _request(self, modbus_id, request, function_code, count, use_breaker=True):
+        """
+        Run one transaction with the unit's adaptive timeout and record the
+        outcome in the unit's health and the bus stats. Units whose breaker
+        is open are not sent anything, apart from the periodic probe. Writes
+        skip the breaker so control commands are always attempted, with the
+        full configured timeout.
+        """
+        health = self.health.unit(modbus_id)
+        if use_breaker:
+            if not health.allow_request():
+                raise UnitUnavailable(f"Unit {modbus_id} is not responding")
+            timeout = health.timeout(self.TIMEOUT)
+        else:
+            timeout = self.TIMEOUT
+
+        # A transport that cannot connect, or a client that raises, is not
+        # the unit's fault, so neither touches the unit's health
+        try:
+            with self.transport.channel() as channel:
+                channel.apply_timeout(timeout)
+                started = time.monotonic()
+                # Serial clients count the bytes they receive, see RecordingSerialClient
+                received = getattr(channel.client, 'received', 0)
+                try:
+                    result = request(channel.client)
+                except Exception:
+                    self.stats.record(modbus_id, function_code, count, time.monotonic() - started, ERROR)
+                    raise
+                elapsed = time.monotonic() - started
+                garbled = getattr(channel.client, 'received', 0) > received
+                if hasattr(result, 'isError') and result.isError() and not isinstance(result, ExceptionResponse):
+                    channel.fault()
+        except BaseException:
+            health.record_aborted()
+            raise
+
+        outcome = result_outcome(result, garbled)
+        self.stats.record(modbus_id, function_code, count, elapsed, outcome)
+
+        # An exception response still proves the unit is alive
+        if outcome in (OK, EXCEPTION_RESPONSE):
+            health.record_success(elapsed)
+        else:
+            health.record_failure()
+        return result
+
     def read_register_holding(self, register: int, modbus_id=None):
         if modbus_id is None:
             modbus_id = self.UNIT_ID
 
         try:
             # Read the register value synchronously
-            result = self.client.read_holding_registers(register, 1, modbus_id)
+            result = self._request(modbus_id, lambda client: client.read_holding_registers(register, 1, modbus_id),
+                                   FC_READ_HOLDING, 1)
             
             if result.isError():
-                print(f"Error message: {result}")
+                self.logger.debug(f"Error message: {result}")
                 return result
             
-            print("Returned values:", result.registers)
+            self.logger.debug(f"Returned values: {result.registers}")
             return result
             
         except Exception as e:
@@ -64,45 +145,127 @@ class ModbusConnection:
         Read input registers and properly handle errors
         """
         try:
-            result = self.client.read_input_registers(address, count, slave)
+            result = self._request(slave, lambda client: client.read_input_registers(address, count, slave),
+                                   FC_READ_INPUT, count)
             
             # Check if result is an integer (error code) or has an isError method
             if isinstance(result, int):
                 raise Exception(f"Received error code: {result}")
+            elif isinstance(result, ExceptionResponse):
+                raise SlaveException(f"Modbus error: {result}")
             elif hasattr(result, 'isError') and result.isError():
                 raise Exception(f"Modbus error: {result}")
             
             return result
+        except (UnitUnavailable, TransportUnavailable):
+            raise
         except Exception as e:
             # Log the error and re-raise it for the route handler to catch
             self.logger.error(f"Error reading input register {address}: {e}")
             raise
-            
+
+    def read_holding_block(self, start: int, count: int, modbus_id=None):
+        """
+        Read a contiguous block of holding registers in one transaction
+        and return the raw register words
+        """
+        if modbus_id is None:
+            modbus_id = self.UNIT_ID
+
+        try:
+            result = self._request(modbus_id, lambda client: client.read_holding_registers(start, count, modbus_id),
+                                   FC_READ_HOLDING, count)
+
+            if isinstance(result, int):
+                raise Exception(f"Received error code: {result}")
+            elif isinstance(result, ExceptionResponse):
+                raise SlaveException(f"Modbus error: {result}")
+            elif hasattr(result, 'isError') and result.isError():
+                raise Exception(f"Modbus error: {result}")
+
+            return result.registers
+        except (UnitUnavailable, TransportUnavailable):
+            raise
+        except Exception as e:
+            self.logger.error(f"Error reading holding registers {start}-{start + count - 1}: {e}")
+            raise
+
+    def read_input_block(self, start: int, count: int, modbus_id=None):
+        """
+        Read a contiguous block of input registers in one transaction
+        and return the raw register words
+        """
+        if modbus_id is None:
+            modbus_id = self.UNIT_ID
+
+        result = self.read_register_input(start, count, modbus_id)
+        return result.registers
+
     def write_register(self, register: int, values: list, modbus_id=None):
         if modbus_id is None:
             modbus_id = self.UNIT_ID
 
         try:
             # Write the register value synchronously
-            result = self.client.write_registers(register, values, modbus_id, False)
+            count = len(values) if isinstance(values, (list, tuple)) else 1
+            result = self._request(modbus_id, lambda client: client.write_registers(register, values, modbus_id, False),
+                                   FC_WRITE_MULTIPLE, count, use_breaker=False)
             
             if result.isError():
-                print(f"Error message: {result}")
+                self.logger.debug(f"Error message: {result}")
                 return result
             
-            print(f"Writing register values {values} to address {result.address}")
+            self.logger.debug(f"Writing register values {values} to address {result.address}")
             return result
             
         except Exception as e:
             self.logger.error(f"Error writing register {register}: {e}")
             return None
 
+    def probe(self, modbus_id, table, start, count, timeout=None):
+        """
+        Read registers from a unit that may not exist, for discovery sweeps.
+        Skips the unit health and bus stats, so probing 247 addresses does
+        not fill them with units that are not there. Returns the registers,
+        raises SlaveException for an exception response (the unit is there)
+        and TimeoutError when nothing answers.
+        """
+        with self.transport.channel() as channel:
+            channel.apply_timeout(timeout or self.TIMEOUT)
+            client = channel.client
+            read = client.read_holding_registers if table == HOLDING else client.read_input_registers
+            result = read(start, count, modbus_id)
+            outcome = result_outcome(result)
+            if outcome not in (OK, EXCEPTION_RESPONSE):
+                channel.fault()
+        if outcome == EXCEPTION_RESPONSE:
+            raise SlaveException(f"Modbus error: {result}")
+        if outcome != OK:
+            raise TimeoutError(f"No response from unit {modbus_id}")
+        return result.registers
+
     def connect(self):
-        return self.client.connect() if self.client else False
+        return self.transport.connect() if self.transport else False
+
+    def is_connected(self):
+        return bool(self.transport and self.transport.is_connected())
+
+    def suspend(self):
+        """Fail requests with TransportUnavailable until reopen() succeeds"""
+        if self.transport:
+            self.transport.suspend()
+
+    def reopen(self, port=None):
+        """Re-open a lost port, optionally at a new path; returns whether it is open"""
+        if port:
+            self.PORT = port
+        # Failures while the port was gone were not the units' fault
+        self.health.reset()
+        return self.transport.reopen(port)
 
     def close(self):
-        if self.client:
-            self.client.close()
+        if self.transport:
+            self.transport.close()
 
     def interactive_mode(self):
         if not self.client or not self.client.connect():
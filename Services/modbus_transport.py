@@ -0,0 +1,248 @@
+import queue
+import select
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from pymodbus.client import ModbusSerialClient, ModbusTcpClient
+from Services.logger_service import info, warning
+from Services.frame_capture import (RecordingSerialClient, RecordingTcpClient, recorder_for,
+                                    FRAMING_RTU, FRAMING_SOCKET)
+from Services.frame_replay import is_replay_port, create_replay_client
+
+# Ports given as tcp://host[:port] are Modbus TCP gateways. Anything else is
+# handed to pyserial: device paths and socket://host:port RTU-over-TCP URLs.
+TCP_SCHEME = "tcp://"
+DEFAULT_TCP_PORT = 502
+
+# Connections kept open to one gateway. Each carries its own transaction ids,
+# so a gateway that accepts several masters works on them back to back. Use 1
+# for gateways that only allow a single connection.
+DEFAULT_POOL_SIZE = 2
+
+# Seconds a pooled connection may sit idle before it is checked before use
+KEEPALIVE_INTERVAL = 30
+
+# Backoff between reconnect attempts of one connection, so a dead gateway
+# fails requests straight away instead of holding them for a connect timeout
+RECONNECT_DELAY = 1.0
+MAX_RECONNECT_DELAY = 30.0
+
+
+class TransportUnavailable(ConnectionError):
+    """No connection to the bus could be used for the request"""
+
+
+def is_tcp_port(port):
+    return isinstance(port, str) and port.startswith(TCP_SCHEME)
+
+
+def parse_tcp_port(port):
+    """Split tcp://host[:port] into (host, port)"""
+    address = port[len(TCP_SCHEME):].rstrip("/")
+    host, _, tcp_port = address.partition(":")
+    return host, int(tcp_port) if tcp_port else DEFAULT_TCP_PORT
+
+
+class Channel:
+    """One client connection and the response timeout currently applied to it"""
+
+    def __init__(self, client, timeout, reset_on_error=False):
+        self.client = client
+        self.timeout = timeout
+        self.reset_on_error = reset_on_error
+        self.last_used = time.monotonic()
+        self.connects = 0
+        self.next_attempt = 0.0
+        self.retry_delay = RECONNECT_DELAY
+
+    def apply_timeout(self, timeout):
+        """Set the response timeout for the next transaction"""
+        if timeout == self.timeout:
+            return
+        self.client.comm_params.timeout_connect = timeout
+        if isinstance(self.client, ModbusSerialClient) and self.client.socket:
+            self.client.socket.timeout = timeout
+        self.timeout = timeout
+
+    def ensure_connected(self):
+        """Reconnect if needed, without retrying faster than the backoff allows"""
+        if self.client.connected and not self._idle_socket_closed():
+            return
+        now = time.monotonic()
+        if now < self.next_attempt:
+            raise TransportUnavailable(f"{self.name} is down, next reconnect in {self.next_attempt - now:.1f}s")
+        self.client.close()
+        if not self.client.connect():
+            if self.retry_delay == RECONNECT_DELAY:
+                warning(f"Lost connection to {self.name}, retrying with backoff")
+            self.next_attempt = now + self.retry_delay
+            self.retry_delay = min(self.retry_delay * 2, MAX_RECONNECT_DELAY)
+            raise TransportUnavailable(f"Could not connect to {self.name}")
+        if self.connects:
+            info(f"Reconnected to {self.name}")
+        self.connects += 1
+        self.retry_delay = RECONNECT_DELAY
+
+    def fault(self):
+        """
+        Drop the connection after a missed response. On TCP a late answer
+        would otherwise be read as the response to the next request.
+        """
+        if self.reset_on_error:
+            self.client.close()
+
+    @property
+    def name(self):
+        params = self.client.comm_params
+        return f"{params.host}:{params.port}" if isinstance(self.client, ModbusTcpClient) else str(params.host)
+
+    def _idle_socket_closed(self):
+        """Check a long idle TCP connection for a close we have not noticed yet"""
+        sock = self.client.socket
+        if not isinstance(sock, socket.socket) or time.monotonic() - self.last_used < KEEPALIVE_INTERVAL:
+            return False
+        try:
+            readable, _, _ = select.select([sock], [], [], 0)
+            # A readable socket with nothing to read has been closed by the peer
+            return bool(readable) and not sock.recv(1, socket.MSG_PEEK)
+        except OSError:
+            return True
+
+
+class SerialTransport:
+    """A single serial port (or RTU-over-TCP socket, or capture replay) shared under a lock"""
+
+    size = 1
+
+    def __init__(self, client, timeout):
+        self.channels = [Channel(client, timeout)]
+        self.suspended = False
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        return self.channels[0].client
+
+    @contextmanager
+    def channel(self):
+        if self.suspended:
+            raise TransportUnavailable(f"{self.client.comm_params.host} is being reopened")
+        with self._lock:
+            channel = self.channels[0]
+            yield channel
+            channel.last_used = time.monotonic()
+
+    def connect(self):
+        return self.client.connect()
+
+    def close(self):
+        self.client.close()
+        if getattr(self.client, 'recorder', None):
+            self.client.recorder.close()
+
+    def is_connected(self):
+        return self.client.is_socket_open()
+
+    def suspend(self):
+        """Fail requests straight away until the port is reopened"""
+        self.suspended = True
+
+    def reopen(self, port=None):
+        """Close the port and open it again, on a new device path if one is given"""
+        with self._lock:
+            self.client.close()
+            if port:
+                self.client.comm_params.host = port
+            connected = self.client.connect()
+            self.suspended = not connected
+            return connected
+
+
+class TcpTransport:
+    """
+    Pool of persistent Modbus TCP connections to one gateway. Requests run
+    on whichever connection is free, so up to size requests are in flight at
+    once, and a connection that is reconnecting only holds up its own request.
+    """
+
+    def __init__(self, host, port=DEFAULT_TCP_PORT, timeout=2, size=DEFAULT_POOL_SIZE, recorder=None):
+        self.host = host
+        self.port = port
+        self.size = size
+        self.recorder = recorder
+        self.channels = []
+        for index in range(size):
+            client = RecordingTcpClient(host, port=port, timeout=timeout, retries=0)
+            client.recorder = recorder
+            client.channel_id = index
+            self.channels.append(Channel(client, timeout, reset_on_error=True))
+        self._idle = queue.Queue()
+        for channel in self.channels:
+            self._idle.put(channel)
+
+    @property
+    def client(self):
+        return self.channels[0].client
+
+    @contextmanager
+    def channel(self):
+        channel = self._idle.get()
+        try:
+            channel.ensure_connected()
+            yield channel
+        except Exception:
+            channel.fault()
+            raise
+        finally:
+            channel.last_used = time.monotonic()
+            self._idle.put(channel)
+
+    def connect(self):
+        """Open every connection; the pool is usable if at least one is up"""
+        connected = 0
+        for channel in self.channels:
+            try:
+                channel.ensure_connected()
+                connected += 1
+            except TransportUnavailable:
+                pass
+        return connected > 0
+
+    def close(self):
+        for channel in self.channels:
+            channel.client.close()
+        if self.recorder:
+            self.recorder.close()
+
+    def is_connected(self):
+        return any(channel.client.connected for channel in self.channels)
+
+    def suspend(self):
+        """Pooled connections already fail fast while they reconnect"""
+
+    def reopen(self, port=None):
+        return self.connect()
+
+
+def create_transport(port, baudrate, parity, stopbits, bytesize, timeout, pool_size=DEFAULT_POOL_SIZE):
+    """
+    Pick the transport for a port: a TCP pool for tcp:// gateways, a capture
+    replay for replay:// ports, else a serial port. Frames are captured when
+    MODBUS_CAPTURE is set.
+    """
+    if is_tcp_port(port):
+        host, tcp_port = parse_tcp_port(port)
+        return TcpTransport(host, tcp_port, timeout, pool_size, recorder_for(port, FRAMING_SOCKET))
+    if is_replay_port(port):
+        return SerialTransport(create_replay_client(port, timeout), timeout)
+    client = RecordingSerialClient(
+        port=port,
+        baudrate=baudrate,
+        parity=parity,
+        stopbits=stopbits,
+        bytesize=bytesize,
+        timeout=timeout,
+    )
+    client.recorder = recorder_for(port, FRAMING_RTU)
+    return SerialTransport(client, timeout)
@@ -0,0 +1,55 @@
+from Services.register_map import REGISTER_MAP
+
+# Register map record of each power meter
+POWER_METERS = ("pm480", "pm120")
+
+# Readings every power meter record holds
+POWER_METER_FIELDS = ("V1N", "V2N", "V3N", "I1", "I2")
+
+
+class PowerMeterSample:
+    """
+    One consistent set of power meter readings. All fields come from the
+    same block read, so voltages and currents describe the same instant.
+    """
+
+    __slots__ = ("meter", "timestamp") + POWER_METER_FIELDS
+
+    def __init__(self, meter, timestamp, V1N, V2N, V3N, I1, I2):
+        self.meter = meter
+        self.timestamp = timestamp
+        self.V1N = V1N
+        self.V2N = V2N
+        self.V3N = V3N
+        self.I1 = I1
+        self.I2 = I2
+
+    @classmethod
+    def from_record(cls, meter, record):
+        """Build a sample from an acquisition snapshot record"""
+        values = record["values"]
+        return cls(meter, record["timestamp"], *(values[f"{meter}.{field}"] for field in POWER_METER_FIELDS))
+
+    def to_dict(self):
+        return {
+            "meter": self.meter,
+            "timestamp": self.timestamp,
+            "values": {
+                field: REGISTER_MAP.describe(f"{self.meter}.{field}", getattr(self, field))
+                for field in POWER_METER_FIELDS
+            },
+        }
+
+    def __repr__(self):
+        return (f"PowerMeterSample({self.meter!r}, V1N={self.V1N}, V2N={self.V2N}, V3N={self.V3N}, "
+                f"I1={self.I1}, I2={self.I2})")
+
+
+def latest_sample(acquisition, meter):
+    """Return the latest sample of a power meter or raise if it has not been read yet"""
+    if meter not in POWER_METERS:
+        raise ValueError(f"Unknown power meter '{meter}'")
+    record = acquisition.record(meter)
+    if record is None:
+        raise LookupError(f"No data for power meter {meter}")
+    return PowerMeterSample.from_record(meter, record)
@@ -0,0 +1,291 @@
+import struct
+
+# Registers each data type occupies and its struct code
+TYPE_WIDTHS = {
+    "uint16": 1,
+    "int16": 1,
+    "uint32": 2,
+    "int32": 2,
+    "float32": 2,
+    "uint64": 4,
+    "int64": 4,
+    "float64": 4,
+}
+
+STRUCT_CODES = {
+    "uint16": "H",
+    "int16": "h",
+    "uint32": "I",
+    "int32": "i",
+    "float32": "f",
+    "uint64": "Q",
+    "int64": "q",
+    "float64": "d",
+}
+
+# Multi-register values are either sent high word first ("big", ABCD) or
+# low word first ("little", CDAB). Single register tags decode either way.
+WORD_ORDERS = ("big", "little")
+
+HOLDING = "holding"
+INPUT = "input"
+
+# name, unit, address, type, word order, scale, engineering unit, label, poll class
+VFD_TAGS = [
+    ("speed", 100, "int16", "big", 1, "rpm", "Speed & Direction", "fast"),
+    ("output_frequency", 102, "uint16", "big", 0.1, "Hz", "Output Frequency", "fast"),
+    ("current", 103, "uint16", "big", 0.1, "A", "Current", "fast"),
+    ("torque", 104, "int16", "big", 1, "%", "Torque", "fast"),
+    ("power", 105, "int16", "big", 0.1, "kW", "Power", "normal"),
+    ("dc_bus_voltage", 106, "uint16", "big", 1, "V", "DC Bus Voltage", "normal"),
+    ("output_voltage", 108, "uint16", "big", 1, "V", "Output Voltage", "normal"),
+    ("drive_temp", 109, "int16", "big", 1, "°C", "Drive Temperature", "slow"),
+    ("drive_cb_temp", 149, "int16", "big", 1, "°C", "Drive CB Temperature", "slow"),
+    ("mot_therm_stress", 152, "uint16", "big", 1, "%", "Motor Thermal Stress", "slow"),
+    ("latest_fault", 401, "uint16", "big", 1, "code", "Latest Fault", "slow"),
+    ("speed_at_fault", 404, "int16", "big", 1, "rpm", "Speed at Fault", "slow"),
+    ("freq_at_fault", 405, "uint16", "big", 0.1, "Hz", "Frequency at Fault", "slow"),
+    ("voltage_at_fault", 406, "uint16", "big", 1, "V", "Voltage at Fault", "slow"),
+    ("current_at_fault", 407, "uint16", "big", 0.1, "A", "Current at Fault", "slow"),
+    ("torque_at_fault", 408, "int16", "big", 1, "%", "Torque at Fault", "slow"),
+    ("status_at_fault", 409, "uint16", "big", 1, "code", "Status at Fault", "slow"),
+]
+
+BOARD_TAGS = [
+    # Below ground board
+    ("bg.thrust_top", 5, 9, "uint16", "big", 1, "", "Thrust Top", "normal"),
+    ("bg.thrust_left", 5, 10, "uint16", "big", 1, "", "Thrust Left", "normal"),
+    ("bg.thrust_right", 5, 11, "uint16", "big", 1, "", "Thrust Right", "normal"),
+    ("bg.motor_temp_adc", 5, 12, "uint16", "big", 1, "", "Motor Temperature ADC", "normal"),
+    ("bg.earth_pressure", 5, 13, "uint16", "big", 1, "", "Earth Pressure", "normal"),
+    ("bg.flame", 5, 14, "uint16", "big", 1, "", "Flame", "normal"),
+    ("bg.actuator_a", 5, 15, "uint16", "big", 1, "", "Actuator A", "normal"),
+    ("bg.actuator_b", 5, 16, "uint16", "big", 1, "", "Actuator B", "normal"),
+    ("bg.actuator_c", 5, 17, "uint16", "big", 1, "", "Actuator C", "normal"),
+    ("bg.encoder_speed", 5, 62, "uint16", "big", 1, "", "Encoder Speed", "normal"),
+    # Above ground board
+    ("ag.oil_temp", 6, 10, "uint16", "big", 1, "", "Oil Temperature", "normal"),
+    ("ag.water_pressure", 6, 11, "uint16", "big", 1, "", "Water Pressure", "normal"),
+    ("ag.oil_pressure", 6, 12, "uint16", "big", 1, "", "Oil Pressure", "normal"),
+]
+
+# The power meters report IEEE floats in input registers, low word first.
+# Each meter's tags form one record that is always read in a single request.
+POWER_METER_TAGS = [
+    ("pm480.V1N", 3, 8, "float32", "little", 1, "V", "480V V1N", "medium"),
+    ("pm480.V2N", 3, 10, "float32", "little", 1, "V", "480V V2N", "medium"),
+    ("pm480.V3N", 3, 12, "float32", "little", 1, "V", "480V V3N", "medium"),
+    ("pm480.I1", 3, 16, "float32", "little", 1, "A", "480V I1", "medium"),
+    ("pm480.I2", 3, 18, "float32", "little", 1, "A", "480V I2", "medium"),
+    ("pm120.V1N", 4, 0, "float32", "little", 1, "V", "120V V1N", "medium"),
+    ("pm120.V2N", 4, 2, "float32", "little", 1, "V", "120V V2N", "medium"),
+    ("pm120.V3N", 4, 4, "float32", "little", 1, "V", "120V V3N", "medium"),
+    ("pm120.I1", 4, 16, "float32", "little", 1, "A", "120V I1", "medium"),
+    ("pm120.I2", 4, 18, "float32", "little", 1, "A", "120V I2", "medium"),
+]
+
+# Change detection deadbands as (absolute, percent of the last reported
+# value). Tags not listed report every change.
+DEADBANDS = {
+    "vfd1.speed": (5, None),
+    "vfd1.output_frequency": (0.2, None),
+    "vfd1.current": (0.2, None),
+    "vfd1.torque": (1, None),
+    "vfd1.power": (0.2, None),
+    "vfd1.dc_bus_voltage": (2, None),
+    "vfd1.output_voltage": (2, None),
+    "vfd1.drive_temp": (1, None),
+    "vfd1.drive_cb_temp": (1, None),
+    "vfd1.mot_therm_stress": (1, None),
+    "bg.thrust_top": (0, 1),
+    "bg.thrust_left": (0, 1),
+    "bg.thrust_right": (0, 1),
+    "bg.motor_temp_adc": (4, None),
+    "bg.earth_pressure": (0, 1),
+    "ag.oil_temp": (4, None),
+    "ag.water_pressure": (0, 1),
+    "ag.oil_pressure": (0, 1),
+    "pm480.V1N": (0, 0.5),
+    "pm480.V2N": (0, 0.5),
+    "pm480.V3N": (0, 0.5),
+    "pm480.I1": (0, 1),
+    "pm480.I2": (0, 1),
+    "pm120.V1N": (0, 0.5),
+    "pm120.V2N": (0, 0.5),
+    "pm120.V3N": (0, 0.5),
+    "pm120.I1": (0, 1),
+    "pm120.I2": (0, 1),
+}
+
+
+class RegisterTag:
+    """One entry of the register map"""
+
+    __slots__ = ("name", "unit", "address", "type", "width", "word_order",
+                 "scale", "eng_unit", "label", "poll", "table", "record",
+                 "deadband", "deadband_percent")
+
+    def __init__(self, name, unit, address, type="uint16", word_order="big", scale=1,
+                 eng_unit="", label=None, poll="normal", table=HOLDING, width=None, record=None,
+                 deadband=0, deadband_percent=None):
+        if type == "raw":
+            width = width or 1
+        elif type in TYPE_WIDTHS:
+            width = TYPE_WIDTHS[type]
+        else:
+            raise ValueError(f"Unknown register type '{type}' for {name}")
+        if word_order not in WORD_ORDERS:
+            raise ValueError(f"Unknown word order '{word_order}' for {name}")
+        if table not in (HOLDING, INPUT):
+            raise ValueError(f"Unknown register table '{table}' for {name}")
+
+        self.name = name
+        self.unit = unit
+        self.address = address
+        self.type = type
+        self.width = width
+        self.word_order = word_order
+        self.scale = scale
+        self.eng_unit = eng_unit
+        self.label = label or str(name)
+        self.poll = poll
+        self.table = table
+        self.record = record
+        self.deadband = deadband
+        self.deadband_percent = deadband_percent
+
+    @property
+    def end(self):
+        return self.address + self.width
+
+    def __repr__(self):
+        return f"RegisterTag({self.name!r}, unit={self.unit}, address={self.address}, type={self.type})"
+
+
+class BlockDecoder:
+    """
+    Decoder compiled for one block read. The block's words are packed to
+    bytes once and every tag is pulled out with a single struct.unpack_from
+    per byte order, gaps between tags being skipped with pad bytes.
+    """
+
+    def __init__(self, start, count, tags):
+        self.start = start
+        self.count = count
+        self._packers = {}
+        self._passes = []
+
+        # A tag joins the first pass with its byte order that has not already
+        # consumed its address, so overlapping tags still decode correctly
+        layouts = []
+        for tag in sorted(tags, key=lambda tag: tag.address):
+            order = "<" if tag.width > 1 and tag.word_order == "little" else ">"
+            for layout in layouts:
+                if layout["order"] == order and layout["position"] <= tag.address:
+                    break
+            else:
+                layout = {"order": order, "position": start, "format": [], "tags": []}
+                layouts.append(layout)
+
+            pad = (tag.address - layout["position"]) * 2
+            if pad:
+                layout["format"].append(f"{pad}x")
+            if tag.type == "raw":
+                layout["format"].append(f"{tag.width}H")
+            else:
+                layout["format"].append(STRUCT_CODES[tag.type])
+            layout["tags"].append(tag)
+            layout["position"] = tag.end
+
+        for layout in layouts:
+            order = layout["order"]
+            if order not in self._packers:
+                self._packers[order] = struct.Struct(f"{order}{count}H")
+            compiled = struct.Struct(order + "".join(layout["format"]))
+            self._passes.append((order, compiled, layout["tags"]))
+
+    def decode(self, registers):
+        """Return {tag name: engineering value} for the block's raw words"""
+        raw = {order: packer.pack(*registers) for order, packer in self._packers.items()}
+        values = {}
+        for order, compiled, tags in self._passes:
+            fields = compiled.unpack_from(raw[order])
+            index = 0
+            for tag in tags:
+                if tag.type == "raw":
+                    value = list(fields[index:index + tag.width])
+                    index += tag.width
+                    if tag.width == 1:
+                        value = value[0]
+                else:
+                    value = fields[index]
+                    index += 1
+                    if tag.scale != 1:
+                        value = value * tag.scale
+                values[tag.name] = value
+        return values
+
+
+class RegisterMap:
+    """Lookup table of every known tag, built from the tables above"""
+
+    def __init__(self, tags):
+        self.tags = {}
+        for tag in tags:
+            if tag.name in self.tags:
+                raise ValueError(f"Duplicate register map tag '{tag.name}'")
+            self.tags[tag.name] = tag
+
+    def __getitem__(self, name):
+        return self.tags[name]
+
+    def __contains__(self, name):
+        return name in self.tags
+
+    def __iter__(self):
+        return iter(self.tags.values())
+
+    def poll_groups(self, units=None):
+        """Return {poll class: [tags]} for the acquisition engine"""
+        groups = {}
+        for tag in self.tags.values():
+            if units is not None and tag.unit not in units:
+                continue
+            groups.setdefault(tag.poll, []).append(tag)
+        return groups
+
+    def records(self):
+        """Return {record name: [tags]} for tags that must be read together"""
+        records = {}
+        for tag in self.tags.values():
+            if tag.record is not None:
+                records.setdefault(tag.record, []).append(tag)
+        return records
+
+    def decode(self, name, registers):
+        """Decode the raw words of a single tag"""
+        tag = self.tags[name]
+        return BlockDecoder(tag.address, tag.width, [tag]).decode(registers)[name]
+
+    def describe(self, name, value):
+        """Return a value with its label and engineering unit"""
+        tag = self.tags[name]
+        return {"name": tag.label, "value": value, "unit": tag.eng_unit}
+
+
+def _build_register_map():
+    tags = []
+    for name, address, type, word_order, scale, eng_unit, label, poll in VFD_TAGS:
+        tags.append(RegisterTag(f"vfd1.{name}", 1, address, type, word_order, scale, eng_unit, label, poll))
+    for name, unit, address, type, word_order, scale, eng_unit, label, poll in BOARD_TAGS:
+        tags.append(RegisterTag(name, unit, address, type, word_order, scale, eng_unit, label, poll))
+    for name, unit, address, type, word_order, scale, eng_unit, label, poll in POWER_METER_TAGS:
+        tags.append(RegisterTag(name, unit, address, type, word_order, scale, eng_unit, label, poll,
+                                table=INPUT, record=name.split(".")[0]))
+    for tag in tags:
+        if tag.name in DEADBANDS:
+            tag.deadband, tag.deadband_percent = DEADBANDS[tag.name]
+    return RegisterMap(tags)
+
+
+REGISTER_MAP = _build_register_map()
@@ -0,0 +1,44 @@
+"""
+Modbus RTU wire timing estimates used to budget bus time for scan plans
+"""
+
+# Time a slave takes between the end of a request and the start of its
+# response. ABB drives and our boards answer in a few milliseconds.
+DEFAULT_TURNAROUND = 0.005
+
+# Frame overheads in bytes (slave id, function code, CRC and headers)
+READ_REQUEST_BYTES = 8           # id, fc, start(2), count(2), crc(2)
+READ_RESPONSE_OVERHEAD = 5       # id, fc, byte count, crc(2)
+WRITE_REQUEST_OVERHEAD = 9       # id, fc, start(2), count(2), byte count, crc(2)
+WRITE_RESPONSE_BYTES = 8         # id, fc, start(2), count(2), crc(2)
+
+
+def char_time(baudrate, bytesize=8, parity='N', stopbits=1):
+    """Seconds needed to send one character including start, parity and stop bits"""
+    bits = 1 + bytesize + (0 if parity == 'N' else 1) + stopbits
+    return bits / baudrate
+
+
+def inter_frame_gap(baudrate, bytesize=8, parity='N', stopbits=1):
+    """Silent interval that delimits RTU frames (3.5 chars, fixed above 19200 baud)"""
+    if baudrate > 19200:
+        return 0.00175
+    return 3.5 * char_time(baudrate, bytesize, parity, stopbits)
+
+
+def read_transaction_time(count, baudrate, bytesize=8, parity='N', stopbits=1,
+                          turnaround=DEFAULT_TURNAROUND):
+    """Estimated seconds for one read of count registers, request to response"""
+    char = char_time(baudrate, bytesize, parity, stopbits)
+    gap = inter_frame_gap(baudrate, bytesize, parity, stopbits)
+    frame_bytes = READ_REQUEST_BYTES + READ_RESPONSE_OVERHEAD + 2 * count
+    return frame_bytes * char + 2 * gap + turnaround
+
+
+def write_transaction_time(count, baudrate, bytesize=8, parity='N', stopbits=1,
+                           turnaround=DEFAULT_TURNAROUND):
+    """Estimated seconds for one write of count registers, request to response"""
+    char = char_time(baudrate, bytesize, parity, stopbits)
+    gap = inter_frame_gap(baudrate, bytesize, parity, stopbits)
+    frame_bytes = WRITE_REQUEST_OVERHEAD + 2 * count + WRITE_RESPONSE_BYTES
+    return frame_bytes * char + 2 * gap + turnaround
@@ -0,0 +1,262 @@
+from Services.logger_service import error
+from Services.register_map import RegisterTag, BlockDecoder, HOLDING
+from Services.modbus_service import SlaveException
+from Services.unit_health import UnitUnavailable
+from Services.modbus_transport import TransportUnavailable
+from Services.bus_scheduler import PRIORITY_TELEMETRY, PRIORITY_BACKGROUND
+
+# Modbus caps a single register read (function codes 3 and 4) at 125 words
+MAX_READ_COUNT = 125
+
+# Reading a few unused registers is cheaper than paying for another RTU
+# frame and slave turnaround, so gaps up to this size are read through
+DEFAULT_MAX_GAP = 10
+
+# Reads accepted in one batch query, and the seconds its transactions may
+# wait in the background lane before they are dropped
+MAX_BATCH_READS = 250
+BATCH_TIMEOUT = 5.0
+
+
+class ReadBlock:
+    """A contiguous register read that covers one or more tags"""
+
+    def __init__(self, unit, table, start, count, tags):
+        self.unit = unit
+        self.table = table
+        self.start = start
+        self.count = count
+        self.tags = tags
+        self._decoder = None
+
+    @property
+    def end(self):
+        return self.start + self.count
+
+    @property
+    def decoder(self):
+        """Struct based decoder for this block, compiled on first use"""
+        if self._decoder is None:
+            self._decoder = BlockDecoder(self.start, self.count, self.tags)
+        return self._decoder
+
+    def __repr__(self):
+        return (f"ReadBlock(unit={self.unit}, table={self.table}, start={self.start}, "
+                f"count={self.count}, tags={len(self.tags)})")
+
+
+def _normalize_tag(tag):
+    """
+    Accept a RegisterTag, or a bare (unit, address) / (unit, address, width)
+    holding register tuple, which is read raw and keyed by (unit, address)
+    """
+    if isinstance(tag, RegisterTag):
+        return tag
+    unit, address = tag[0], tag[1]
+    width = tag[2] if len(tag) > 2 else 1
+    return RegisterTag((unit, address), unit, address, "uint16" if width == 1 else "raw", width=width)
+
+
+def plan_reads(tags, max_gap=DEFAULT_MAX_GAP, max_count=MAX_READ_COUNT):
+    """
+    Merge tags into the fewest contiguous reads.
+
+    Tags on the same unit and register table are merged when the hole
+    between them is at most max_gap registers and the merged block still
+    fits in max_count words. Tags of the same record are always merged,
+    whatever the gap, so a record is read in a single transaction.
+    """
+    by_table = {}
+    for tag in tags:
+        tag = _normalize_tag(tag)
+        if tag.width > max_count:
+            raise ValueError(f"Tag {tag.name} is wider than {max_count} registers")
+        by_table.setdefault((tag.unit, tag.table), []).append(tag)
+
+    blocks = []
+    for unit, table in sorted(by_table):
+        current = None
+        for tag in sorted(by_table[(unit, table)], key=lambda tag: (tag.address, tag.width)):
+            if current is not None:
+                gap = tag.address - current.end
+                new_count = max(current.end, tag.end) - current.start
+                same_record = tag.record is not None and any(other.record == tag.record for other in current.tags)
+                if (gap <= max_gap or same_record) and new_count <= max_count:
+                    current.count = new_count
+                    current.tags.append(tag)
+                    continue
+                blocks.append(current)
+
+            current = ReadBlock(unit, table, tag.address, tag.width, [tag])
+
+        if current is not None:
+            blocks.append(current)
+
+    records = {}
+    for block in blocks:
+        for tag in block.tags:
+            if tag.record is not None and records.setdefault(tag.record, block) is not block:
+                raise ValueError(f"Record {tag.record} does not fit in one {max_count} register read")
+
+    return blocks
+
+
+def split_block(block, max_count=MAX_READ_COUNT):
+    """
+    One read per tag of a block the slave rejected, so an address it does
+    not map fails only its own tag. Tags of a record are still read together.
+    """
+    groups = {}
+    for tag in block.tags:
+        groups.setdefault(tag.name if tag.record is None else (tag.record,), []).append(tag)
+    blocks = [split for group in groups.values() for split in plan_reads(group, 0, max_count)]
+    return sorted(blocks, key=lambda split: split.start)
+
+
+def read_tag(bus, tag, priority=PRIORITY_TELEMETRY, timeout=None):
+    """
+    Read a single tag through the bus and return its decoded value. All of
+    a tag's registers come from one transaction, so a 32 or 64 bit value is
+    never assembled from words read at different times.
+    """
+    tag = _normalize_tag(tag)
+    read = bus.read_holding_block if tag.table == HOLDING else bus.read_input_block
+    registers = read(tag.address, tag.width, tag.unit, priority=priority, timeout=timeout).result()
+    return BlockDecoder(tag.address, tag.width, [tag]).decode(registers)[tag.name]
+
+
+def read_batch(bus, tags, max_gap=DEFAULT_MAX_GAP, priority=PRIORITY_BACKGROUND, timeout=BATCH_TIMEOUT):
+    """
+    Read any set of tags in the fewest block transactions, queued on the bus
+    behind scans and control traffic. Returns ({name: value}, {name: error},
+    transactions). A merged block the slave rejects is read again one tag
+    at a time, so one unmapped register only fails its own tag.
+    """
+    values = {}
+    errors = {}
+    transactions = 0
+    pending = [(block, True) for block in plan_reads(tags, max_gap)]
+    while pending:
+        futures = []
+        for block, may_split in pending:
+            read = bus.read_holding_block if block.table == HOLDING else bus.read_input_block
+            futures.append((block, may_split, read(block.start, block.count, block.unit,
+                                                   priority=priority, timeout=timeout)))
+        transactions += len(futures)
+        pending = []
+        for block, may_split, future in futures:
+            try:
+                values.update(block.decoder.decode(future.result()))
+            except SlaveException as e:
+                if may_split and len(block.tags) > 1:
+                    pending.extend((split, False) for split in split_block(block))
+                else:
+                    errors.update(dict.fromkeys((tag.name for tag in block.tags), str(e)))
+            except Exception as e:
+                errors.update(dict.fromkeys((tag.name for tag in block.tags), str(e) or type(e).__name__))
+    return values, errors, transactions
+
+
+def batch_query(bus, reads, max_gap=DEFAULT_MAX_GAP):
+    """
+    Run a batch of {"unit", "address", "type", "wordOrder", "table"} reads
+    (type defaults to uint16, wordOrder to big, table to holding). Returns
+    one result per read, in order, with its decoded value or an error, and
+    the number of bus transactions used.
+    """
+    if len(reads) > MAX_BATCH_READS:
+        raise ValueError(f"A batch may hold at most {MAX_BATCH_READS} reads, got {len(reads)}")
+    results = []
+    tags = []
+    for index, item in enumerate(reads):
+        if not isinstance(item, dict):
+            results.append({"error": "Each read must be an object"})
+            continue
+        result = {key: item.get(key) for key in ("unit", "address", "type")}
+        result["type"] = result["type"] or "uint16"
+        results.append(result)
+        try:
+            if not isinstance(item.get("unit"), int) or not isinstance(item.get("address"), int):
+                raise ValueError("unit and address must be integers")
+            tags.append((index, RegisterTag(f"reads[{index}]", item["unit"], item["address"], result["type"],
+                                            item.get("wordOrder", "big"), table=item.get("table", HOLDING))))
+        except (ValueError, TypeError) as e:
+            result["error"] = str(e)
+
+    values, errors, transactions = read_batch(bus, [tag for _, tag in tags], max_gap)
+    for index, tag in tags:
+        if tag.name in errors:
+            results[index]["error"] = errors[tag.name]
+        else:
+            results[index]["value"] = values[tag.name]
+    return results, transactions
+
+
+class ScanPlanner:
+    """
+    Plans and executes coalesced register reads for a set of tags.
+
+    Values are returned keyed by tag name, decoded and scaled through each
+    block's compiled decoder. Bare tuple tags come back keyed by (unit, address).
+    """
+
+    def __init__(self, tags, max_gap=DEFAULT_MAX_GAP, max_count=MAX_READ_COUNT):
+        self.tags = [_normalize_tag(tag) for tag in tags]
+        self.max_gap = max_gap
+        self.max_count = max_count
+        self.blocks = plan_reads(self.tags, max_gap, max_count)
+
+    def read_block(self, modbus, block):
+        """Read one planned block and decode every tag in it"""
+        try:
+            if block.table == HOLDING:
+                registers = modbus.read_holding_block(block.start, block.count, block.unit)
+            else:
+                registers = modbus.read_input_block(block.start, block.count, block.unit)
+        except Exception as e:
+            return self._read_failed(block, e)
+
+        return block.decoder.decode(registers)
+
+    async def read_block_async(self, modbus, block):
+        """read_block on an AsyncModbusConnection"""
+        try:
+            if block.table == HOLDING:
+                registers = await modbus.read_holding_block(block.start, block.count, block.unit)
+            else:
+                registers = await modbus.read_input_block(block.start, block.count, block.unit)
+        except Exception as e:
+            return self._read_failed(block, e)
+
+        return block.decoder.decode(registers)
+
+    def _read_failed(self, block, e):
+        """Blank the values of a block that could not be read"""
+        if isinstance(e, TransportUnavailable):
+            # The port is down, not the unit: keep the last values, which the
+            # snapshot marks stale until the port is back
+            return {}
+        if isinstance(e, UnitUnavailable):
+            # The unit's breaker is open and it already logged why
+            return {tag.name: None for tag in block.tags}
+        if len(block.tags) > 1 and isinstance(e, SlaveException):
+            # Some slaves reject reads that span unmapped addresses, so read
+            # this block one tag at a time from now on (records stay whole). A silent unit is left to its breaker instead, as
+            # splitting would only multiply the timeouts.
+            self._split_block(block)
+        error(f"Scan read failed for unit {block.unit} at {block.start}: {str(e)}")
+        return {tag.name: None for tag in block.tags}
+
+    def read(self, modbus):
+        """Read every planned block and return the values for all tags"""
+        values = {}
+        for block in list(self.blocks):
+            values.update(self.read_block(modbus, block))
+        return values
+
+    def _split_block(self, block):
+        """Replace a merged block with one block per tag or record"""
+        if block not in self.blocks:
+            return
+        index = self.blocks.index(block)
+        self.blocks[index:index + 1] = split_block(block, self.max_count)
@@ -0,0 +1,267 @@
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import CancelledError
+from Services.logger_service import info, error
+from Services.bus_scheduler import PRIORITY_CONTROL, CONTROL_WRITE_TIMEOUT
+
+# Seconds a readback condition may take before its step fails, and how
+# often the register is read while waiting
+DEFAULT_CONDITION_TIMEOUT = 5.0
+CONDITION_POLL_INTERVAL = 0.05
+
+# Finished jobs kept for status queries
+MAX_JOBS = 100
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+SKIPPED = "skipped"
+
+
+class SequenceError(Exception):
+    """A step of a sequence could not be completed"""
+
+
+class Condition:
+    """Readback condition: the masked bits of a register must equal value"""
+
+    def __init__(self, register, mask, value=None, timeout=DEFAULT_CONDITION_TIMEOUT):
+        self.register = register
+        self.mask = mask
+        self.value = mask if value is None else value
+        self.timeout = timeout
+
+    def satisfied(self, word):
+        return word & self.mask == self.value
+
+    def __repr__(self):
+        return f"Condition(register={self.register}, mask={self.mask:#06x}, value={self.value:#06x})"
+
+
+class Step:
+    """
+    One step of a sequence: register writes, then an optional readback
+    condition, then at least dwell seconds before the next step starts.
+    writes maps register to value; adjacent registers go out in one write.
+    """
+
+    def __init__(self, name, writes, dwell=0.0, until=None):
+        self.name = name
+        self.writes = dict(writes)
+        self.dwell = dwell
+        self.until = until
+
+    def write_blocks(self):
+        """Group the writes into (start register, [values]) runs of adjacent registers"""
+        blocks = []
+        for register in sorted(self.writes):
+            if blocks and blocks[-1][0] + len(blocks[-1][1]) == register:
+                blocks[-1][1].append(self.writes[register])
+            else:
+                blocks.append((register, [self.writes[register]]))
+        return blocks
+
+
+class Sequence:
+    """A named list of steps"""
+
+    def __init__(self, name, steps):
+        self.name = name
+        self.steps = steps
+
+
+# ABB drives profile start: OFF1, then switch on, enable operation and the
+# ramp bits one at a time (control word is holding register 0)
+STARTUP_SEQUENCE = Sequence("startup", [
+    Step("ready to switch on", {0: 0b110}, dwell=0.1),
+    Step("switch on", {0: 0b111}),
+    Step("enable operation", {0: 0b1111}),
+    Step("release ramp output", {0: 0b101111}),
+    Step("release ramp", {0: 0b1101111}),
+])
+
+
+class SequenceJob:
+    """Progress of one sequence run on one unit"""
+
+    def __init__(self, sequence, modbus_id):
+        self.id = uuid.uuid4().hex
+        self.sequence = sequence
+        self.modbus_id = modbus_id
+        self.state = QUEUED
+        self.error = None
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_requested = False
+        # The write the job is waiting on, cancelled with the job so it never
+        # reaches the bus after a stop command queued behind it
+        self.pending = None
+        self.lock = threading.Lock()
+        self.steps = [{"name": step.name, "state": QUEUED, "duration": None, "writes": 0, "readbacks": 0}
+                      for step in sequence.steps]
+
+    @property
+    def current_step(self):
+        for index, step in enumerate(self.steps):
+            if step["state"] in (QUEUED, RUNNING):
+                return index
+        return None
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "sequence": self.sequence.name,
+            "unit": self.modbus_id,
+            "state": self.state,
+            "error": self.error,
+            "current_step": self.current_step if self.state in (QUEUED, RUNNING) else None,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "steps": [dict(step) for step in self.steps],
+        }
+
+
+class SequenceEngine:
+    """
+    Runs command sequences in the background as timed control-lane bus
+    transactions. Jobs on the same unit run one after another; progress
+    and per-step timing are available by job id.
+    """
+
+    def __init__(self, bus, priority=PRIORITY_CONTROL, timeout=CONTROL_WRITE_TIMEOUT, max_jobs=MAX_JOBS):
+        self.bus = bus
+        self.priority = priority
+        self.timeout = timeout
+        self.max_jobs = max_jobs
+
+        self._jobs = OrderedDict()
+        self._unit_locks = {}
+        self._lock = threading.Lock()
+
+    def run(self, sequence, modbus_id=None):
+        """Start a sequence on a unit and return its job"""
+        job = SequenceJob(sequence, modbus_id)
+        with self._lock:
+            self._jobs[job.id] = job
+            while len(self._jobs) > self.max_jobs:
+                oldest = next(iter(self._jobs.values()))
+                if oldest.state in (QUEUED, RUNNING):
+                    break
+                self._jobs.popitem(last=False)
+            unit_lock = self._unit_locks.setdefault(modbus_id, threading.Lock())
+
+        thread = threading.Thread(target=self._run_job, args=(job, unit_lock), daemon=True)
+        thread.start()
+        return job
+
+    def job(self, job_id):
+        """Return the progress of a job, or None for an unknown id"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        return job.to_dict() if job else None
+
+    def jobs(self):
+        with self._lock:
+            return [job.to_dict() for job in self._jobs.values()]
+
+    def cancel(self, job_id):
+        """Stop a job before its next step; returns False for an unknown id"""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            return False
+        _cancel(job)
+        return True
+
+    def cancel_unit(self, modbus_id):
+        """Stop every queued or running job on a unit, e.g. before a stop command"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values()
+                    if job.modbus_id == modbus_id and job.state in (QUEUED, RUNNING)]
+        for job in jobs:
+            _cancel(job)
+        return len(jobs)
+
+    def _run_job(self, job, unit_lock):
+        with unit_lock:
+            job.state = RUNNING
+            job.started = time.time()
+            info(f"Sequence {job.sequence.name} started on unit {job.modbus_id} (job {job.id})")
+            try:
+                for step, progress in zip(job.sequence.steps, job.steps):
+                    if job.cancel_requested:
+                        job.state = CANCELLED
+                        break
+                    self._run_step(job, step, progress)
+                else:
+                    job.state = DONE
+            except Exception as e:
+                job.state = CANCELLED if job.cancel_requested else FAILED
+                job.error = str(e)
+                error(f"Sequence {job.sequence.name} failed on unit {job.modbus_id} (job {job.id}): {str(e)}")
+            finally:
+                for progress in job.steps:
+                    if progress["state"] == RUNNING:
+                        progress["state"] = FAILED
+                    elif progress["state"] == QUEUED:
+                        progress["state"] = SKIPPED
+                job.finished = time.time()
+
+    def _run_step(self, job, step, progress):
+        progress["state"] = RUNNING
+        started = time.monotonic()
+
+        for register, values in step.write_blocks():
+            # Checked under the job lock so a cancel either sees this write or stops it being queued
+            with job.lock:
+                if job.cancel_requested:
+                    raise SequenceError(f"Step '{step.name}' cancelled")
+                job.pending = self.bus.write_register(register, values, job.modbus_id,
+                                                      priority=self.priority, timeout=self.timeout)
+            try:
+                result = job.pending.result()
+            except CancelledError:
+                raise SequenceError(f"Step '{step.name}' cancelled before writing register {register}")
+            finally:
+                job.pending = None
+            if result is None or (hasattr(result, 'isError') and result.isError()):
+                raise SequenceError(f"Step '{step.name}' could not write register {register}: {result}")
+            progress["writes"] += 1
+
+        if step.until is not None:
+            self._wait_for(job, step, progress)
+
+        remaining = step.dwell - (time.monotonic() - started)
+        if remaining > 0:
+            time.sleep(remaining)
+
+        progress["state"] = DONE
+        progress["duration"] = time.monotonic() - started
+
+    def _wait_for(self, job, step, progress):
+        condition = step.until
+        deadline = time.monotonic() + condition.timeout
+        while True:
+            registers = self.bus.read_holding_block(condition.register, 1, job.modbus_id,
+                                                    priority=self.priority, timeout=self.timeout).result()
+            progress["readbacks"] += 1
+            if condition.satisfied(registers[0]):
+                return
+            if time.monotonic() >= deadline or job.cancel_requested:
+                raise SequenceError(f"Step '{step.name}' timed out waiting for {condition} "
+                                    f"(last value {registers[0]:#06x})")
+            time.sleep(CONDITION_POLL_INTERVAL)
+
+
+def _cancel(job):
+    """Flag a job and drop its queued write; a write already on the wire still completes"""
+    with job.lock:
+        job.cancel_requested = True
+        if job.pending is not None:
+            job.pending.cancel()
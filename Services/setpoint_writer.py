@@ -0,0 +1,193 @@
+import threading
+import time
+from concurrent.futures import Future
+from Services.logger_service import info, error
+from Services.bus_scheduler import PRIORITY_CONTROL, CONTROL_WRITE_TIMEOUT
+
+# Minimum seconds between two writes of the same setpoint. Values that
+# arrive faster replace the pending one instead of queueing behind it.
+DEFAULT_MIN_INTERVAL = 0.1
+
+
+class Setpoint:
+    """Pending, in flight and acknowledged state of one (unit, register) setpoint"""
+
+    def __init__(self, modbus_id, register):
+        self.modbus_id = modbus_id
+        self.register = register
+
+        self.pending = None
+        self.pending_futures = []
+        self.requested = None
+        self.in_flight = False
+        self.last_sent = 0.0
+
+        self.acknowledged = None
+        self.writes = 0
+        self.coalesced = 0
+        self.failures = 0
+
+
+class SetpointWriter:
+    """
+    Last-write-wins writer for setpoints such as the VFD frequency reference.
+
+    At most one write per (unit, register) is pending. A newer value replaces
+    the pending one and every caller waiting on it gets the result of the
+    write that finally went out, so a slider sending dozens of values a
+    second costs at most one bus write per min_interval.
+    """
+
+    def __init__(self, bus, min_interval=DEFAULT_MIN_INTERVAL, priority=PRIORITY_CONTROL,
+                 timeout=CONTROL_WRITE_TIMEOUT):
+        self.bus = bus
+        self.min_interval = min_interval
+        self.priority = priority
+        self.timeout = timeout
+
+        self._setpoints = {}
+        self._condition = threading.Condition()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        """Start the thread that flushes pending setpoints"""
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        info("Setpoint writer started")
+
+    def stop(self):
+        """Stop flushing and fail any setpoint that was never written"""
+        with self._condition:
+            self._running = False
+            futures = []
+            for setpoint in self._setpoints.values():
+                futures.extend(setpoint.pending_futures)
+                setpoint.pending = None
+                setpoint.pending_futures = []
+            self._condition.notify_all()
+
+        for future in futures:
+            future.set_exception(RuntimeError("Setpoint writer stopped"))
+
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def set(self, register, value, modbus_id=None):
+        """
+        Request a setpoint value and return a Future with the acknowledgement
+        of the write that carried it, or of a newer value that replaced it
+        """
+        future = Future()
+        with self._condition:
+            if not self._running:
+                raise RuntimeError("Setpoint writer is not running")
+            key = (modbus_id, register)
+            setpoint = self._setpoints.get(key)
+            if setpoint is None:
+                setpoint = self._setpoints[key] = Setpoint(modbus_id, register)
+            if setpoint.pending is not None:
+                setpoint.coalesced += 1
+            setpoint.pending = value
+            setpoint.pending_futures.append(future)
+            setpoint.requested = time.monotonic()
+            self._condition.notify()
+        return future
+
+    def acknowledged(self, register, modbus_id=None):
+        """Return the last acknowledged write of a setpoint, or None"""
+        with self._condition:
+            setpoint = self._setpoints.get((modbus_id, register))
+            return setpoint.acknowledged if setpoint else None
+
+    def stats(self):
+        """Return write and coalescing counts per setpoint"""
+        with self._condition:
+            return [{
+                "unit": setpoint.modbus_id,
+                "register": setpoint.register,
+                "pending": setpoint.pending,
+                "writes": setpoint.writes,
+                "coalesced": setpoint.coalesced,
+                "failures": setpoint.failures,
+                "acknowledged": setpoint.acknowledged,
+            } for setpoint in self._setpoints.values()]
+
+    def _run(self):
+        while True:
+            with self._condition:
+                due = self._due_setpoints()
+                while self._running and not due:
+                    self._condition.wait(self._time_to_next_flush())
+                    due = self._due_setpoints()
+                if not self._running:
+                    return
+
+                batch = []
+                for setpoint in due:
+                    batch.append((setpoint, setpoint.pending, setpoint.pending_futures, setpoint.requested))
+                    setpoint.pending = None
+                    setpoint.pending_futures = []
+                    setpoint.in_flight = True
+                    setpoint.last_sent = time.monotonic()
+
+            for setpoint, value, futures, requested in batch:
+                self._write(setpoint, value, futures, requested)
+
+    def _due_setpoints(self):
+        now = time.monotonic()
+        return [setpoint for setpoint in self._setpoints.values()
+                if setpoint.pending is not None and not setpoint.in_flight
+                and now >= setpoint.last_sent + self.min_interval]
+
+    def _time_to_next_flush(self):
+        now = time.monotonic()
+        waits = [setpoint.last_sent + self.min_interval - now for setpoint in self._setpoints.values()
+                 if setpoint.pending is not None and not setpoint.in_flight]
+        return max(0.001, min(waits)) if waits else None
+
+    def _write(self, setpoint, value, futures, requested):
+        def on_done(future):
+            try:
+                result = future.result()
+                if result is None or (hasattr(result, 'isError') and result.isError()):
+                    raise Exception(f"Write of register {setpoint.register} on unit {setpoint.modbus_id} failed: {result}")
+            except Exception as e:
+                self._finish(setpoint, futures, exception=e)
+                return
+            self._finish(setpoint, futures, ack={
+                "value": value,
+                "latency": time.monotonic() - requested,
+                "timestamp": time.time(),
+            })
+
+        try:
+            future = self.bus.write_register(setpoint.register, value, setpoint.modbus_id,
+                                             priority=self.priority, timeout=self.timeout)
+        except Exception as e:
+            self._finish(setpoint, futures, exception=e)
+            return
+        future.add_done_callback(on_done)
+
+    def _finish(self, setpoint, futures, ack=None, exception=None):
+        with self._condition:
+            setpoint.in_flight = False
+            if ack is not None:
+                setpoint.acknowledged = ack
+                setpoint.writes += 1
+            else:
+                setpoint.failures += 1
+            self._condition.notify()
+
+        if exception is not None:
+            error(f"Setpoint write failed: {str(exception)}")
+        for future in futures:
+            if exception is not None:
+                future.set_exception(exception)
+            else:
+                future.set_result(ack)
@@ -0,0 +1,110 @@
+import os
+import threading
+import time
+
+# Seconds a completed read may be handed to later callers asking for the
+# same registers. 0 only shares reads that are still in flight.
+DEFAULT_FRESHNESS = 0.05
+
+# Overrides DEFAULT_FRESHNESS, in seconds
+FRESHNESS_ENV = "MODBUS_READ_FRESHNESS"
+
+# Read kinds of the holding register table, the only one a write changes.
+# Input registers at the same addresses are a different table.
+HOLDING_KINDS = ("holding", "holding_register")
+
+
+class Flight:
+    """A read that later callers may share"""
+
+    def __init__(self, future, priority, deadline):
+        self.future = future
+        self.priority = priority
+        self.deadline = deadline
+        self.completed = None
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent on-demand reads of the same registers. The first
+    caller for a (kind, unit, address, count) key queues the bus transaction;
+    callers arriving while it is in flight, or within the freshness bound
+    after it completed, get the same future instead of queueing their own.
+
+    A caller only joins a read still in flight if that read is queued in the
+    same or a more urgent lane and will not be dropped before the caller's
+    own deadline; otherwise it queues its own. Failed reads are never reused
+    once they have completed, and a write drops every read of the registers
+    it touches.
+
+    Results are shared between callers, so treat them as read-only.
+    """
+
+    def __init__(self, freshness=None):
+        if freshness is None:
+            freshness = float(os.getenv(FRESHNESS_ENV, DEFAULT_FRESHNESS))
+        self.freshness = freshness
+        self.issued = 0
+        self.shared = 0
+        self.invalidated = 0
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def run(self, key, submit, priority=None, deadline=None):
+        """
+        Return the future of a matching read, or of submit() if there is none.
+        priority and deadline are those submit() queues the read with.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is not None and self._usable(flight, priority, deadline):
+                self.shared += 1
+                return flight.future
+            flight = Flight(submit(), priority, deadline)
+            self._flights[key] = flight
+            self.issued += 1
+        flight.future.add_done_callback(lambda future: self._landed(key, flight))
+        return flight.future
+
+    def invalidate(self, unit, address, count=1):
+        """Forget holding reads of unit overlapping the count registers written at address"""
+        with self._lock:
+            for key in [key for key in self._flights if _overlaps(key, unit, address, count)]:
+                del self._flights[key]
+                self.invalidated += 1
+
+    def stats(self):
+        with self._lock:
+            return {"issued": self.issued, "shared": self.shared, "invalidated": self.invalidated,
+                    "freshness": self.freshness}
+
+    def _usable(self, flight, priority, deadline):
+        if not flight.future.done():
+            if priority is not None and flight.priority is not None and flight.priority > priority:
+                return False
+            return flight.deadline is None or (deadline is not None and flight.deadline >= deadline)
+        return flight.completed is not None and time.monotonic() - flight.completed <= self.freshness
+
+    def _landed(self, key, flight):
+        with self._lock:
+            if self._flights.get(key) is not flight:
+                return
+            if flight.future.cancelled() or flight.future.exception() is not None or not self.freshness:
+                del self._flights[key]
+            else:
+                flight.completed = time.monotonic()
+                # Drop reads that have aged out so one-off keys do not pile up
+                now = flight.completed
+                for other in [other for other, entry in self._flights.items()
+                              if entry.completed is not None and now - entry.completed > self.freshness]:
+                    del self._flights[other]
+
+
+def _overlaps(key, unit, address, count):
+    """Whether a (kind, unit, address, count) read covers any written register; None is the default unit"""
+    kind, read_unit, read_address, read_count = key
+    if kind not in HOLDING_KINDS:
+        return False
+    if unit is not None and read_unit is not None and unit != read_unit:
+        return False
+    return read_address < address + count and address < read_address + read_count
@@ -0,0 +1,161 @@
+"""
+Every current tag value in one document, for clients that would otherwise
+fetch each value from its own route:
+
+    GET /api/snapshot
+    GET /api/snapshot?devices=vfd1,pm480
+    GET /api/snapshot?tags=vfd1.speed,bg.flame
+
+Each tag carries its value, engineering unit, the time it was last read and
+a quality flag. seq is the acquisition version at which a value or quality
+of one of the selected tags last changed, so a client can tell whether
+anything it follows moved since its last fetch; scans that read the same
+values again, or changes on other devices, leave it alone.
+
+Pollers that cannot stream make conditional requests instead. The ETag is
+the seq, weak since read times may differ; a request with If-None-Match or
+since=<seq> for the current seq gets a 304. since= also long-polls: the
+request is held until one of the selected tags changes or wait seconds pass:
+
+    GET /api/snapshot?since=1042&wait=20
+
+The JSON for a filter is built once and reused for every client asking for
+it until the next snapshot is published.
+"""
+import json
+import threading
+from collections import OrderedDict
+from Services.register_map import REGISTER_MAP
+
+# Quality of a tag in a snapshot document
+GOOD = "good"        # read on the last scan of its group
+STALE = "stale"      # last good value, held while its bus is being reopened
+BAD = "bad"          # the last read of the tag failed
+PENDING = "pending"  # not read since startup
+
+# Seconds a since= request is held for a newer snapshot, by default and at most
+DEFAULT_WAIT = 20.0
+MAX_WAIT = 30.0
+
+# Serialized documents kept, one per distinct filter
+CACHE_SIZE = 32
+
+
+def device_of(name):
+    """Device a tag belongs to: vfd1.speed -> vfd1"""
+    return name.partition(".")[0]
+
+
+def split_list(text):
+    """Parse a comma separated query parameter; None or empty means no filter"""
+    if not text:
+        return None
+    return [item.strip() for item in text.split(",") if item.strip()]
+
+
+def select_tags(devices=None, tags=None, register_map=REGISTER_MAP):
+    """
+    Tags matching the filters, in register map order. Devices are tag name
+    prefixes (vfd1, bg, pm480) or unit ids; tags are full tag names. Both
+    filters together select the tags matched by either.
+    """
+    if devices is None and tags is None:
+        return list(register_map)
+    unknown = [name for name in tags or [] if name not in register_map]
+    known_devices = {device_of(tag.name) for tag in register_map} | {str(tag.unit) for tag in register_map}
+    unknown += [device for device in devices or [] if device not in known_devices]
+    if unknown:
+        raise ValueError(f"Unknown tags or devices: {', '.join(unknown)}")
+
+    names = set(tags or [])
+    devices = set(devices or [])
+    return [tag for tag in register_map
+            if tag.name in names or device_of(tag.name) in devices or str(tag.unit) in devices]
+
+
+def tag_quality(snapshot, tag, bus_name):
+    if tag.name not in snapshot["timestamps"]:
+        return PENDING
+    if snapshot["values"].get(tag.name) is None:
+        return BAD
+    if bus_name in snapshot["stale_buses"]:
+        return STALE
+    return GOOD
+
+
+def snapshot_document(acquisition, tags, snapshot=None):
+    """The JSON document of the latest snapshot, or of the one given, for the given tags"""
+    snapshot = snapshot or acquisition.snapshot()
+    buses = {}
+    entries = {}
+    for tag in tags:
+        if tag.unit not in buses:
+            buses[tag.unit] = acquisition.bus.bus_for(tag.unit).name
+        entries[tag.name] = {
+            "value": snapshot["values"].get(tag.name),
+            "unit": tag.eng_unit,
+            "timestamp": snapshot["timestamps"].get(tag.name),
+            "quality": tag_quality(snapshot, tag, buses[tag.unit]),
+        }
+    return {
+        "seq": acquisition.version_of([tag.name for tag in tags], snapshot),
+        "timestamp": snapshot["timestamp"],
+        "stale": snapshot["stale"],
+        "tags": entries,
+    }
+
+
+def parse_etag(header):
+    """The seq in an If-None-Match header, or None if it names no snapshot of ours"""
+    for candidate in (header or "").split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        candidate = candidate.strip('"')
+        if candidate.isdigit():
+            return int(candidate)
+    return None
+
+
+def parse_wait(text, default=DEFAULT_WAIT):
+    """The wait query parameter in seconds, capped at MAX_WAIT"""
+    if not text:
+        return default
+    wait = float(text)
+    if wait < 0:
+        raise ValueError(f"wait must not be negative, got {text}")
+    return min(wait, MAX_WAIT)
+
+
+def etag(seq):
+    return f'W/"{seq}"'
+
+
+class SnapshotCache:
+    """
+    Serialized snapshot documents by filter. Every request for the same tags
+    between two publishes gets the same bytes without building them again.
+    """
+
+    def __init__(self, size=CACHE_SIZE):
+        self.size = size
+        self._documents = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, acquisition, tags, key):
+        """Return (seq, JSON bytes) of the latest snapshot for the tags"""
+        snapshot = acquisition.snapshot()
+        with self._lock:
+            cached = self._documents.get(key)
+            if cached and cached[0] is snapshot:
+                self._documents.move_to_end(key)
+                return cached[1:]
+
+        document = snapshot_document(acquisition, tags, snapshot)
+        cached = (snapshot, document["seq"], json.dumps(document, separators=(",", ":")).encode())
+        with self._lock:
+            self._documents[key] = cached
+            self._documents.move_to_end(key)
+            while len(self._documents) > self.size:
+                self._documents.popitem(last=False)
+        return cached[1:]
@@ -0,0 +1,89 @@
+"""
+Live tag updates over Server-Sent Events, so a browser keeps one connection
+open instead of polling a route per value:
+
+    GET /api/stream
+    GET /api/stream?devices=vfd1&tags=bg.flame&rate=2
+
+    const source = new EventSource("http://127.0.0.1:8080/api/stream?devices=vfd1");
+    source.addEventListener("snapshot", e => setTags(JSON.parse(e.data).tags));
+    source.addEventListener("update", e => mergeTags(JSON.parse(e.data).tags));
+
+A connection first gets a "snapshot" event with every subscribed tag, laid
+out like /api/snapshot, then an "update" event with only the tags whose
+value or quality changed each time acquisition publishes. rate caps the
+updates per second sent on that connection; changes in between are merged
+into the next update, never dropped. Event ids are the seq of /api/snapshot
+for the subscribed tags, so changes to other tags do not wake the connection.
+"""
+import json
+import time
+from Services.tag_snapshot import snapshot_document
+
+# Updates per second a connection gets unless it asks for fewer, and the cap on what it may ask for
+DEFAULT_MAX_RATE = 10.0
+MAX_RATE = 50.0
+
+# An idle connection gets a comment this often so proxies and the browser keep it open
+KEEPALIVE_INTERVAL = 15.0
+
+# Reconnect delay the browser is told to use if the connection drops, in ms
+RETRY_MS = 2000
+
+
+def parse_rate(text):
+    """The rate query parameter as updates per second, default and cap applied"""
+    if not text:
+        return DEFAULT_MAX_RATE
+    rate = float(text)
+    if rate <= 0:
+        raise ValueError(f"rate must be positive, got {text}")
+    return min(rate, MAX_RATE)
+
+
+def format_event(event, seq, data):
+    return f"event: {event}\nid: {seq}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+class TagStream:
+    """The event stream of one connection, for its own tags and rate"""
+
+    def __init__(self, acquisition, tags, max_rate=DEFAULT_MAX_RATE, keepalive=KEEPALIVE_INTERVAL):
+        self.acquisition = acquisition
+        self.tags = tags
+        self.names = [tag.name for tag in tags]
+        self.interval = 1.0 / max_rate
+        self.keepalive = keepalive
+
+    def events(self):
+        """Generator of SSE text, for a streaming Flask response"""
+        document = snapshot_document(self.acquisition, self.tags)
+        sent = {name: _state(entry) for name, entry in document["tags"].items()}
+        seq = document["seq"]
+        last_sent = time.monotonic()
+        yield f"retry: {RETRY_MS}\n" + format_event("snapshot", seq, document)
+
+        while True:
+            # Throttle first; anything published meanwhile goes out in one update
+            delay = last_sent + self.interval - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            snapshot = self.acquisition.wait_for_update(seq, self.keepalive, self.names)
+            changed = {}
+            if self.acquisition.version_of(self.names, snapshot) != seq:
+                document = snapshot_document(self.acquisition, self.tags, snapshot)
+                seq = document["seq"]
+                changed = {name: entry for name, entry in document["tags"].items() if _state(entry) != sent[name]}
+            if not changed:
+                if time.monotonic() - last_sent >= self.keepalive:
+                    last_sent = time.monotonic()
+                    yield ": keepalive\n\n"
+                continue
+            for name, entry in changed.items():
+                sent[name] = _state(entry)
+            last_sent = time.monotonic()
+            yield format_event("update", seq, dict(document, tags=changed))
+
+
+def _state(entry):
+    return entry["value"], entry["quality"]
@@ -0,0 +1,18 @@
+import socket
+import pytest
+from Simulator.farm import SlaveFarm
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def farm():
+    """The default simulated units served as RTU over a socket:// URL, answering straight away"""
+    farm = SlaveFarm()
+    farm.port = farm.start_tcp(port=free_port())
+    yield farm
+    farm.stop()
@@ -0,0 +1,45 @@
+import asyncio
+from Services.async_modbus import AsyncModbusConnection
+
+
+def test_late_response_is_not_handed_to_the_next_request(farm):
+    farm.device(1).write_words(300, [1111] * 4)
+    farm.device(2).write_words(300, [2222] * 4)
+    # Unit 1 answers after we gave up on it, while the read of unit 2 is in flight
+    farm.device(1).response_delay = 0.5
+    farm.device(2).response_delay = 0.25
+
+    async def run():
+        modbus = AsyncModbusConnection(port=farm.port, timeout=0.3)
+        await modbus.connect()
+        try:
+            try:
+                await modbus.read_holding_block(300, 4, 1)
+                raise AssertionError("unit 1 answered inside the timeout")
+            except TimeoutError:
+                pass
+            return await modbus.read_holding_block(300, 4, 2)
+        finally:
+            modbus.close()
+
+    assert asyncio.run(run()) == [2222] * 4
+
+
+def test_timed_out_unit_is_read_correctly_afterwards(farm):
+    farm.device(1).write_words(300, [1111] * 4)
+    farm.device(1).response_delay = 0.5
+
+    async def run():
+        modbus = AsyncModbusConnection(port=farm.port, timeout=0.3)
+        await modbus.connect()
+        try:
+            try:
+                await modbus.read_holding_block(300, 4, 1)
+            except TimeoutError:
+                pass
+            farm.device(1).response_delay = 0.0
+            return await modbus.read_holding_block(300, 4, 1)
+        finally:
+            modbus.close()
+
+    assert asyncio.run(run()) == [1111] * 4
@@ -0,0 +1,33 @@
+import asyncio
+from Services.device_discovery import discover_port, sweep, parse_units
+
+
+def test_parse_units():
+    assert parse_units("1-3, 7,5") == [1, 2, 3, 5, 7]
+
+
+def test_sweep_after_a_slow_unit_reports_no_phantoms(farm):
+    farm.device(3).response_delay = 0.15
+
+    async def run():
+        result = await discover_port(farm.port, baudrates=[9600], parities=["N"], units=range(1, 10))
+        return [device["unit"] for device in result["devices"]]
+
+    # Unit 3 answers after the presence timeout, so it is missed, but its late
+    # answer must not show up as another unit
+    assert asyncio.run(run()) == [1, 2, 4, 5, 6, 7]
+
+
+def test_slow_fingerprint_read_does_not_end_discovery(farm):
+    def slow_down(unit, present):
+        if unit == 9:
+            farm.device(3).response_delay = 0.3
+
+    async def run():
+        return await discover_port(farm.port, baudrates=[9600], parities=["N"], units=range(1, 10),
+                                   progress=slow_down)
+
+    devices = {device["unit"]: device["matches"] for device in asyncio.run(run())["devices"]}
+    assert sorted(devices) == [1, 2, 3, 4, 5, 6, 7]
+    assert devices[1] == ["vfd1"]
+    assert "pm480" in devices[3]
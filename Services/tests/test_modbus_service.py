@@ -0,0 +1,71 @@
+import asyncio
+import socket
+import threading
+import pytest
+from Services.async_modbus import AsyncModbusConnection
+from Services.bus_stats import CRC_ERROR, TIMEOUT
+from Services.modbus_service import ModbusConnection
+
+# A holding register response whose CRC is wrong
+GARBLED = bytes([1, 3, 2, 0, 5, 0, 0])
+
+
+class GarblingLine:
+    """A socket:// port answering every request with a garbled frame, or with nothing while muted"""
+
+    def __init__(self):
+        self.muted = False
+        self.server = socket.socket()
+        self.server.bind(("127.0.0.1", 0))
+        self.server.listen()
+        self.url = f"socket://127.0.0.1:{self.server.getsockname()[1]}"
+        threading.Thread(target=self._serve, daemon=True).start()
+
+    def _serve(self):
+        while True:
+            try:
+                connection, _ = self.server.accept()
+            except OSError:
+                return
+            with connection:
+                while connection.recv(256):
+                    if not self.muted:
+                        connection.sendall(GARBLED)
+
+
+@pytest.fixture
+def line():
+    line = GarblingLine()
+    yield line
+    line.server.close()
+
+
+def test_garbled_response_is_counted_as_crc_error(line):
+    modbus = ModbusConnection(port=line.url, timeout=0.2)
+    modbus.initialize()
+    try:
+        for muted in (False, True):
+            line.muted = muted
+            with pytest.raises(Exception):
+                modbus.read_holding_block(0, 1, 1)
+    finally:
+        modbus.close()
+    outcomes = modbus.stats.snapshot()["outcomes"]
+    assert (outcomes[CRC_ERROR], outcomes[TIMEOUT]) == (1, 1)
+
+
+def test_garbled_response_is_counted_as_crc_error_async(line):
+    modbus = AsyncModbusConnection(port=line.url, timeout=0.2)
+
+    async def run():
+        await modbus.connect()
+        for muted in (False, True):
+            line.muted = muted
+            with pytest.raises(TimeoutError):
+                await modbus._request(1, lambda client: client.read_holding_registers(0, 1, 1), 3, 1)
+            await asyncio.sleep(0.5)
+        modbus.close()
+
+    asyncio.run(run())
+    outcomes = modbus.stats.snapshot()["outcomes"]
+    assert (outcomes[CRC_ERROR], outcomes[TIMEOUT]) == (1, 1)
@@ -0,0 +1,21 @@
+import struct
+from Services.register_map import RegisterTag, BlockDecoder
+
+
+def words(fmt, value):
+    return list(struct.unpack(">2H", struct.pack(fmt, value)))
+
+
+def test_word_order_of_multi_register_values():
+    big = words(">f", 277.5)
+    little = big[::-1]
+    tags = [RegisterTag("big", 1, 0, "float32", "big"), RegisterTag("little", 1, 2, "float32", "little"),
+            RegisterTag("count", 1, 4, "int32", "little")]
+    registers = big + little + words(">i", -70000)[::-1]
+    assert BlockDecoder(0, 6, tags).decode(registers) == {"big": 277.5, "little": 277.5, "count": -70000}
+
+
+def test_gaps_scale_and_single_registers():
+    tags = [RegisterTag("speed", 1, 10, "int16", "little", scale=0.1), RegisterTag("raw", 1, 13, "raw", width=2)]
+    decoded = BlockDecoder(10, 5, tags).decode([0xFFF6, 1, 2, 3, 4])
+    assert decoded == {"speed": -1.0, "raw": [3, 4]}
@@ -0,0 +1,71 @@
+from concurrent.futures import Future
+import pytest
+from Services.modbus_service import SlaveException
+from Services.register_map import RegisterTag, INPUT
+from Services.scan_planner import plan_reads, read_batch, split_block
+
+
+def spans(blocks):
+    return [(block.unit, block.table, block.start, block.count) for block in blocks]
+
+
+def test_tags_within_the_gap_share_a_read():
+    tags = [RegisterTag("a", 1, 0), RegisterTag("b", 1, 3), RegisterTag("c", 1, 10, "float32")]
+    assert spans(plan_reads(tags, max_gap=2)) == [(1, "holding", 0, 4), (1, "holding", 10, 2)]
+    assert spans(plan_reads(tags, max_gap=6)) == [(1, "holding", 0, 12)]
+
+
+def test_units_and_tables_are_never_merged():
+    tags = [RegisterTag("a", 1, 0), RegisterTag("b", 2, 1), RegisterTag("c", 1, 1, table=INPUT)]
+    assert spans(plan_reads(tags, max_gap=10)) == [(1, "holding", 0, 1), (1, "input", 1, 1), (2, "holding", 1, 1)]
+
+
+def test_max_count_splits_a_run():
+    tags = [RegisterTag(str(address), 1, address) for address in range(6)]
+    assert spans(plan_reads(tags, max_gap=0, max_count=4)) == [(1, "holding", 0, 4), (1, "holding", 4, 2)]
+
+
+def test_record_is_read_in_one_transaction_whatever_the_gap():
+    tags = [RegisterTag("hi", 1, 0, record="counter"), RegisterTag("lo", 1, 20, record="counter"),
+            RegisterTag("other", 1, 40)]
+    assert spans(plan_reads(tags, max_gap=0)) == [(1, "holding", 0, 21), (1, "holding", 40, 1)]
+
+
+def test_record_wider_than_one_read_is_rejected():
+    tags = [RegisterTag("hi", 1, 0, record="counter"), RegisterTag("lo", 1, 20, record="counter")]
+    with pytest.raises(ValueError):
+        plan_reads(tags, max_gap=0, max_count=10)
+
+
+class RejectingBus:
+    """Answers holding reads with the address, and rejects any read covering one unmapped address"""
+
+    def __init__(self, unmapped):
+        self.unmapped = unmapped
+        self.reads = []
+
+    def read_holding_block(self, start, count, unit, priority=None, timeout=None):
+        self.reads.append((start, count))
+        future = Future()
+        if start <= self.unmapped < start + count:
+            future.set_exception(SlaveException("Illegal data address"))
+        else:
+            future.set_result(list(range(start, start + count)))
+        return future
+
+
+def test_rejected_block_of_adjacent_tags_fails_only_the_unmapped_tag():
+    bus = RejectingBus(unmapped=3)
+    tags = [RegisterTag(str(address), 1, address) for address in range(6)]
+    values, errors, transactions = read_batch(bus, tags)
+    assert list(errors) == ["3"]
+    assert values == {str(address): address for address in (0, 1, 2, 4, 5)}
+    assert bus.reads == [(0, 6), (0, 1), (1, 1), (2, 1), (3, 1), (4, 1), (5, 1)]
+    assert transactions == 7
+
+
+def test_split_block_keeps_records_whole():
+    tags = [RegisterTag("hi", 1, 0, record="counter"), RegisterTag("lo", 1, 1, record="counter"),
+            RegisterTag("next", 1, 2)]
+    block, = plan_reads(tags)
+    assert spans(split_block(block)) == [(1, "holding", 0, 2), (1, "holding", 2, 1)]
@@ -0,0 +1,40 @@
+import threading
+import time
+from Services.bus_scheduler import BusScheduler, PRIORITY_EMERGENCY
+from Services.sequence_engine import SequenceEngine, STARTUP_SEQUENCE, CANCELLED
+
+
+class Drive:
+    """Records every write it gets"""
+
+    def __init__(self):
+        self.writes = []
+
+    def write_register(self, register, values, modbus_id):
+        self.writes.append((register, values))
+        return True
+
+
+def test_stop_write_is_not_followed_by_a_queued_sequence_write():
+    drive = Drive()
+    bus = BusScheduler(drive)
+    bus.start()
+    try:
+        # Hold the bus so the first sequence write stays queued
+        release = threading.Event()
+        busy = bus.submit(lambda modbus: release.wait(), PRIORITY_EMERGENCY)
+        sequences = SequenceEngine(bus)
+        job = sequences.run(STARTUP_SEQUENCE, 1)
+        while not bus.pending()["control"]:
+            time.sleep(0.01)
+
+        sequences.cancel_unit(1)
+        stop = bus.write_register(0, 0, 1, priority=PRIORITY_EMERGENCY)
+        release.set()
+        busy.result()
+        stop.result()
+        while sequences.job(job.id)["state"] != CANCELLED:
+            time.sleep(0.01)
+        assert drive.writes == [(0, 0)]
+    finally:
+        bus.stop()
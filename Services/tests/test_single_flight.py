@@ -0,0 +1,96 @@
+import time
+from concurrent.futures import Future
+from Services.single_flight import SingleFlight
+
+KEY = ("holding", 7, 0, 10)
+
+
+def submitter():
+    futures = []
+
+    def submit():
+        futures.append(Future())
+        return futures[-1]
+    return submit, futures
+
+
+def test_concurrent_reads_share_one_transaction():
+    reads = SingleFlight(freshness=0.05)
+    submit, futures = submitter()
+
+    first = reads.run(KEY, submit)
+    assert reads.run(KEY, submit) is first
+    assert reads.run(("holding", 7, 0, 11), submit) is not first
+    assert len(futures) == 2
+    assert reads.stats()["shared"] == 1
+
+
+def test_completed_read_expires_after_freshness():
+    reads = SingleFlight(freshness=0.05)
+    submit, futures = submitter()
+
+    first = reads.run(KEY, submit)
+    first.set_result([1])
+    assert reads.run(KEY, submit) is first
+    time.sleep(0.1)
+    assert reads.run(KEY, submit) is not first
+
+
+def test_failed_read_is_not_reused():
+    reads = SingleFlight(freshness=1.0)
+    submit, futures = submitter()
+
+    first = reads.run(KEY, submit)
+    first.set_exception(TimeoutError())
+    assert reads.run(KEY, submit) is not first
+
+
+def test_urgent_read_does_not_join_a_background_read():
+    reads = SingleFlight()
+    submit, futures = submitter()
+
+    background = reads.run(KEY, submit, priority=3)
+    telemetry = reads.run(KEY, submit, priority=2)
+    assert telemetry is not background
+    # The telemetry read now serves both lanes
+    assert reads.run(KEY, submit, priority=3) is telemetry
+
+
+def test_read_does_not_join_one_that_expires_first():
+    reads = SingleFlight()
+    submit, futures = submitter()
+    now = time.monotonic()
+
+    short = reads.run(KEY, submit, priority=2, deadline=now + 0.1)
+    assert reads.run(KEY, submit, priority=2, deadline=now + 0.05) is short
+    assert reads.run(KEY, submit, priority=2, deadline=now + 1.0) is not short
+    assert reads.run(KEY, submit, priority=2) is not futures[1]
+
+
+def test_write_drops_overlapping_reads():
+    reads = SingleFlight(freshness=1.0)
+    submit, futures = submitter()
+
+    block = reads.run(KEY, submit)
+    block.set_result(list(range(10)))
+    other_unit = reads.run(("holding", 5, 0, 10), submit)
+    beyond = reads.run(("holding", 7, 10, 5), submit)
+
+    reads.invalidate(7, 9)
+    assert reads.run(KEY, submit) is not block
+    assert reads.run(("holding", 5, 0, 10), submit) is other_unit
+    assert reads.run(("holding", 7, 10, 5), submit) is beyond
+
+
+def test_write_keeps_input_register_reads():
+    reads = SingleFlight(freshness=1.0)
+    submit, futures = submitter()
+
+    single = reads.run(("holding_register", 7, 3, 1), submit)
+    inputs = reads.run(("input", 7, 0, 10), submit)
+    input_register = reads.run(("input_register", 7, 3, 1), submit)
+
+    reads.invalidate(7, 3)
+    assert reads.run(("holding_register", 7, 3, 1), submit) is not single
+    assert reads.run(("input", 7, 0, 10), submit) is inputs
+    assert reads.run(("input_register", 7, 3, 1), submit) is input_register
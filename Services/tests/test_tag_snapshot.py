@@ -0,0 +1,48 @@
+from Services.acquisition_service import AcquisitionEngine
+from Services.bus_scheduler import BusScheduler
+from Services.register_map import REGISTER_MAP
+from Services.tag_snapshot import SnapshotCache, select_tags, STALE
+
+
+def engine():
+    return AcquisitionEngine(BusScheduler(object(), name="bus"), REGISTER_MAP.poll_groups())
+
+
+def test_rescan_with_the_same_values_keeps_the_seq():
+    acquisition = engine()
+    snapshots = SnapshotCache()
+    tags = select_tags(["pm480"])
+
+    acquisition._publish({"pm480.V1N": 277.0, "pm480.I1": 12.5})
+    seq, body = snapshots.get(acquisition, tags, "pm480")
+    acquisition._publish({"pm480.V1N": 277.0, "pm480.I1": 12.5})
+    assert snapshots.get(acquisition, tags, "pm480")[0] == seq
+
+    acquisition._publish({"pm480.I1": 13.0})
+    assert snapshots.get(acquisition, tags, "pm480")[0] > seq
+
+
+def test_changes_on_other_devices_do_not_move_the_seq():
+    acquisition = engine()
+    tags = select_tags(["pm480"])
+
+    acquisition._publish({"pm480.V1N": 277.0})
+    seq = acquisition.version_of([tag.name for tag in tags])
+    acquisition._publish({"vfd1.speed": 1200})
+    assert acquisition.version_of([tag.name for tag in tags]) == seq
+    # The wait for pm480 is not ended by the vfd1 change
+    acquisition._publish({"vfd1.speed": 1250})
+    assert acquisition.wait_for_update(seq, 0.05, [tag.name for tag in tags])["version"] > seq
+
+
+def test_stale_bus_moves_the_seq():
+    acquisition = engine()
+    snapshots = SnapshotCache()
+    tags = select_tags(tags=["pm480.V1N"])
+
+    acquisition._publish({"pm480.V1N": 277.0})
+    seq = snapshots.get(acquisition, tags, "V1N")[0]
+    acquisition.set_stale("bus", True)
+    stale_seq, body = snapshots.get(acquisition, tags, "V1N")
+    assert stale_seq > seq
+    assert STALE.encode() in body
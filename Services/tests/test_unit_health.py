@@ -0,0 +1,57 @@
+import pytest
+from pymodbus.exceptions import ConnectionException
+from Services.modbus_service import ModbusConnection
+from Services.unit_health import UnitHealth, FAILURE_THRESHOLD, CLOSED, OPEN, HALF_OPEN
+
+
+def opened(now=0.0):
+    health = UnitHealth(1)
+    for _ in range(FAILURE_THRESHOLD):
+        health.record_failure(now)
+    assert health.state == OPEN
+    return health
+
+
+def test_half_open_admits_a_single_probe():
+    health = opened()
+    now = health.next_probe
+    assert health.allow_request(now)
+    assert health.state == HALF_OPEN
+    assert not health.allow_request(now)
+    assert not health.allow_request(now + 1)
+
+    health.record_success(0.01)
+    assert health.state == CLOSED
+    assert health.allow_request(now)
+
+
+def test_aborted_probe_lets_the_next_request_probe():
+    health = opened()
+    now = health.next_probe
+    assert health.allow_request(now)
+    health.record_aborted()
+    assert health.state == OPEN
+    assert health.allow_request(now)
+
+
+def test_transport_errors_and_reopen_leave_units_healthy(farm):
+    modbus = ModbusConnection(port=farm.port, timeout=0.2)
+    modbus.initialize()
+
+    def lost(client):
+        raise ConnectionException("port went away")
+
+    try:
+        for _ in range(FAILURE_THRESHOLD):
+            with pytest.raises(ConnectionException):
+                modbus._request(1, lost, 3, 1)
+        assert modbus.health.unit(1).state == CLOSED
+        assert modbus.health.unit(1).failures == 0
+
+        for _ in range(FAILURE_THRESHOLD):
+            modbus.health.unit(1).record_failure()
+        assert modbus.reopen()
+        assert modbus.read_holding_block(0, 1, 1)
+        assert modbus.health.unit(1).state == CLOSED
+    finally:
+        modbus.close()
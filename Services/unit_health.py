@@ -0,0 +1,156 @@
+import threading
+import time
+from collections import deque
+from Services.logger_service import info, warning
+
+# Response times kept per unit to estimate its percentiles
+SAMPLE_WINDOW = 50
+
+# A unit's timeout is this multiple of its observed p95 response time,
+# clamped between MIN_TIMEOUT and the connection's configured timeout
+TIMEOUT_PERCENTILE = 95
+TIMEOUT_MARGIN = 3.0
+MIN_TIMEOUT = 0.2
+
+# Consecutive missed responses before a unit's breaker opens, and how often
+# an open unit is probed (the interval doubles after each failed probe)
+FAILURE_THRESHOLD = 3
+PROBE_INTERVAL = 5.0
+MAX_PROBE_INTERVAL = 60.0
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class UnitUnavailable(Exception):
+    """Raised instead of sending a request to a unit whose breaker is open"""
+
+
+class UnitHealth:
+    """Response time history and circuit breaker state of one slave unit"""
+
+    def __init__(self, unit):
+        self.unit = unit
+        self.samples = deque(maxlen=SAMPLE_WINDOW)
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.successes = 0
+        self.failures = 0
+        self.rejected = 0
+        self.probe_interval = PROBE_INTERVAL
+        self.next_probe = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+
+    def percentile(self, percent):
+        """Observed response time at the given percentile, or None without samples"""
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def timeout(self, default):
+        """Timeout to use for the next request, never above the configured default"""
+        observed = self.percentile(TIMEOUT_PERCENTILE)
+        if observed is None:
+            return default
+        return min(default, max(MIN_TIMEOUT, observed * TIMEOUT_MARGIN))
+
+    def allow_request(self, now=None):
+        """
+        Whether a request may be sent. An open breaker lets a single probe
+        through once its probe interval has passed; every other request is
+        rejected until the probe's outcome is recorded.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if self.state == CLOSED:
+                return True
+            if self.state == OPEN and now >= self.next_probe:
+                self.state = HALF_OPEN
+                self.probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self, elapsed):
+        with self._lock:
+            self.samples.append(elapsed)
+            self.successes += 1
+            self.consecutive_failures = 0
+            self.probing = False
+            if self.state != CLOSED:
+                info(f"Unit {self.unit} is responding again, closing its breaker")
+                self.state = CLOSED
+                self.probe_interval = PROBE_INTERVAL
+
+    def record_failure(self, now=None):
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.probing = False
+            if self.state == HALF_OPEN:
+                self.probe_interval = min(self.probe_interval * 2, MAX_PROBE_INTERVAL)
+                self.state = OPEN
+                self.next_probe = now + self.probe_interval
+            elif self.state == CLOSED and self.consecutive_failures >= FAILURE_THRESHOLD:
+                warning(f"Unit {self.unit} missed {self.consecutive_failures} responses, "
+                        f"opening its breaker and probing every {self.probe_interval:.0f}s")
+                self.state = OPEN
+                self.next_probe = now + self.probe_interval
+
+    def record_aborted(self):
+        """
+        A request that never got an answer or a timeout from the unit, e.g.
+        because the port was down. Says nothing about the unit, but frees the
+        probe slot so the next request may probe again.
+        """
+        with self._lock:
+            if self.probing:
+                self.probing = False
+                self.state = OPEN
+
+    def to_dict(self, default_timeout):
+        p50 = self.percentile(50)
+        p95 = self.percentile(95)
+        return {
+            "unit": self.unit,
+            "state": self.state,
+            "timeout": self.timeout(default_timeout),
+            "p50": p50,
+            "p95": p95,
+            "successes": self.successes,
+            "failures": self.failures,
+            "consecutive_failures": self.consecutive_failures,
+            "rejected": self.rejected,
+        }
+
+
+class UnitHealthMonitor:
+    """Health of every unit seen on the bus, created on first use"""
+
+    def __init__(self, default_timeout):
+        self.default_timeout = default_timeout
+        self._units = {}
+        self._lock = threading.Lock()
+
+    def unit(self, unit):
+        with self._lock:
+            health = self._units.get(unit)
+            if health is None:
+                health = self._units[unit] = UnitHealth(unit)
+            return health
+
+    def reset(self):
+        """Forget every unit, e.g. once the port was reopened and old failures say nothing"""
+        with self._lock:
+            self._units = {}
+
+    def stats(self):
+        """Return the health of every known unit"""
+        with self._lock:
+            units = list(self._units.values())
+        return {health.unit: health.to_dict(self.default_timeout) for health in units}
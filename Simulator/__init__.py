@@ -0,0 +1 @@
+# This empty file marks the directory as a Python package
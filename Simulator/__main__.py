@@ -0,0 +1,57 @@
+"""
+Run the virtual slave farm.
+
+    python -m Simulator --tcp 5020 --baudrate 9600 --delay 0.005
+    python -m Simulator --pty --fault 5:timeout --fault 3:exception:0.1
+    python -m Simulator --gateway 5502
+
+Point the HMI at the printed port, e.g. ModbusConnection(port="socket://127.0.0.1:5020").
+"""
+import argparse
+from Simulator.farm import SlaveFarm, DEFAULT_BAUDRATE, DEFAULT_HOST, DEFAULT_TCP_PORT, DEFAULT_GATEWAY_PORT
+
+
+def parse_fault(text):
+    """unit:mode[:rate], e.g. 5:timeout or 3:exception:0.1"""
+    parts = text.split(":")
+    if len(parts) not in (2, 3):
+        raise argparse.ArgumentTypeError(f"Expected unit:mode[:rate], got '{text}'")
+    return int(parts[0]), parts[1], float(parts[2]) if len(parts) == 3 else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual Modbus slave farm for the TBM bus")
+    transport = parser.add_mutually_exclusive_group()
+    transport.add_argument("--tcp", type=int, nargs="?", const=DEFAULT_TCP_PORT, default=DEFAULT_TCP_PORT,
+                           metavar="PORT", help="serve RTU frames on a loopback TCP port (default)")
+    transport.add_argument("--gateway", type=int, nargs="?", const=DEFAULT_GATEWAY_PORT, metavar="PORT",
+                           help="serve Modbus TCP like a serial-to-Ethernet gateway")
+    transport.add_argument("--pty", action="store_true", help="serve on a pty pair instead of TCP")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--baudrate", type=int, default=DEFAULT_BAUDRATE,
+                        help="RTU line speed to emulate, 0 for no wire delay")
+    parser.add_argument("--delay", type=float, default=0.005, help="slave response delay in seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="random extra delay in seconds")
+    parser.add_argument("--fault", type=parse_fault, action="append", default=[],
+                        metavar="UNIT:MODE[:RATE]", help="inject timeout or exception faults")
+    args = parser.parse_args()
+
+    farm = SlaveFarm(response_delay=args.delay, jitter=args.jitter, baudrate=args.baudrate or None)
+    for unit, mode, rate in args.fault:
+        farm.device(unit).inject_fault(mode, rate)
+
+    if args.pty:
+        port = farm.start_pty()
+    elif args.gateway:
+        port = farm.start_gateway(args.host, args.gateway)
+    else:
+        port = farm.start_tcp(args.host, args.tcp)
+    print(f"Serving units {sorted(farm.devices)} on {port}")
+    try:
+        farm.wait()
+    except KeyboardInterrupt:
+        farm.stop()
+
+
+if __name__ == "__main__":
+    main()
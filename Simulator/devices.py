@@ -0,0 +1,194 @@
+import asyncio
+import math
+import random
+import struct
+import time
+from pymodbus.datastore import ModbusSlaveContext, ModbusSparseDataBlock
+from pymodbus.exceptions import NoSuchSlaveException
+from Services.register_map import REGISTER_MAP
+from Services.rtu_timing import read_transaction_time, write_transaction_time
+
+# Fault modes a device can be told to inject
+FAULT_TIMEOUT = "timeout"        # swallow the request, the master times out
+FAULT_EXCEPTION = "exception"    # answer with a slave failure exception response
+FAULT_MODES = (FAULT_TIMEOUT, FAULT_EXCEPTION)
+
+# ABB drives profile control word that has the drive running
+RUN_CONTROL_WORD = 0b1101111
+
+# Frequency reference scaling used by the HMI: +-20000 is +-60 Hz
+REFERENCE_FULL_SCALE = 20000
+MAX_FREQUENCY = 60.0
+FREQUENCY_RAMP = 10.0            # Hz per second
+RPM_PER_HZ = 30                  # 4 pole motor
+
+
+class VirtualDevice(ModbusSlaveContext):
+    """
+    Simulated Modbus slave. Registers live in sparse blocks, so reads that
+    touch unmapped addresses get an illegal address exception like on the
+    real hardware.
+
+    Every request is answered after response_delay (plus up to jitter) and,
+    when a baud rate is given, the time the frames would take on an RTU line.
+    """
+
+    def __init__(self, unit, holding=None, inputs=None, response_delay=0.0, jitter=0.0, baudrate=None):
+        super().__init__(
+            hr=ModbusSparseDataBlock(holding or {0: 0}),
+            ir=ModbusSparseDataBlock(inputs or {0: 0}),
+            zero_mode=True,
+        )
+        self.unit = unit
+        self.response_delay = response_delay
+        self.jitter = jitter
+        self.baudrate = baudrate
+        self.fault = None
+        self.fault_rate = 1.0
+        self.requests = 0
+        self.faults_injected = 0
+        self._last_update = time.monotonic()
+
+    def inject_fault(self, mode, rate=1.0):
+        """Fail the given fraction of requests with a fault mode, or clear faults with None"""
+        if mode is not None and mode not in FAULT_MODES:
+            raise ValueError(f"Unknown fault mode '{mode}'")
+        self.fault = mode
+        self.fault_rate = rate
+
+    def update(self, elapsed):
+        """Advance the simulated process by elapsed seconds before a read"""
+
+    def on_write(self, address, values):
+        """React to a register write from the master"""
+
+    def write_words(self, address, words, table="h"):
+        self.store[table].setValues(address, list(words))
+
+    def write_float(self, address, value, table="i"):
+        """Store an IEEE float low word first, as the power meters send it"""
+        self.write_words(address, struct.unpack("<2H", struct.pack("<f", value)), table)
+
+    async def async_getValues(self, fc_as_hex, address, count=1):
+        await self._respond(read_transaction_time, count)
+        now = time.monotonic()
+        self.update(now - self._last_update)
+        self._last_update = now
+        return self.getValues(fc_as_hex, address, count)
+
+    async def async_setValues(self, fc_as_hex, address, values):
+        await self._respond(write_transaction_time, len(values))
+        self.setValues(fc_as_hex, address, values)
+        self.on_write(address, values)
+
+    async def _respond(self, transaction_time, count):
+        self.requests += 1
+        if self.fault is not None and random.random() < self.fault_rate:
+            self.faults_injected += 1
+            if self.fault == FAULT_TIMEOUT:
+                # The server is run with ignore_missing_slaves, so this sends nothing
+                raise NoSuchSlaveException(f"Unit {self.unit} fault injected")
+            raise RuntimeError(f"Unit {self.unit} fault injected")
+
+        delay = self.response_delay + random.uniform(0, self.jitter)
+        if self.baudrate:
+            delay += transaction_time(count, self.baudrate, turnaround=0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class VfdDevice(VirtualDevice):
+    """
+    ABB style drive: control word and frequency reference at 0-1, actual
+    values at 100-152 and the fault log at 401-409. The output frequency
+    ramps towards the reference while the control word says run.
+    """
+
+    def __init__(self, unit, **kwargs):
+        holding = {address: 0 for address in (0, 1)}
+        holding.update({address: 0 for address in range(100, 153)})
+        holding.update({address: 0 for address in range(401, 410)})
+        super().__init__(unit, holding=holding, **kwargs)
+        self.frequency = 0.0
+        self.drive_temp = 30.0
+        self.update(0)
+
+    @property
+    def running(self):
+        return self.getValues(3, 0)[0] & RUN_CONTROL_WORD == RUN_CONTROL_WORD
+
+    def trip(self, fault_code):
+        """Record a fault in the fault log and coast to a stop"""
+        words = self.getValues(3, 100, 10)
+        self.write_words(401, [fault_code])
+        self.write_words(404, [words[0], words[2], words[8], words[3], words[4], self.getValues(3, 0)[0]])
+        self.write_words(0, [0])
+
+    def update(self, elapsed):
+        reference = _signed(self.getValues(3, 1)[0])
+        target = reference * MAX_FREQUENCY / REFERENCE_FULL_SCALE if self.running else 0.0
+        step = FREQUENCY_RAMP * elapsed
+        self.frequency += max(-step, min(step, target - self.frequency))
+
+        load = abs(self.frequency) / MAX_FREQUENCY
+        self.drive_temp += (30 + 25 * load - self.drive_temp) * min(1.0, elapsed / 60)
+        noise = random.uniform(-0.5, 0.5)
+        current = 25 * load + 2 * (load > 0) + noise * load
+        output_voltage = 400 * load
+        power = math.sqrt(3) * output_voltage * current * 0.85 / 1000
+
+        self.write_words(100, [
+            _word(self.frequency * RPM_PER_HZ),       # 100 speed (rpm, signed)
+            0,
+            _word(abs(self.frequency) * 10),          # 102 output frequency (0.1 Hz)
+            _word(current * 10),                      # 103 current (0.1 A)
+            _word(60 * load + noise),                 # 104 torque (%)
+            _word(power * 10),                        # 105 power (0.1 kW)
+            _word(650 + noise * 4),                   # 106 DC bus voltage
+            0,
+            _word(output_voltage),                    # 108 output voltage
+            _word(self.drive_temp),                   # 109 drive temperature
+        ])
+        self.write_words(149, [_word(self.drive_temp + 5)])
+        self.write_words(152, [_word(40 * load)])
+
+
+class PowerMeterDevice(VirtualDevice):
+    """
+    Power meter serving float32 voltages and currents in input registers,
+    laid out as the register map expects for its unit
+    """
+
+    def __init__(self, unit, voltage, current=10.0, **kwargs):
+        self.layout = {tag.address: tag for tag in REGISTER_MAP if tag.unit == unit and tag.table == "input"}
+        end = max((tag.end for tag in self.layout.values()), default=2)
+        super().__init__(unit, inputs={address: 0 for address in range(end)}, **kwargs)
+        self.voltage = voltage
+        self.current = current
+        self.update(0)
+
+    def update(self, elapsed):
+        for address, tag in self.layout.items():
+            nominal = self.voltage if tag.eng_unit == "V" else self.current
+            self.write_float(address, nominal * random.uniform(0.99, 1.01))
+
+
+class BoardDevice(VirtualDevice):
+    """Sensor board with ADC readings in holding registers 0-62"""
+
+    def __init__(self, unit, **kwargs):
+        super().__init__(unit, holding={address: 0 for address in range(63)}, **kwargs)
+        self.levels = {address: random.randint(200, 800) for address in range(63)}
+        self.update(0)
+
+    def update(self, elapsed):
+        self.write_words(0, [_word(level + random.randint(-3, 3)) for level in self.levels.values()])
+
+
+def _word(value):
+    """Round to a 16 bit register, two's complement for negative values"""
+    return int(round(value)) & 0xFFFF
+
+
+def _signed(word):
+    return word - 0x10000 if word & 0x8000 else word
@@ -0,0 +1,174 @@
+import asyncio
+import os
+import select
+import threading
+import tty
+from pymodbus.datastore import ModbusServerContext
+from pymodbus.framer import FramerType
+from pymodbus.server import ModbusSerialServer, ModbusTcpServer
+from Services.logger_service import info, error
+from Simulator.devices import VfdDevice, PowerMeterDevice, BoardDevice
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_TCP_PORT = 5020
+DEFAULT_GATEWAY_PORT = 5502
+DEFAULT_BAUDRATE = 9600
+
+
+def default_devices(**kwargs):
+    """The TBM bus: two drives, two power meters and three sensor boards"""
+    return {
+        1: VfdDevice(1, **kwargs),
+        2: VfdDevice(2, **kwargs),
+        3: PowerMeterDevice(3, voltage=277.0, current=40.0, **kwargs),
+        4: PowerMeterDevice(4, voltage=120.0, current=8.0, **kwargs),
+        5: BoardDevice(5, **kwargs),
+        6: BoardDevice(6, **kwargs),
+        7: BoardDevice(7, **kwargs),
+    }
+
+
+class PtyBridge:
+    """
+    Two pseudo terminals joined back to back, like a null modem cable. The
+    simulator opens one end and the HMI opens the other as its serial port.
+    """
+
+    def __init__(self):
+        self._master_a, self._slave_a = os.openpty()
+        self._master_b, self._slave_b = os.openpty()
+        for fd in (self._slave_a, self._slave_b):
+            tty.setraw(fd)
+        self.server_port = os.ttyname(self._slave_a)
+        self.client_port = os.ttyname(self._slave_b)
+        self._running = True
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._running = False
+        self._thread.join(timeout=2)
+        for fd in (self._master_a, self._slave_a, self._master_b, self._slave_b):
+            os.close(fd)
+
+    def _run(self):
+        peers = {self._master_a: self._master_b, self._master_b: self._master_a}
+        while self._running:
+            readable, _, _ = select.select(list(peers), [], [], 0.1)
+            for fd in readable:
+                try:
+                    os.write(peers[fd], os.read(fd, 1024))
+                except OSError:
+                    pass
+
+
+class SlaveFarm:
+    """
+    Serves a set of virtual devices from a background thread, either as RTU
+    frames over a loopback TCP socket (connect with port="socket://host:port"),
+    as a Modbus TCP gateway (port="tcp://host:port") or on a pty pair that
+    looks like a serial port.
+    """
+
+    def __init__(self, devices=None, response_delay=0.0, jitter=0.0, baudrate=DEFAULT_BAUDRATE):
+        self.baudrate = baudrate
+        if devices is None:
+            devices = default_devices(response_delay=response_delay, jitter=jitter, baudrate=baudrate)
+        self.devices = devices
+        self.context = ModbusServerContext(slaves=devices, single=False)
+
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._bridge = None
+        self._started = threading.Event()
+        self._failure = None
+
+    def device(self, unit):
+        return self.devices[unit]
+
+    def start_tcp(self, host=DEFAULT_HOST, port=DEFAULT_TCP_PORT):
+        """Serve RTU frames on a TCP socket and return the pyserial URL to connect to"""
+        self._start(lambda: ModbusTcpServer(
+            self.context,
+            framer=FramerType.RTU,
+            address=(host, port),
+            ignore_missing_slaves=True,
+        ))
+        info(f"Simulator serving units {sorted(self.devices)} on socket://{host}:{port}")
+        return f"socket://{host}:{port}"
+
+    def start_gateway(self, host=DEFAULT_HOST, port=DEFAULT_GATEWAY_PORT):
+        """Serve Modbus TCP like a serial-to-Ethernet gateway and return its tcp:// URL"""
+        self._start(lambda: ModbusTcpServer(
+            self.context,
+            framer=FramerType.SOCKET,
+            address=(host, port),
+            ignore_missing_slaves=True,
+        ))
+        info(f"Simulator serving units {sorted(self.devices)} as a Modbus TCP gateway on tcp://{host}:{port}")
+        return f"tcp://{host}:{port}"
+
+    def start_pty(self):
+        """Serve on one end of a pty pair and return the serial port for the other end"""
+        self._bridge = PtyBridge()
+        self._start(lambda: ModbusSerialServer(
+            self.context,
+            framer=FramerType.RTU,
+            port=self._bridge.server_port,
+            baudrate=self.baudrate or DEFAULT_BAUDRATE,
+            ignore_missing_slaves=True,
+        ))
+        info(f"Simulator serving units {sorted(self.devices)} on {self._bridge.client_port}")
+        return self._bridge.client_port
+
+    def stop(self):
+        if self._loop and self._server and not self._loop.is_closed():
+            asyncio.run_coroutine_threadsafe(self._server.shutdown(), self._loop).result(timeout=5)
+        if self._thread:
+            self._thread.join(timeout=5)
+            self._thread = None
+        if self._bridge:
+            self._bridge.close()
+            self._bridge = None
+        self._server = None
+        self._loop = None
+
+    def wait(self):
+        """Block until the farm is stopped"""
+        if self._thread:
+            self._thread.join()
+
+    def _start(self, make_server):
+        if self._thread:
+            raise RuntimeError("Simulator is already running")
+        self._started.clear()
+        self._failure = None
+        self._thread = threading.Thread(target=self._run, args=(make_server,), daemon=True)
+        self._thread.start()
+        if not self._started.wait(timeout=5) or self._failure is not None:
+            self._thread = None
+            if self._bridge:
+                self._bridge.close()
+                self._bridge = None
+            raise RuntimeError(f"Simulator did not start: {self._failure}")
+
+    def _run(self, make_server):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+
+        async def serve():
+            # The server has to be created inside the loop that runs it
+            self._server = make_server()
+            await self._server.listen()
+            self._started.set()
+            await self._server.serving
+
+        try:
+            self._loop.run_until_complete(serve())
+        except Exception as e:
+            self._failure = e
+            error(f"Simulator stopped: {str(e)}")
+        finally:
+            self._started.set()
+            self._loop.close()